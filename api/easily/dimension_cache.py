@@ -0,0 +1,332 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Active le cache des tables de référence (la requête principale ne ramène alors que les faits)
+DIMENSION_CACHE_ENABLED = os.getenv("EASILY_DIMENSION_CACHE", "0") == "1"
+DIMENSION_REFRESH_SECONDS = int(os.getenv("EASILY_DIMENSION_REFRESH_SECONDS", "3600"))
+
+# Équivalent du CASE dfs.fos_libelle ... END AS CR_Doss_spe (premier libellé correspondant)
+FORMULAIRE_SPECIALITES = [
+    ("CR Lettre de Liaison Chirurgie Vasculaire Foch", "VASCULAIRE"),
+    ("CR Lettre de Liaison Chirurgie Urologique Foch", "UROLOGIE"),
+    ("CR Lettre de Liaison Réa Foch", "REANIMATION"),
+    ("CR Lettre de Liaison ORL Foch", "ORL"),
+    ("CR Lettre de Liaison Oncologie Foch", "ONCOLOGIE"),
+    ("CR HDJ Oncologie Foch", "ONCOLOGIE"),
+    ("CR Lettre de Liaison Chirurgie Digestive Foch", "DIGESTIF"),
+    ("CR HDJ Endoscopie Digestive Foch", "ENDODIG"),
+    ("CR Lettre de Liaison Cardiologie Foch", "CARDIOLOGIE"),
+    ("CR Lettre de Liaison Unité Vanderbilt Foch ", "VANDERBILDT"),
+    ("CR Lettre de Liaison UPHU Foch ", "UPHU"),
+    ("CR Lettre de Liaison Throm Foch", "NEUROLOGIE"),
+    ("CR Lettre de Liaison Throm SG Foch", "NEUROLOGIE"),
+    ("CR Lettre de Liaison Foch DOG", "OBSTETRIQUE"),
+    ("CR Lettre de Liaison Pédiatrie Foch", "NEONATOLOGIE"),
+    ("CR Lettre de Liaison Gynécologie Foch", "GYNECOLOGIE"),
+    ("CR Lettre de Liaison Chirurgie Thoracique Foch", "THORACIQUE"),
+    ("CR Lettre de Liaison Gériatrie Foch", "GERIATRIE"),
+    ("CR Lettre de Liaison M.P.R Foch", "MPR"),
+    ("CR Lettre de Liaison SSPI Foch", "ANESTHESIE"),
+    ("CR Lettre de Liaison Médecine interne et Polyvalente Foch", "MEDECINE INTERNE ET POLYVALENTE"),
+    ("CR Lettre de Liaison Diabétologie Foch ", "MEDECINE INTERNE"),
+    ("CR Lettre de Liaison NRDT Foch", "NEUROCHIRURGIE"),
+    ("CR Lettre de Liaison Neurochirurgie Foch", "NEUROCHIRURGIE"),
+    ("CR Urgences", "URGENCES"),
+]
+
+# Seule règle du CASE dépendant aussi du dossier de spécialité
+USIR_FORMULAIRE = "CR Lettre de Liaison USIR Foch "
+USIR_DOSSIER = "Chirurgie Thoracique Foch"
+
+
+def sql_key(value):
+    """Normalise une chaîne comme la collation SQL Server (insensible à la casse et aux espaces finaux)"""
+    if value is None:
+        return None
+    return str(value).rstrip().casefold()
+
+
+def sql_equals(left, right):
+    """Égalité SQL : NULL n'est égal à rien"""
+    return left is not None and right is not None and sql_key(left) == sql_key(right)
+
+
+_SPECIALITE_BY_FORMULAIRE = {}
+for _libelle, _specialite in FORMULAIRE_SPECIALITES:
+    _SPECIALITE_BY_FORMULAIRE.setdefault(sql_key(_libelle), _specialite)
+
+
+def formulaire_specialite(fos_libelle, dos_libelle_court, cr4_libelle):
+    """Calcule CR_Doss_spe à partir du formulaire, du dossier de spécialité et du CR associé"""
+    specialite = _SPECIALITE_BY_FORMULAIRE.get(sql_key(fos_libelle))
+    if specialite is not None:
+        return specialite
+    if sql_equals(fos_libelle, USIR_FORMULAIRE) and sql_equals(dos_libelle_court, USIR_DOSSIER):
+        return "THORACIQUE"
+    return cr4_libelle
+
+
+def formulaire_specialite_sql():
+    """Expression SQL de CR_Doss_spe (alias dfs, ds, cr4), générée depuis FORMULAIRE_SPECIALITES"""
+    whens = [
+        f"WHEN dfs.fos_libelle = '{libelle}' THEN '{specialite}'" for libelle, specialite in FORMULAIRE_SPECIALITES
+    ]
+    whens.append(
+        f"WHEN dfs.fos_libelle = '{USIR_FORMULAIRE}' AND ds.dos_libelle_court = '{USIR_DOSSIER}' THEN 'THORACIQUE'"
+    )
+    return "CASE\n        " + "\n        ".join(whens) + "\n        ELSE cr4.cr_libelle_long\n    END"
+
+
+CR_DOSS_SPE_SQL = formulaire_specialite_sql()
+
+
+def selected_specialites(specialites):
+    """Clés normalisées des spécialités demandées (ensemble vide : pas de filtre)"""
+    return {sql_key(specialite) for specialite in specialites or [] if specialite and specialite.strip()}
+
+
+def specialite_condition(specialites):
+    """Condition SQL `CR_Doss_spe IN (...)` évaluée dans la requête, ou chaîne vide sans filtre"""
+    values = sorted({specialite.rstrip() for specialite in specialites or [] if specialite and specialite.strip()})
+    if not values:
+        return ""
+    literals = ", ".join("N'" + value.replace("'", "''") + "'" for value in values)
+    return f"AND ({CR_DOSS_SPE_SQL}) IN ({literals})"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class DimensionCache:
+    """Tables de référence Easily chargées en mémoire et indexées par clé de jointure.
+
+    Les jointures non uniques (UF, codes CR, tables de pont des spécialités) sont conservées
+    sous forme de tuples pour reproduire exactement la multiplicité des jointures SQL.
+    """
+
+    def __init__(self):
+        self.cr_ids_by_uf = {}
+        self.cr_by_id = {}
+        self.cr_long_by_code = {}
+        self.formulaire_selection = {}
+        self.formulaire = {}
+        self.dossier_specialite = {}
+        self.cr4_by_dossier = {}
+        self.loaded_at = None
+
+    @staticmethod
+    def _fetch(conn, query):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def load(self, conn):
+        """Recharge toutes les tables de référence puis remplace les index d'un seul coup"""
+        cr_ids_by_uf = {}
+        for uf_code, cr_id in self._fetch(conn, "SELECT uf_code, fk_cr_id FROM NOYAU.coeur.Uf"):
+            cr_ids_by_uf.setdefault(sql_key(uf_code), []).append(cr_id)
+
+        cr_by_id = {}
+        cr_long_by_code = {}
+        for cr_id, cr_code, libelle_long, libelle_court in self._fetch(
+            conn,
+            "SELECT cr_id, cr_code, cr_libelle_long, cr_libelle_court FROM NOYAU.coeur.CENTRE_RESPONSABILITE",
+        ):
+            cr_by_id[cr_id] = (_intern(libelle_long), _intern(libelle_court))
+            cr_long_by_code.setdefault(sql_key(cr_code), []).append(_intern(libelle_long))
+
+        formulaire_selection = {
+            fos_id: (_intern(fos_libelle), formulaire_id)
+            for fos_id, formulaire_id, fos_libelle in self._fetch(
+                conn,
+                "SELECT formulaire_selection_id, formulaire_id, fos_libelle FROM DOMINHO.dominho.FORMULAIRE_SELECTION",
+            )
+        }
+
+        formulaire = {
+            formulaire_id: (_intern(type_document_code), for_courrier)
+            for formulaire_id, type_document_code, for_courrier in self._fetch(
+                conn, "SELECT formulaire_id, type_document_code, for_courrier FROM dominho.dominho.FORMULAIRE"
+            )
+        }
+
+        dossier_specialite = {
+            ds_id: _intern(libelle)
+            for ds_id, libelle in self._fetch(
+                conn, "SELECT dossier_specialite_id, dos_libelle_court FROM dominho.dominho.DOSSIER_SPECIALITE"
+            )
+        }
+
+        # Ponts DOSSIER_SPECIALITE -> SPECIALITE -> CENTRE_RESPONSABILITE (cr4 de la requête)
+        cr_codes_by_specialite = {}
+        for specialite_code, cr_code in self._fetch(
+            conn,
+            "SELECT specialite_code, centre_responsabilite_code "
+            "FROM [dominho].[dominho].[CENTRE_RESPONSABILITE_SPECIALITE]",
+        ):
+            cr_codes_by_specialite.setdefault(sql_key(specialite_code), []).append(cr_code)
+
+        cr4_by_dossier = {}
+        for ds_id, specialite_code in self._fetch(
+            conn,
+            "SELECT dossier_specialite_id, specialite_code FROM [dominho].[dominho].[DOSSIER_SPECIALITE_SPECIALITE]",
+        ):
+            cr_codes = cr_codes_by_specialite.get(sql_key(specialite_code)) or [None]
+            libelles = cr4_by_dossier.setdefault(ds_id, [])
+            for cr_code in cr_codes:
+                libelles.extend(cr_long_by_code.get(sql_key(cr_code)) or [None])
+
+        self.cr_ids_by_uf = {k: tuple(v) for k, v in cr_ids_by_uf.items()}
+        self.cr_by_id = cr_by_id
+        self.cr_long_by_code = {k: tuple(v) for k, v in cr_long_by_code.items()}
+        self.formulaire_selection = formulaire_selection
+        self.formulaire = formulaire
+        self.dossier_specialite = dossier_specialite
+        self.cr4_by_dossier = {k: tuple(dict.fromkeys(v)) for k, v in cr4_by_dossier.items()}
+        self.loaded_at = time.time()
+
+    @property
+    def ready(self):
+        return self.loaded_at is not None
+
+    def eligible_formulaire_selection_ids(self, specialites=None):
+        """Formulaires retenus par les jointures dfs/fo : lettres (00209/00082) hors HDJ et extractions.
+
+        Avec un filtre de spécialités, les formulaires dont le libellé fixe une autre spécialité sont
+        écartés dès la requête de faits (les autres dépendent du dossier et sont filtrés après résolution).
+        """
+        selected = selected_specialites(specialites)
+        eligible = []
+        for fos_id, (fos_libelle, formulaire_id) in self.formulaire_selection.items():
+            libelle = sql_key(fos_libelle) or ""
+            if "hdj" in libelle or "extraction" in libelle:
+                continue
+            specialite = _SPECIALITE_BY_FORMULAIRE.get(libelle)
+            if selected and specialite is not None and sql_key(specialite) not in selected:
+                continue
+            type_document_code, for_courrier = self.formulaire.get(formulaire_id, (None, None))
+            if for_courrier == 1 and type_document_code in ("00209", "00082"):
+                eligible.append(fos_id)
+        return sorted(eligible)
+
+    def resolve(self, fact_row, with_venue):
+        """Résout les attributs de référence d'une ligne de faits.
+
+        Retourne la liste des lignes finales (0, 1 ou plusieurs selon les jointures), avec les
+        mêmes filtres que la requête SQL complète.
+        """
+        fos_id = fact_row["fic_formulaire_selection_id"]
+        fos_libelle, formulaire_id = self.formulaire_selection.get(fos_id, (None, None))
+        type_document_code = self.formulaire.get(formulaire_id, (None, None))[0]
+        uf_der_pass = fact_row["uf_der_pass"]
+        if not (
+            type_document_code == "00209"
+            or (type_document_code == "00082" and sql_key(uf_der_pass) in ("290a", "294u"))
+        ):
+            return []
+
+        # INNER JOIN sur Uf / CENTRE_RESPONSABILITE du dernier passage
+        cr_ids = self.cr_ids_by_uf.get(sql_key(uf_der_pass), ())
+        crs = [self.cr_by_id[cr_id] for cr_id in cr_ids if cr_id in self.cr_by_id]
+        if not crs:
+            return []
+
+        # cr3 : LEFT JOIN pour les fiches avec venue, INNER JOIN pour les fiches sans venue
+        cr3_libelles = self.cr_long_by_code.get(sql_key(fact_row["fic_cr_code"]), ())
+        if not cr3_libelles:
+            if not with_venue:
+                return []
+            cr3_libelles = (None,)
+
+        ds_id = fact_row["fic_dossier_specialite_id"]
+        dos_libelle_court = self.dossier_specialite.get(ds_id)
+        cr4_libelles = self.cr4_by_dossier.get(ds_id, (None,)) if ds_id in self.dossier_specialite else (None,)
+
+        rows = []
+        for cr_libelle_long, cr_libelle_court in crs:
+            for cr3_libelle in cr3_libelles:
+                for cr4_libelle in cr4_libelles:
+                    if not (
+                        sql_equals(cr_libelle_long, cr3_libelle)
+                        or sql_equals(cr_libelle_long, cr4_libelle)
+                        or (
+                            sql_equals(cr_libelle_long, "NEUROCHIRURGIE") and sql_equals(dos_libelle_court, "NRDT Foch")
+                        )
+                        or (sql_equals(cr_libelle_long, "ANESTHESIE") and sql_equals(dos_libelle_court, "Obstétrique"))
+                    ):
+                        continue
+                    rows.append(
+                        {
+                            "cr_der_sej": cr_libelle_long if with_venue else cr_libelle_court,
+                            "CR_courrier": cr3_libelle,
+                            "Type_courrier": fos_libelle,
+                            "Dos_Spe_ESL": dos_libelle_court,
+                            "CR_Doss_spe": formulaire_specialite(fos_libelle, dos_libelle_court, cr4_libelle),
+                        }
+                    )
+        return rows
+
+    def resolve_part(self, fact_rows, with_venue, columns, specialites=None, limit=None):
+        """Lignes finales d'une partie de la requête (fiches avec ou sans venue), colonnes `columns`.
+
+        Équivalent du `SELECT DISTINCT TOP limit` de la partie : filtre de spécialités (le WHERE SQL), puis
+        dédoublonnage et limite propres à la partie ; l'UNION des parties est faite par l'appelant.
+        """
+        selected = selected_specialites(specialites)
+        part = {}
+        for fact_row in fact_rows:
+            for dimensions in self.resolve(fact_row, with_venue):
+                if selected and sql_key(dimensions["CR_Doss_spe"]) not in selected:
+                    continue
+                row = {**fact_row, **dimensions}
+                result = {column: row[column] for column in columns}
+                part.setdefault(tuple(result.values()), result)
+                if limit is not None and len(part) >= limit:
+                    return list(part.values())
+        return list(part.values())
+
+
+dimension_cache = DimensionCache()
+_refresh_stop = threading.Event()
+
+
+def refresh_dimension_cache(get_connection):
+    """Recharge le cache ; en cas d'échec l'ancienne version reste en service"""
+    start_time = time.time()
+    try:
+        conn = get_connection()
+        try:
+            dimension_cache.load(conn)
+        finally:
+            conn.close()
+        logger.warning(f"Cache des tables de référence chargé en {time.time() - start_time:.2f}s")
+    except Exception as e:
+        logger.error(f"Erreur chargement du cache des tables de référence: {str(e)}")
+
+
+def start_dimension_refresh(get_connection):
+    """Charge le cache au démarrage puis le rafraîchit toutes les DIMENSION_REFRESH_SECONDS"""
+    if not DIMENSION_CACHE_ENABLED:
+        return
+
+    def refresh_loop():
+        while True:
+            refresh_dimension_cache(get_connection)
+            if _refresh_stop.wait(DIMENSION_REFRESH_SECONDS):
+                break
+
+    thread = threading.Thread(target=refresh_loop, name="dimension-cache-refresh", daemon=True)
+    thread.start()
+
+
+def stop_dimension_refresh():
+    _refresh_stop.set()
@@ -1,6 +1,7 @@
 
 import logging
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Annotated
 
@@ -8,7 +9,9 @@ import pyodbc
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Query, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, validator
+from fastapi.responses import JSONResponse
+from functools import lru_cache
+from pydantic import BaseModel, Field, create_model, validator
 import sys
 sys.path.append(os.path.abspath('..'))  # Chemin vers le dossier contenant auth.py
 from auth import create_access_token, get_current_user, UserInfo, ADMIN_USERS, verify_password
@@ -17,6 +20,22 @@ from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from datetime import timedelta
 from auth import record_user_login
 import uuid
+from validation_index import (
+    start_validation_refresh,
+    stop_validation_refresh,
+    validation_source,
+    validation_watermark,
+)
+from venue_predicates import parse_venues, plan_venue_predicate
+from projection import parse_fields
+from dimension_cache import (
+    CR_DOSS_SPE_SQL,
+    DIMENSION_CACHE_ENABLED,
+    dimension_cache,
+    specialite_condition,
+    start_dimension_refresh,
+    stop_dimension_refresh,
+)
 
 # Créer un identifiant unique pour chaque session utilisateur
 session_id = str(uuid.uuid4())
@@ -29,11 +48,22 @@ logger = logging.getLogger(__name__)
 # Charger les variables d'environnement
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cache des tables de référence et index des validations, maintenus par des threads de fond
+    start_dimension_refresh(get_db_connection)
+    start_validation_refresh(get_db_connection)
+    yield
+    stop_dimension_refresh()
+    stop_validation_refresh()
+
+
 # Configuration de l'application FastAPI
 app = FastAPI(
     title="API de Requêtes Médicales",
     description="API pour interroger la base de données des comptes rendus patients",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configuration CORS plus restrictive
@@ -45,8 +75,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Configuration et validation communes au modèle complet et aux modèles projetés (`fields=`)
+class PatientRecordBase(BaseModel):
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+
+    @validator("*", pre=True)
+    def empty_str_to_none(cls, v):
+        if v == "":
+            return None
+        return v
+
+
 # Modèle de données pour la réponse (identique)
-class PatientRecord(BaseModel):
+class PatientRecord(PatientRecordBase):
     annee: int
     mois: str
     ll_j0: int = Field(alias="LL_J0")
@@ -73,15 +116,21 @@ class PatientRecord(BaseModel):
     date_diffusion: str | None = Field(alias="Date diffusion", default=None)
     statut_envoi: str | None = Field(alias="Statut Envoi", default=None)
 
-    class Config:
-        populate_by_name = True
-        arbitrary_types_allowed = True
 
-    @validator("*", pre=True)
-    def empty_str_to_none(cls, v):
-        if v == "":
-            return None
-        return v
+# Colonnes exposées (noms JSON, identiques aux colonnes SQL) -> champ du modèle PatientRecord
+PATIENT_RECORD_COLUMNS = {field.alias or name: name for name, field in PatientRecord.model_fields.items()}
+
+
+@lru_cache(maxsize=32)
+def projected_record_model(columns):
+    """Modèle PatientRecord restreint aux colonnes demandées (validation et sérialisation de `fields=`)"""
+    definitions = {}
+    for column in columns:
+        name = PATIENT_RECORD_COLUMNS[column]
+        field = PatientRecord.model_fields[name]
+        definitions[name] = (field.annotation, field)
+    return create_model("PatientRecordProjection", __base__=PatientRecordBase, **definitions)
+
 
 # Configuration de la connexion à la base de données avec timeout
 def get_db_connection():
@@ -100,6 +149,7 @@ def get_db_connection():
             detail=f"Erreur de connexion à la base de données: {str(e)}",
         ) from None
 
+
 # Route de santé pour Easily
 @app.get("/health")
 def health_check():
@@ -123,22 +173,25 @@ def clean_query_results(rows, columns):
     return results
 
 
-def execute_query(conn, start_date=None, end_date=None, venues=None):
-    cursor = conn.cursor()
+# Le delta relit aussi les séjours sortis dans les EASILY_DELTA_SORTIE_RESCAN_DAYS jours précédant `since` :
+# SEJOUR n'a pas de date de modification, et une date de sortie saisie ou corrigée en retard fait entrer ses
+# lettres dans la période sans modifier la fiche
+EASILY_DELTA_SORTIE_RESCAN_DAYS = int(os.getenv("EASILY_DELTA_SORTIE_RESCAN_DAYS", "7"))
 
-    # Timeout au niveau du curseur
-    cursor.execute("SET LOCK_TIMEOUT 15000")
 
+def build_query_conditions(start_date=None, end_date=None, venues=None, modified_since=None):
+    """Construit les conditions de période / séjours / delta communes aux deux parties de la requête"""
     include_second_part = True
     date_condition = ""
     venue_condition = ""
 
     if venues and venues.strip():
+        # Numéros > 0 : seules les fiches avec venue peuvent correspondre (le CASE historique donnait 0 sinon),
+        # ce qui permet un prédicat direct sur v.ven_numero, en plages BETWEEN pour les suites denses
+        venue_predicate = plan_venue_predicate("v.ven_numero", parse_venues(venues))
+        logger.info(f"Plan séjours: {venue_predicate.describe()}")
         venue_condition = f"""
-        CASE
-            WHEN f.fic_venue IS NULL THEN 0
-            WHEN f.fic_venue IS NOT NULL THEN v.ven_numero
-        END IN ({venues})"""
+        f.fic_venue IS NOT NULL AND {venue_predicate.sql}"""
         include_second_part = False
     else:
         if start_date and end_date:
@@ -146,13 +199,226 @@ def execute_query(conn, start_date=None, end_date=None, venues=None):
         else:
             date_condition = "YEAR(s2.sej_date_sortie) = YEAR(GETDATE())"
 
-    # SYNTAXE CORRIGÉE : DISTINCT TOP au lieu de TOP DISTINCT
-    sql_query_part1 = f"""
+    # Mode delta : uniquement les lignes qui ont pu entrer dans l'extraction ou changer depuis l'horodatage fourni.
+    # Fiches créées, modifiées ou validées pour la première fois depuis, séjours dont la sortie est récente (voir
+    # EASILY_DELTA_SORTIE_RESCAN_DAYS), ou fiches dont un destinataire (BOITE_ENVOI) a été diffusé depuis : le
+    # statut et la date d'envoi changent sans modifier la fiche. Le delta remplace des fiches entières côté
+    # client : toutes les lignes (destinataires) de la fiche sont renvoyées
+    delta_condition = ""
+    if modified_since:
+        delta_condition = f"""AND (
+        f.fic_date_creation >= '{modified_since}'
+        OR f.fic_date_modification >= '{modified_since}'
+        OR fhs2.date_min_val >= '{modified_since}'
+        OR s2.sej_date_sortie >= DATEADD(day, -{EASILY_DELTA_SORTIE_RESCAN_DAYS}, '{modified_since}')
+        OR EXISTS (
+            SELECT 1 FROM BOITE_ENVOI.BOITE_ENVOI.DESTINATAIRE dest_delta
+            WHERE dest_delta.doc_id = EDOC.doc_id AND dest_delta.dest_diffusion_date >= '{modified_since}'
+        )
+    )"""
+
+    return venue_condition, date_condition, include_second_part, delta_condition
+
+
+# Colonnes de faits communes aux deux parties (les attributs de référence sont résolus en mémoire)
+FACT_COLUMNS = """
+    year(s2.sej_date_sortie) AS annee,
+    DateName(Month, s2.sej_date_sortie) AS mois,
+    datediff(day, s2.sej_date_sortie, date_min_val) AS LL_J0,
+    CASE
+        WHEN s1.sej_date_entree >= ven_admission THEN datediff(day, s1.sej_date_entree, s2.sej_date_sortie)
+        WHEN s1.sej_date_entree < ven_admission THEN datediff(day, ven_admission, s2.sej_date_sortie)
+    END AS nuit_1,
+    p.pat_ipp AS pat_IPP,
+    p.pat_date_deces,
+    v.ven_id,
+    f.fiche_id,
+    s1.sej_date_entree,
+    s1.sej_uf_medicale_code,
+    s3.date_der AS sej_date_der_entree,
+    s2.sej_date_sortie AS sej_date_sortie,
+    s2.sej_uf_medicale_code AS uf_der_pass,
+    CASE
+        WHEN f.fic_venue IS NULL THEN 0
+        WHEN f.fic_venue IS NOT NULL THEN v.ven_numero
+    END AS Num_Venue,
+    v.ven_numero AS ven_theo,
+    f.fic_date_creation,
+    f.fic_date_modification,
+    fhs2.date_min_val,
+    convert(Varchar, EDES.dest_diffusion_date, 103) as 'Date diffusion',
+    CASE EDES.st_id
+        WHEN 1 THEN 'A diffuser'
+        WHEN 3 THEN 'Echec'
+        WHEN 4 THEN 'Diffuse'
+        WHEN 7 THEN 'Annule'
+        ELSE 'Pas dans boite envoi'
+    END as 'Statut Envoi',
+    f.centre_responsabilite_code AS fic_cr_code,
+    f.dossier_specialite_id AS fic_dossier_specialite_id,
+    f.formulaire_selection_id AS fic_formulaire_selection_id"""
+
+# Ordre des colonnes de la requête complète
+RESULT_COLUMNS = [
+    "annee", "mois", "LL_J0", "nuit_1", "pat_IPP", "pat_date_deces", "ven_id", "fiche_id",
+    "sej_date_entree", "sej_uf_medicale_code", "sej_date_der_entree", "sej_date_sortie", "uf_der_pass",
+    "cr_der_sej", "Num_Venue", "ven_theo", "CR_courrier", "Type_courrier", "Dos_Spe_ESL", "CR_Doss_spe",
+    "fic_date_creation", "fic_date_modification", "date_min_val", "Date diffusion", "Statut Envoi",
+]
+
+# Limite historique de la requête complète (DISTINCT TOP 5000 par partie)
+MAX_ROWS_PER_PART = 5000
+
+
+def execute_fact_query(conn, start_date=None, end_date=None, venues=None, modified_since=None, specialites=None):
+    """Variante de execute_query qui ne ramène que les lignes de faits.
+
+    Les tables de référence (UF, CENTRE_RESPONSABILITE, FORMULAIRE(_SELECTION), DOSSIER_SPECIALITE
+    et ponts de spécialités) sont résolues en mémoire via le cache de dimensions ; seuls les
+    formulaires éligibles (pour les spécialités demandées) sont transmis au serveur sous forme de
+    liste d'identifiants.
+    """
+    eligible_ids = dimension_cache.eligible_formulaire_selection_ids(specialites)
+    if not eligible_ids:
+        return []
+    formulaire_condition = f"f.formulaire_selection_id IN ({', '.join(str(i) for i in eligible_ids)})"
+
+    cursor = conn.cursor()
+    validation_join = validation_source()
+    cursor.execute("SET LOCK_TIMEOUT 15000")
+
+    venue_condition, date_condition, include_second_part, delta_condition = build_query_conditions(
+        start_date, end_date, venues, modified_since
+    )
+
+    common_conditions = f"""
+    AND {formulaire_condition}
+    AND date_min_val >= DateAdd(Day, -1, Cast(s3.date_der AS date))
+    AND date_min_val <= DateAdd(Day, 5, Cast(s2.sej_date_sortie AS date))
+    AND (
+        CASE
+            WHEN s1.sej_date_entree >= ven_admission THEN datediff(day, s1.sej_date_entree, s2.sej_date_sortie)
+            WHEN s1.sej_date_entree < ven_admission THEN datediff(day, ven_admission, s2.sej_date_sortie)
+        END
+    ) >= 1
+    AND (format(p.pat_date_deces, 'yyyy/MM/dd') > format(s2.sej_date_sortie, 'yyyy/MM/dd')
+      OR p.pat_date_deces IS NULL)
+    {delta_condition}"""
+
+    fact_query_part1 = f"""
+/*faits : fiches avec venue*/
+SELECT DISTINCT {FACT_COLUMNS}
+FROM
+    NOYAU.patient.VENUE v
+    LEFT JOIN NOYAU.patient.SEJOUR s1 ON s1.ven_id = v.ven_id
+        AND v.ven_supprime != 1
+        AND s1.sej_numero = '1'
+        AND ven_type IN (1,8)
+    LEFT JOIN NOYAU.patient.SEJOUR s2 ON s2.ven_id = v.ven_id
+        AND v.ven_supprime != 1
+        AND s2.sej_est_dernier_sejour = 1
+    LEFT JOIN (
+        SELECT s.ven_id, MIN(s.sej_date_entree) AS date_der, s.sej_uf_medicale_code
+        FROM NOYAU.patient.SEJOUR s
+        INNER JOIN noyau.patient.sejour s2 ON s.sej_uf_medicale_code = s2.sej_uf_medicale_code
+            AND s.ven_id = s2.ven_id
+            AND s2.sej_est_dernier_sejour = 1
+        WHERE s2.sej_est_dernier_sejour = 1 AND s.ven_id = s2.ven_id
+        GROUP BY s.ven_id, s.sej_uf_medicale_code
+    ) AS s3 ON s3.ven_id = s2.ven_id AND s3.sej_uf_medicale_code = s2.sej_uf_medicale_code
+    LEFT JOIN DOMINHO.dominho.FICHE f ON f.fic_venue = s2.ven_id AND f.fic_suppr = 0
+    INNER JOIN NOYAU.patient.patient p ON p.pat_id = f.patient_id
+    LEFT JOIN {validation_join} AS fhs2 ON f.fiche_id = fhs2.fiche_id
+    LEFT JOIN BOITE_ENVOI.BOITE_ENVOI.DOCUMENT EDOC ON EDOC.document_id = f.document_id
+    LEFT JOIN BOITE_ENVOI.BOITE_ENVOI.DESTINATAIRE EDES ON EDES.doc_id = EDOC.doc_id
+WHERE
+    {venue_condition if venue_condition else date_condition}
+    {common_conditions}
+    """
+
+    fact_query_part2 = f"""
+/*faits : fiches sans venue*/
+SELECT DISTINCT {FACT_COLUMNS}
+FROM
+    NOYAU.patient.patient p
+    LEFT JOIN DOMINHO.dominho.FICHE f ON p.pat_id = f.patient_id AND f.fic_venue IS NULL AND f.fic_suppr = 0
+    LEFT JOIN {validation_join} AS fhs2 ON f.fiche_id = fhs2.fiche_id
+    LEFT JOIN NOYAU.patient.VENUE v ON p.pat_id = v.pat_id AND v.pat_id = f.patient_id AND v.ven_supprime != 1
+    AND ven_type IN (1)
+    LEFT JOIN NOYAU.patient.SEJOUR s1 ON s1.ven_id = v.ven_id AND v.ven_supprime != 1 AND s1.sej_numero = '1'
+    LEFT JOIN NOYAU.patient.SEJOUR s2 ON s2.ven_id = v.ven_id AND v.ven_supprime != 1
+    AND s2.sej_est_dernier_sejour = 1
+    LEFT JOIN (
+        SELECT s.ven_id, MIN(s.sej_date_entree) AS date_der, s.sej_uf_medicale_code
+        FROM NOYAU.patient.SEJOUR s
+        INNER JOIN noyau.patient.sejour s2 ON s.ven_id = s2.ven_id
+            AND s.sej_uf_medicale_code = s2.sej_uf_medicale_code
+            AND s2.sej_est_dernier_sejour = 1
+        GROUP BY s.ven_id, s.sej_uf_medicale_code
+    ) AS s3 ON s3.ven_id = s2.ven_id
+    LEFT JOIN BOITE_ENVOI.BOITE_ENVOI.DOCUMENT EDOC ON EDOC.document_id = f.document_id
+    LEFT JOIN BOITE_ENVOI.BOITE_ENVOI.DESTINATAIRE EDES ON EDES.doc_id = EDOC.doc_id
+WHERE
+    {date_condition}
+    AND date_min_val IS NOT NULL
+    {common_conditions}
+    """
+
+    parts = [(fact_query_part1, True)]
+    if include_second_part:
+        parts.append((fact_query_part2, False))
+
+    try:
+        results = {}
+        for query, with_venue in parts:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            columns = [column[0] for column in cursor.description]
+
+            # DISTINCT TOP 5000 de chaque partie (spécialité déduite du dossier filtrée avant la limite, comme
+            # le WHERE SQL), puis équivalent de l'UNION entre les parties
+            part = dimension_cache.resolve_part(
+                clean_query_results(rows, columns), with_venue, RESULT_COLUMNS, specialites, MAX_ROWS_PER_PART
+            )
+            for result in part:
+                results.setdefault(tuple(result.values()), result)
+        return list(results.values())
+    except Exception as e:
+        logger.error(f"Erreur lors de l'exécution de la requête de faits: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erreur lors de l'exécution de la requête: {str(e)}",
+        ) from None
+    finally:
+        cursor.close()
+
+
+def report_query_sql(
+    start_date=None, end_date=None, venues=None, modified_since=None, specialites=None, row_limit=MAX_ROWS_PER_PART
+):
+    """En-tête et requête complète (fiches avec venue UNION fiches sans venue).
+
+    `row_limit` : DISTINCT TOP de chaque partie, None pour toutes les lignes (agrégats de /kpis).
+    """
+    # Index fiche_id -> date_min_val maintenu localement (ou agrégation complète à défaut)
+    validation_join = validation_source()
+
+    venue_condition, date_condition, include_second_part, delta_condition = build_query_conditions(
+        start_date, end_date, venues, modified_since
+    )
+    # Filtre de spécialités évalué par le serveur (ne dépend que de dfs, ds et cr4, pas de BOITE_ENVOI)
+    specialite_filter = specialite_condition(specialites)
+    top = f"TOP {row_limit}" if row_limit else ""
+
+    sql_header = """
 DECLARE @startOfCurrentMonth DATETIME
 SET @startOfCurrentMonth = DATEADD(YEAR, DATEDIFF(year, 0, CURRENT_TIMESTAMP), 0)
+"""
 
+    # SYNTAXE CORRIGÉE : DISTINCT TOP au lieu de TOP DISTINCT
+    sql_query_part1 = f"""
 /*recherche fiche avec venue*/
-SELECT DISTINCT TOP 5000
+SELECT DISTINCT {top}
     year(s2.sej_date_sortie) AS annee,
     DateName(Month,s2.sej_date_sortie) AS mois,
     datediff(day,s2.sej_date_sortie,date_min_val) AS LL_J0,
@@ -178,36 +444,7 @@ SELECT DISTINCT TOP 5000
     cr3.cr_libelle_long AS CR_courrier,
     dfs.fos_libelle AS Type_courrier,
     ds.dos_libelle_court AS Dos_Spe_ESL,
-    CASE
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Vasculaire Foch' THEN 'VASCULAIRE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Urologique Foch' THEN 'UROLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Réa Foch' THEN 'REANIMATION'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison ORL Foch' THEN 'ORL'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Oncologie Foch' THEN 'ONCOLOGIE'
-        WHEN dfs.fos_libelle ='CR HDJ Oncologie Foch' THEN 'ONCOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Digestive Foch' THEN 'DIGESTIF'
-        WHEN dfs.fos_libelle ='CR HDJ Endoscopie Digestive Foch' THEN 'ENDODIG'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Cardiologie Foch' THEN 'CARDIOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Unité Vanderbilt Foch ' THEN 'VANDERBILDT'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison UPHU Foch ' THEN 'UPHU'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Throm Foch' THEN 'NEUROLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Throm SG Foch' THEN 'NEUROLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Foch DOG' THEN 'OBSTETRIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Pédiatrie Foch' THEN 'NEONATOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Gynécologie Foch' THEN 'GYNECOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Thoracique Foch' THEN 'THORACIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Thoracique Foch' AND ds.dos_libelle_court = 'Chirurgie Thoracique Foch' THEN 'THORACIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison USIR Foch ' AND ds.dos_libelle_court = 'Chirurgie Thoracique Foch' THEN 'THORACIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Gériatrie Foch' THEN 'GERIATRIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison M.P.R Foch' THEN 'MPR'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison SSPI Foch' THEN 'ANESTHESIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Médecine interne et Polyvalente Foch' THEN 'MEDECINE INTERNE ET POLYVALENTE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Diabétologie Foch ' THEN 'MEDECINE INTERNE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison NRDT Foch' THEN 'NEUROCHIRURGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Neurochirurgie Foch' THEN 'NEUROCHIRURGIE'
-        WHEN dfs.fos_libelle ='CR Urgences' THEN 'URGENCES'
-        ELSE cr4.cr_libelle_long
-    END AS CR_Doss_spe,
+    {CR_DOSS_SPE_SQL} AS CR_Doss_spe,
     f.fic_date_creation,
     f.fic_date_modification,
     fhs2.date_min_val,
@@ -243,12 +480,7 @@ FROM
     LEFT JOIN NOYAU.coeur.CENTRE_RESPONSABILITE cr3 ON cr3.cr_code = f.centre_responsabilite_code
     LEFT JOIN dominho.dominho.DOSSIER_SPECIALITE ds ON ds.dossier_specialite_id = f.dossier_specialite_id
     INNER JOIN NOYAU.patient.patient p ON p.pat_id = f.patient_id
-    LEFT JOIN (
-        SELECT fhs2.fiche_id, Min(fhs2.fic_date_statut_validation) AS date_min_val
-        FROM DOMINHO.dominho.FICHE_HISTORIQUE_STATUT fhs2
-        WHERE fhs2.fic_statut_validation_id = 3
-        GROUP BY fhs2.fiche_id
-    ) AS fhs2 ON f.fiche_id = fhs2.fiche_id
+    LEFT JOIN {validation_join} AS fhs2 ON f.fiche_id = fhs2.fiche_id
     INNER JOIN DOMINHO.dominho.FORMULAIRE_SELECTION dfs ON f.formulaire_selection_id = dfs.formulaire_selection_id
         AND dfs.fos_libelle NOT LIKE '%HDJ%'
         AND dfs.fos_libelle NOT LIKE '%extraction%'
@@ -278,6 +510,8 @@ WHERE
     )
     AND ((fo.type_document_code IN ('00209')) OR (fo.type_document_code = '00082' AND s2.sej_uf_medicale_code IN ('290A', '294U')))
     AND (format(p.pat_date_deces, 'yyyy/MM/dd') > format(s2.sej_date_sortie, 'yyyy/MM/dd') OR p.pat_date_deces IS NULL)
+    {delta_condition}
+    {specialite_filter}
     """
 
     # Partie 2 avec syntaxe corrigée aussi
@@ -285,7 +519,7 @@ WHERE
 UNION
 
 /*Sans venue*/
-SELECT DISTINCT TOP 5000
+SELECT DISTINCT {top}
     year(s2.sej_date_sortie) AS annee,
     DateName(Month, s2.sej_date_sortie) AS mois,
     datediff(day, s2.sej_date_sortie, date_min_val) AS LL_J0,
@@ -311,36 +545,7 @@ SELECT DISTINCT TOP 5000
     cr3.cr_libelle_long AS CR_courrier,
     dfs.fos_libelle AS Type_courrier,
     ds.dos_libelle_court AS Dos_Spe_ESL,
-    CASE
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Vasculaire Foch' THEN 'VASCULAIRE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Urologique Foch' THEN 'UROLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Réa Foch' THEN 'REANIMATION'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison ORL Foch' THEN 'ORL'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Oncologie Foch' THEN 'ONCOLOGIE'
-        WHEN dfs.fos_libelle ='CR HDJ Oncologie Foch' THEN 'ONCOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Digestive Foch' THEN 'DIGESTIF'
-        WHEN dfs.fos_libelle ='CR HDJ Endoscopie Digestive Foch' THEN 'ENDODIG'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Cardiologie Foch' THEN 'CARDIOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Unité Vanderbilt Foch ' THEN 'VANDERBILDT'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison UPHU Foch ' THEN 'UPHU'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Throm Foch' THEN 'NEUROLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Throm SG Foch' THEN 'NEUROLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Foch DOG' THEN 'OBSTETRIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Pédiatrie Foch' THEN 'NEONATOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Gynécologie Foch' THEN 'GYNECOLOGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Thoracique Foch' THEN 'THORACIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Chirurgie Thoracique Foch' AND ds.dos_libelle_court = 'Chirurgie Thoracique Foch' THEN 'THORACIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison USIR Foch ' AND ds.dos_libelle_court = 'Chirurgie Thoracique Foch' THEN 'THORACIQUE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Gériatrie Foch' THEN 'GERIATRIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison M.P.R Foch' THEN 'MPR'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison SSPI Foch' THEN 'ANESTHESIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Médecine interne et Polyvalente Foch'THEN 'MEDECINE INTERNE ET POLYVALENTE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Diabétologie Foch ' THEN 'MEDECINE INTERNE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison NRDT Foch' THEN 'NEUROCHIRURGIE'
-        WHEN dfs.fos_libelle ='CR Lettre de Liaison Neurochirurgie Foch' THEN 'NEUROCHIRURGIE'
-        WHEN dfs.fos_libelle ='CR Urgences' THEN 'URGENCES'
-        ELSE cr4.cr_libelle_long
-    END AS CR_Doss_spe,
+    {CR_DOSS_SPE_SQL} AS CR_Doss_spe,
     f.fic_date_creation,
     f.fic_date_modification,
     fhs2.date_min_val,
@@ -360,12 +565,7 @@ FROM
     LEFT JOIN [dominho].[dominho].[DOSSIER_SPECIALITE_SPECIALITE] dss ON dss.dossier_specialite_id = ds.dossier_specialite_id
     LEFT JOIN [dominho].[dominho].[CENTRE_RESPONSABILITE_SPECIALITE] crs ON crs.specialite_code = dss.specialite_code
     LEFT JOIN noyau.coeur.CENTRE_RESPONSABILITE cr4 ON cr4.cr_code = crs.centre_responsabilite_code
-    LEFT JOIN (
-        SELECT fhs2.fiche_id, Min(fhs2.fic_date_statut_validation) AS date_min_val
-        FROM DOMINHO.dominho.FICHE_HISTORIQUE_STATUT fhs2
-        WHERE fhs2.fic_statut_validation_id = 3
-        GROUP BY fhs2.fiche_id
-    ) AS fhs2 ON f.fiche_id = fhs2.fiche_id
+    LEFT JOIN {validation_join} AS fhs2 ON f.fiche_id = fhs2.fiche_id
     INNER JOIN DOMINHO.dominho.FORMULAIRE_SELECTION dfs ON f.formulaire_selection_id = dfs.formulaire_selection_id
         AND dfs.fos_libelle NOT LIKE '%HDJ%'
         AND dfs.fos_libelle NOT LIKE '%extraction%'
@@ -410,12 +610,39 @@ WHERE
     AND s2.sej_uf_medicale_code IN ('290A', '294U')))
     AND (format(p.pat_date_deces, 'yyyy/MM/dd') > format(s2.sej_date_sortie, 'yyyy/MM/dd')
       OR p.pat_date_deces IS NULL)
+    {delta_condition}
+    {specialite_filter}
     """
 
     # Requête SQL complète
     sql_query = sql_query_part1
     if include_second_part:
         sql_query += sql_query_part2
+    return sql_header, sql_query
+
+
+def execute_query(
+    conn, start_date=None, end_date=None, venues=None, modified_since=None, specialites=None, fields=None
+):
+    # `fields` : colonnes renvoyées par la requête complète. La variante en cache ramène toutes les colonnes
+    # de faits (nécessaires à la résolution des dimensions) : la projection est faite par build_patient_records
+    # Tables de référence en cache : la base ne calcule plus que les faits
+    if DIMENSION_CACHE_ENABLED and dimension_cache.ready:
+        return execute_fact_query(conn, start_date, end_date, venues, modified_since, specialites)
+
+    cursor = conn.cursor()
+
+    # Timeout au niveau du curseur
+    cursor.execute("SET LOCK_TIMEOUT 15000")
+
+    sql_header, sql_query = report_query_sql(start_date, end_date, venues, modified_since, specialites)
+
+    # Projection : le DISTINCT porte toujours sur la ligne complète (même nombre de lignes), seules les colonnes
+    # demandées sont transférées
+    if fields:
+        select_list = ", ".join(f"[{column}]" for column in fields)
+        sql_query = f"SELECT {select_list} FROM ({sql_query}) AS projection"
+    sql_query = sql_header + sql_query
 
     try:
         cursor.execute(sql_query)
@@ -432,68 +659,281 @@ WHERE
     finally:
         cursor.close()
 
+# Indicateurs IQSS : spécialité × mois de sortie × canal (statut de la boîte d'envoi), plus le total (GROUPING SETS)
+KPI_DIMENSIONS = "annee, mois_num, mois, CR_Doss_spe, [Statut Envoi]"
+KPI_TOTAL_COLUMNS = [
+    "nb_lignes", "nb_ll", "nb_ll_j0", "nb_patients", "ll_j0_moyen", "ll_j0_median",
+    "delai_diffusion_moyen", "delai_diffusion_median",
+]
+
+
+def kpi_query_sql(start_date=None, end_date=None, venues=None, specialites=None):
+    """Agrégation SQL Server de la requête complète, sans limite de lignes par partie.
+
+    Médianes par PERCENTILE_CONT (fonction de fenêtre) : reprises par MAX dans le GROUP BY, médiane globale
+    pour la ligne de total. Le délai de diffusion est compté du jour de sortie au jour de diffusion.
+    """
+    sql_header, sql_query = report_query_sql(start_date, end_date, venues, specialites=specialites, row_limit=None)
+    return sql_header + f"""
+;WITH lignes AS ({sql_query}
+),
+delais AS (
+    SELECT
+        *,
+        month(sej_date_sortie) AS mois_num,
+        CASE WHEN LL_J0 = 0 THEN Num_Venue END AS venue_j0,
+        datediff(day, cast(sej_date_sortie AS date), convert(date, [Date diffusion], 103)) AS delai_diffusion
+    FROM lignes
+),
+medianes AS (
+    SELECT
+        *,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY LL_J0) OVER (PARTITION BY {KPI_DIMENSIONS}) AS ll_j0_median,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY delai_diffusion)
+            OVER (PARTITION BY {KPI_DIMENSIONS}) AS delai_diffusion_median,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY LL_J0) OVER () AS ll_j0_median_total,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY delai_diffusion) OVER () AS delai_diffusion_median_total
+    FROM delais
+)
+SELECT
+    GROUPING(annee) AS total,
+    annee,
+    mois_num,
+    mois,
+    CR_Doss_spe AS specialite,
+    [Statut Envoi] AS canal,
+    count(*) AS nb_lignes,
+    count(DISTINCT Num_Venue) AS nb_ll,
+    count(DISTINCT venue_j0) AS nb_ll_j0,
+    cast(round(100.0 * count(DISTINCT venue_j0) / nullif(count(DISTINCT Num_Venue), 0), 1) AS float) AS pct_ll_j0,
+    count(DISTINCT pat_IPP) AS nb_patients,
+    sum(LL_J0) AS ll_j0_somme,
+    avg(cast(LL_J0 AS float)) AS ll_j0_moyen,
+    CASE WHEN GROUPING(annee) = 1 THEN max(ll_j0_median_total) ELSE max(ll_j0_median) END AS ll_j0_median,
+    avg(cast(delai_diffusion AS float)) AS delai_diffusion_moyen,
+    CASE
+        WHEN GROUPING(annee) = 1 THEN max(delai_diffusion_median_total)
+        ELSE max(delai_diffusion_median)
+    END AS delai_diffusion_median
+FROM medianes
+GROUP BY GROUPING SETS (({KPI_DIMENSIONS}), ())
+ORDER BY total, annee, mois_num, specialite, canal
+"""
+
+
+def execute_kpi_query(conn, start_date=None, end_date=None, venues=None, specialites=None):
+    """Indicateurs par groupe et totaux (effectifs distincts et médianes ne s'additionnent pas entre groupes)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET LOCK_TIMEOUT 15000")
+        cursor.execute(kpi_query_sql(start_date, end_date, venues, specialites))
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+    except Exception as e:
+        logger.error(f"Erreur lors de l'exécution de la requête KPI: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erreur lors de l'exécution de la requête KPI: {str(e)}",
+        ) from None
+    finally:
+        cursor.close()
+
+    groups = []
+    totals = dict.fromkeys(KPI_TOTAL_COLUMNS)
+    for row in clean_query_results(rows, columns):
+        if row.pop("total"):
+            totals = {column: row[column] for column in KPI_TOTAL_COLUMNS}
+        else:
+            groups.append(row)
+    return {"groups": groups, "totals": totals}
+
+
+def database_snapshot_time(conn):
+    """Horodatage du serveur SQL (GETDATE()), pris avant la requête : point de départ du prochain delta.
+
+    Les dates de création/modification des fiches sont écrites à l'heure du serveur : une horloge de l'API en
+    avance ferait manquer au delta suivant les fiches modifiées pendant l'écart. Avec l'index des validations,
+    l'horodatage recule au début de son dernier rafraîchissement (validations pas encore indexées).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT CONVERT(varchar(19), GETDATE(), 126)")
+        return validation_watermark(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+
+def validate_query_dates(start_date, end_date):
+    """Valide le format YYYY-MM-DD des dates de la requête"""
+    if start_date:
+        try:
+            datetime.strptime(start_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Format de date de début invalide. Utilisez YYYY-MM-DD",
+            )
+
+    if end_date:
+        try:
+            datetime.strptime(end_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Format de date de fin invalide. Utilisez YYYY-MM-DD",
+            )
+
+
+def build_patient_records(results, fields=None):
+    """Convertit les résultats bruts en instances du modèle PatientRecord (restreint à `fields` s'il est fourni)"""
+    record_model = projected_record_model(tuple(fields)) if fields else PatientRecord
+    processed_results = []
+    for item in results:
+        item_copy = item.copy()
+
+        # Nettoyer les valeurs nulles
+        if item_copy.get("CR_Doss_spe") is None:
+            item_copy["CR_Doss_spe"] = ""
+        if item_copy.get("CR_courrier") is None:
+            item_copy["CR_courrier"] = ""
+        if item_copy.get("Type_courrier") is None:
+            item_copy["Type_courrier"] = ""
+        if item_copy.get("Dos_Spe_ESL") is None:
+            item_copy["Dos_Spe_ESL"] = ""
+        if item_copy.get("Statut Envoi") is None:
+            item_copy["Statut Envoi"] = ""
+
+        try:
+            record = record_model(**item_copy)
+            processed_results.append(record)
+        except Exception as validation_error:
+            logger.warning(f"Erreur validation: {validation_error}")
+            continue
+
+    return processed_results
+
+
+def parse_record_fields(fields):
+    """Colonnes demandées par `fields=` (erreur 400 pour une colonne inconnue)"""
+    try:
+        return parse_fields(fields, list(PATIENT_RECORD_COLUMNS))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from None
+
+
+def patient_records_response(response, records, columns, snapshot_time):
+    """Réponse des routes comptes-rendus, avec l'en-tête X-Snapshot-Time.
+
+    Avec une projection, seules les colonnes demandées sont sérialisées (hors response_model complet).
+    """
+    if columns:
+        content = [record.model_dump(mode="json", by_alias=True) for record in records]
+        return JSONResponse(content=content, headers={"X-Snapshot-Time": snapshot_time})
+    response.headers["X-Snapshot-Time"] = snapshot_time
+    return records
+
+
 # Routes de l'API Easily (identiques mais avec logging réduit)
 @app.get("/api/patients/comptes-rendus", response_model=list[PatientRecord] )
 def get_patient_reports(
+    response: Response,
+    current_user: Annotated[str, Depends(get_current_user)],
     start_date: Annotated[str | None, Query(description="Date de début (format YYYY-MM-DD)")] = None,
     end_date: Annotated[str | None, Query(description="Date de fin (format YYYY-MM-DD)")] = None,
     venues: Annotated[str | None, Query(description="Liste de numéros de séjour séparés par des virgules")] = None,
-    current_user: str = Depends(get_current_user)
+    specialites: Annotated[
+        list[str] | None, Query(description="Spécialités (CR_Doss_spe) à conserver, filtrées dans la requête")
+    ] = None,
+    fields: Annotated[
+        str | None, Query(description="Colonnes à renvoyer, séparées par des virgules (toutes par défaut)")
+    ] = None,
 ):
+    columns = parse_record_fields(fields)
     try:
         # Validation des dates
-        if start_date:
-            try:
-                datetime.strptime(start_date, "%Y-%m-%d")
-            except ValueError:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Format de date de début invalide. Utilisez YYYY-MM-DD",
-                )
-
-        if end_date:
-            try:
-                datetime.strptime(end_date, "%Y-%m-%d")
-            except ValueError:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Format de date de fin invalide. Utilisez YYYY-MM-DD",
-                )
+        validate_query_dates(start_date, end_date)
 
         # Obtenir une connexion à la base de données
         conn = get_db_connection()
-        results = execute_query(conn, start_date, end_date, venues)
+        snapshot_time = database_snapshot_time(conn)
+        results = execute_query(conn, start_date, end_date, venues, specialites=specialites, fields=columns)
         conn.close()
 
-        # Convertir les résultats bruts en instances du modèle PatientRecord
-        processed_results = []
-        for item in results:
-            item_copy = item.copy()
-
-            # Nettoyer les valeurs nulles
-            if item_copy.get("CR_Doss_spe") is None:
-                item_copy["CR_Doss_spe"] = ""
-            if item_copy.get("CR_courrier") is None:
-                item_copy["CR_courrier"] = ""
-            if item_copy.get("Type_courrier") is None:
-                item_copy["Type_courrier"] = ""
-            if item_copy.get("Dos_Spe_ESL") is None:
-                item_copy["Dos_Spe_ESL"] = ""
-            if item_copy.get("Statut Envoi") is None:
-                item_copy["Statut Envoi"] = ""
-
-            try:
-                record = PatientRecord(**item_copy)
-                processed_results.append(record)
-            except Exception as validation_error:
-                logger.warning(f"Erreur validation: {validation_error}")
-                continue
-
-        return processed_results
+        return patient_records_response(response, build_patient_records(results, columns), columns, snapshot_time)
     except Exception as e:
         logger.error(f"Erreur: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) from None
-    
+
+
+@app.get("/api/patients/comptes-rendus/delta", response_model=list[PatientRecord])
+def get_patient_reports_delta(
+    response: Response,
+    current_user: Annotated[str, Depends(get_current_user)],
+    since: Annotated[str, Query(description="Horodatage de référence (format YYYY-MM-DDTHH:MM:SS)")],
+    start_date: Annotated[str | None, Query(description="Date de début (format YYYY-MM-DD)")] = None,
+    end_date: Annotated[str | None, Query(description="Date de fin (format YYYY-MM-DD)")] = None,
+    venues: Annotated[str | None, Query(description="Liste de numéros de séjour séparés par des virgules")] = None,
+    specialites: Annotated[
+        list[str] | None, Query(description="Spécialités (CR_Doss_spe) à conserver, filtrées dans la requête")
+    ] = None,
+    fields: Annotated[
+        str | None, Query(description="Colonnes à renvoyer, séparées par des virgules (toutes par défaut)")
+    ] = None,
+):
+    """Renvoie uniquement les fiches créées, modifiées, validées ou diffusées depuis `since` sur la période demandée
+    (ainsi que celles des séjours à la sortie récente, voir build_query_conditions).
+
+    L'en-tête X-Snapshot-Time indique l'horodatage à réutiliser comme `since` au prochain appel.
+    """
+    validate_query_dates(start_date, end_date)
+    columns = parse_record_fields(fields)
+    try:
+        modified_since = datetime.fromisoformat(since).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Format d'horodatage invalide. Utilisez YYYY-MM-DDTHH:MM:SS",
+        ) from None
+
+    try:
+        conn = get_db_connection()
+        snapshot_time = database_snapshot_time(conn)
+        results = execute_query(
+            conn, start_date, end_date, venues, modified_since=modified_since, specialites=specialites, fields=columns
+        )
+        conn.close()
+
+        return patient_records_response(response, build_patient_records(results, columns), columns, snapshot_time)
+    except Exception as e:
+        logger.error(f"Erreur delta: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e)) from None
+
+
+@app.get("/api/patients/comptes-rendus/kpis")
+def get_patient_reports_kpis(
+    current_user: Annotated[str, Depends(get_current_user)],
+    start_date: Annotated[str | None, Query(description="Date de début (format YYYY-MM-DD)")] = None,
+    end_date: Annotated[str | None, Query(description="Date de fin (format YYYY-MM-DD)")] = None,
+    venues: Annotated[str | None, Query(description="Liste de numéros de séjour séparés par des virgules")] = None,
+    specialites: Annotated[
+        list[str] | None, Query(description="Spécialités (CR_Doss_spe) à conserver, filtrées dans la requête")
+    ] = None,
+):
+    """Indicateurs IQSS agrégés par SQL Server par spécialité × mois × canal (quelques centaines de lignes).
+
+    Même sélection que /api/patients/comptes-rendus, sur toutes les lignes (sans DISTINCT TOP 5000 par partie) :
+    `groups` (une ligne par groupe) et `totals` (mêmes indicateurs sur toutes les lignes).
+    """
+    validate_query_dates(start_date, end_date)
+    try:
+        conn = get_db_connection()
+        result = execute_kpi_query(conn, start_date, end_date, venues, specialites)
+        conn.close()
+        return result
+    except Exception as e:
+        logger.error(f"Erreur KPI: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e)) from None
+
 
 # Route de connexion pour obtenir le token
 @app.post("/token")
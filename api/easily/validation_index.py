@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Table locale fiche_id -> date_min_val (ex: "IQSS.dbo.FICHE_DATE_MIN_VAL").
+# Si non configurée, la requête agrège FICHE_HISTORIQUE_STATUT à chaque appel comme auparavant.
+VALIDATION_INDEX_TABLE = os.getenv("VALIDATION_INDEX_TABLE")
+VALIDATION_INDEX_REFRESH_SECONDS = int(os.getenv("VALIDATION_INDEX_REFRESH_SECONDS", "300"))
+# Fenêtre relue à chaque rafraîchissement (en jours avant la plus récente première validation connue) : une
+# validation saisie en retard ou antidatée de moins de VALIDATION_INDEX_RESCAN_DAYS est intégrée au passage suivant
+VALIDATION_INDEX_RESCAN_DAYS = int(os.getenv("VALIDATION_INDEX_RESCAN_DAYS", "7"))
+# Relecture complète de l'historique (MERGE sans fenêtre) pour les validations antidatées au-delà de la fenêtre
+VALIDATION_INDEX_FULL_RESCAN_HOURS = int(os.getenv("VALIDATION_INDEX_FULL_RESCAN_HOURS", "24"))
+
+# Agrégation complète de l'historique (chemin historique, sans index)
+AGGREGATE_SUBQUERY = """(
+        SELECT fhs2.fiche_id, Min(fhs2.fic_date_statut_validation) AS date_min_val
+        FROM DOMINHO.dominho.FICHE_HISTORIQUE_STATUT fhs2
+        WHERE fhs2.fic_statut_validation_id = 3
+        GROUP BY fhs2.fiche_id
+    )"""
+
+_index_ready = False
+# Heure du serveur SQL au début du dernier rafraîchissement réussi : l'index ne contient que les validations
+# enregistrées avant
+_indexed_until = None
+_refresh_stop = threading.Event()
+
+
+def _build_index(cursor, table):
+    """Construit l'index une seule fois à partir de tout l'historique"""
+    index_name = f"IX_{table.split('.')[-1]}_fiche_id"
+    cursor.execute(f"""
+    SELECT fiche_id, MIN(fic_date_statut_validation) AS date_min_val
+    INTO {table}
+    FROM DOMINHO.dominho.FICHE_HISTORIQUE_STATUT
+    WHERE fic_statut_validation_id = 3
+    GROUP BY fiche_id
+    """)
+    cursor.execute(f"CREATE UNIQUE CLUSTERED INDEX {index_name} ON {table} (fiche_id)")
+
+
+def _refresh_index(cursor, table, rescan_days=None):
+    """Intègre les premières validations de la fenêtre glissante (toute la table sans `rescan_days`).
+
+    FICHE_HISTORIQUE_STATUT n'a ni rowversion ni date d'insertion : la fenêtre part de la plus récente
+    première validation connue moins `rescan_days` jours, pour rattraper les validations saisies en retard
+    ou antidatées. Une revalidation ne modifie date_min_val que si elle est plus ancienne (MIN conservé).
+    """
+    window = f"AND fic_date_statut_validation >= DATEADD(day, -{int(rescan_days)}, @watermark)" if rescan_days else ""
+    cursor.execute(f"""
+    DECLARE @watermark DATETIME = ISNULL((SELECT MAX(date_min_val) FROM {table}), '19000101');
+
+    MERGE {table} WITH (HOLDLOCK) AS idx
+    USING (
+        SELECT fiche_id, MIN(fic_date_statut_validation) AS date_min_val
+        FROM DOMINHO.dominho.FICHE_HISTORIQUE_STATUT
+        WHERE fic_statut_validation_id = 3
+            {window}
+        GROUP BY fiche_id
+    ) AS src ON idx.fiche_id = src.fiche_id
+    WHEN MATCHED AND src.date_min_val < idx.date_min_val THEN
+        UPDATE SET date_min_val = src.date_min_val
+    WHEN NOT MATCHED THEN
+        INSERT (fiche_id, date_min_val) VALUES (src.fiche_id, src.date_min_val);
+    """)
+
+
+def refresh_validation_index(get_connection, full_rescan=False):
+    """Construit l'index s'il n'existe pas, sinon le met à jour ; en cas d'échec l'index existant reste servi"""
+    global _index_ready, _indexed_until
+
+    start_time = time.time()
+    try:
+        conn = get_connection()
+    except Exception as e:
+        logger.error(f"Erreur maintenance index des validations: {str(e)}")
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT CASE WHEN OBJECT_ID('{VALIDATION_INDEX_TABLE}', 'U') IS NULL THEN 0 ELSE 1 END")
+        exists = cursor.fetchone()[0] == 1
+        cursor.execute("SELECT CONVERT(varchar(19), GETDATE(), 126)")
+        started_at = cursor.fetchone()[0]
+        if exists:
+            _refresh_index(cursor, VALIDATION_INDEX_TABLE, None if full_rescan else VALIDATION_INDEX_RESCAN_DAYS)
+        else:
+            _build_index(cursor, VALIDATION_INDEX_TABLE)
+        conn.commit()
+        _indexed_until = started_at
+        _index_ready = True
+        if exists:
+            logger.info(f"Index des validations rafraîchi en {time.time() - start_time:.2f}s")
+        else:
+            logger.warning(f"Index des validations construit en {time.time() - start_time:.2f}s")
+    except Exception as e:
+        logger.error(f"Erreur maintenance index des validations: {str(e)}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def start_validation_refresh(get_connection):
+    """Maintient l'index dans un thread de fond : les requêtes n'attendent jamais sa construction ni son MERGE"""
+    if not VALIDATION_INDEX_TABLE:
+        return
+
+    def refresh_loop():
+        last_full_rescan = time.monotonic()
+        while True:
+            full_rescan = time.monotonic() - last_full_rescan >= VALIDATION_INDEX_FULL_RESCAN_HOURS * 3600
+            refresh_validation_index(get_connection, full_rescan)
+            if full_rescan:
+                last_full_rescan = time.monotonic()
+            if _refresh_stop.wait(VALIDATION_INDEX_REFRESH_SECONDS):
+                break
+
+    thread = threading.Thread(target=refresh_loop, name="validation-index-refresh", daemon=True)
+    thread.start()
+
+
+def stop_validation_refresh():
+    _refresh_stop.set()
+
+
+def validation_source():
+    """Source SQL de date_min_val par fiche_id à joindre dans la requête principale.
+
+    L'index local dès qu'il est prêt (même un peu en retard), sinon l'agrégation complète.
+    """
+    if VALIDATION_INDEX_TABLE and _index_ready:
+        return VALIDATION_INDEX_TABLE
+    return AGGREGATE_SUBQUERY
+
+
+def validation_watermark(snapshot_time):
+    """Horodatage (ISO, horloge SQL Server) à partir duquel le prochain delta doit reprendre.
+
+    Avec l'index, une validation enregistrée depuis son dernier rafraîchissement n'est pas encore visible :
+    le delta repart du début de ce rafraîchissement plutôt que de `snapshot_time`.
+    """
+    if VALIDATION_INDEX_TABLE and _index_ready and _indexed_until:
+        return min(snapshot_time, _indexed_until)
+    return snapshot_time
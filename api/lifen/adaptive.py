@@ -0,0 +1,90 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Taille adaptative des unités de travail (jours par chunk de période, venues par lot Oracle), de type AIMD :
+# tant que la latence observée reste sous la cible, la taille augmente d'un pas (additif), plafonnée par la taille
+# que la latence par élément permet de traiter dans la cible ; au-delà de la cible, sur erreur ou si la limite
+# de lignes de la requête est atteinte, elle est multipliée par ADAPTIVE_DECREASE_FACTOR. Avec une limite de
+# lignes, la taille est en outre bornée par le nombre d'éléments que la densité observée (lignes par élément)
+# permet de loger sous ADAPTIVE_ROW_HEADROOM × limite.
+
+ADAPTIVE_CHUNK_TARGET_SECONDS = float(os.getenv("ADAPTIVE_CHUNK_TARGET_SECONDS", "20"))
+ADAPTIVE_BATCH_TARGET_SECONDS = float(os.getenv("ADAPTIVE_BATCH_TARGET_SECONDS", "5"))
+ADAPTIVE_DECREASE_FACTOR = float(os.getenv("ADAPTIVE_DECREASE_FACTOR", "0.5"))
+ADAPTIVE_ROW_HEADROOM = float(os.getenv("ADAPTIVE_ROW_HEADROOM", "0.8"))
+
+
+class AimdController:
+    """Taille de la prochaine unité de travail, ajustée après chaque unité (sûr entre threads)"""
+
+    def __init__(self, name, initial, minimum, maximum, step, target_seconds, row_limit=None):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.target_seconds = target_seconds
+        self.row_limit = row_limit
+        self.size = max(minimum, min(maximum, initial))
+        self.rows_per_item = None
+        self.seconds_per_item = None
+        self._lock = threading.Lock()
+
+    def next_size(self):
+        with self._lock:
+            return self.size
+
+    def state(self):
+        """Taille courante et densité / latence moyennes par élément observées"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "rows_per_item": self.rows_per_item,
+                "seconds_per_item": self.seconds_per_item,
+                "row_limit": self.row_limit,
+            }
+
+    def _row_capacity(self):
+        # Nombre d'éléments dont les lignes attendues tiennent sous la limite, avec une marge
+        if not self.row_limit or not self.rows_per_item:
+            return self.maximum
+        return int(self.row_limit * ADAPTIVE_ROW_HEADROOM / self.rows_per_item)
+
+    def _set_size(self, size, reason):
+        previous = self.size
+        self.size = max(self.minimum, min(self.maximum, self._row_capacity(), int(size)))
+        density = "densité inconnue"
+        if self.rows_per_item is not None:
+            density = f"{self.rows_per_item:.1f} lignes/élément"
+        logger.info(f"⚙️ {self.name}: {previous} → {self.size} ({reason}, {density})")
+
+    def record(self, size, rows, latency):
+        """Unité de `size` éléments traitée en `latency` secondes avec `rows` lignes"""
+        if size <= 0:
+            return
+        with self._lock:
+            self.rows_per_item = _ewma(self.rows_per_item, rows / size)
+            self.seconds_per_item = _ewma(self.seconds_per_item, latency / size)
+
+            # Nombre d'éléments que la latence observée par élément permet de traiter dans la cible
+            fitting = self.target_seconds / (latency / size) if latency > 0 else self.maximum
+            if self.row_limit and rows >= self.row_limit:
+                self._set_size(size * ADAPTIVE_DECREASE_FACTOR, f"limite de {self.row_limit} lignes atteinte")
+            elif latency > self.target_seconds:
+                self._set_size(
+                    min(size * ADAPTIVE_DECREASE_FACTOR, fitting),
+                    f"{latency:.1f}s > cible {self.target_seconds:.0f}s",
+                )
+            else:
+                self._set_size(min(size + self.step, fitting), f"{latency:.1f}s ≤ cible {self.target_seconds:.0f}s")
+
+    def record_failure(self, size, error):
+        """Unité en échec (timeout, erreur base) : diminution multiplicative"""
+        with self._lock:
+            self._set_size(size * ADAPTIVE_DECREASE_FACTOR, f"échec: {error}")
+
+
+def _ewma(previous, value):
+    return value if previous is None else 0.7 * previous + 0.3 * value
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+# Checkpoints des chunks de période terminés : un fichier JSON par chunk. Une requête synchrone incomplète
+# laisse ses checkpoints dans LIFEN_CHECKPOINT_DIR (clé : paramètres de la requête), et sa relance ne refait
+# que les jours qu'ils ne couvrent pas (les bornes des chunks peuvent changer d'une exécution à l'autre).
+# Au-delà de LIFEN_CHECKPOINT_MAX_AGE_HOURS, un checkpoint est ignoré (données périmées).
+# Deux requêtes identiques simultanées partagent le dossier : chacune s'y déclare (`with checkpoints:`) et
+# seule la dernière à terminer le supprime.
+
+LIFEN_CHECKPOINT_DIR = Path(os.getenv("LIFEN_CHECKPOINT_DIR", Path(__file__).resolve().parent / "checkpoints"))
+LIFEN_CHECKPOINT_MAX_AGE_HOURS = int(os.getenv("LIFEN_CHECKPOINT_MAX_AGE_HOURS", "24"))
+
+# Nombre de requêtes en cours par dossier de checkpoints
+_users = {}
+_users_lock = threading.Lock()
+
+
+def write_json(path, data):
+    """Écriture atomique (fichier temporaire propre au thread puis renommage) : un fichier n'est jamais lu à
+    moitié écrit, même si deux threads écrivent le même fichier"""
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    tmp_path.replace(path)
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ChunkCheckpoints:
+    """Documents des chunks terminés, dans un dossier"""
+
+    def __init__(self, directory, max_age_hours=None):
+        self.directory = Path(directory)
+        self.max_age_hours = max_age_hours
+
+    def __enter__(self):
+        with _users_lock:
+            _users[self.directory] = _users.get(self.directory, 0) + 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with _users_lock:
+            _users[self.directory] -= 1
+            if not _users[self.directory]:
+                del _users[self.directory]
+
+    def _path(self, chunk_start, chunk_end):
+        return self.directory / f"{chunk_start}_{chunk_end}.json"
+
+    def _is_fresh(self, path):
+        try:
+            return not self.max_age_hours or time.time() - path.stat().st_mtime <= self.max_age_hours * 3600
+        except OSError:
+            return False
+
+    def load(self, chunk_start, chunk_end):
+        """Documents du chunk, ou None s'il n'a pas de checkpoint valide"""
+        path = self._path(chunk_start, chunk_end)
+        if not self._is_fresh(path):
+            return None
+        try:
+            return read_json(path)
+        except (OSError, ValueError):
+            return None
+
+    def _chunks(self):
+        """(début, fin) des checkpoints valides du dossier"""
+        try:
+            paths = list(self.directory.glob("*.json"))
+        except OSError:
+            return []
+        chunks = []
+        for path in paths:
+            chunk_start, _, chunk_end = path.stem.partition("_")
+            if self._is_fresh(path):
+                chunks.append((chunk_start, chunk_end))
+        return sorted(chunks)
+
+    def starting_at(self, chunk_start):
+        """(fin, documents) du checkpoint qui commence à `chunk_start`, ou None"""
+        for start, end in self._chunks():
+            if start == chunk_start:
+                records = self.load(start, end)
+                return (end, records) if records is not None else None
+        return None
+
+    def next_start_after(self, day):
+        """Début du premier checkpoint postérieur à `day` (AAAA-MM-JJ), ou None"""
+        return next((start for start, _ in self._chunks() if start > day), None)
+
+    def save(self, chunk_start, chunk_end, records):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_json(self._path(chunk_start, chunk_end), records)
+
+    def clear(self):
+        """Supprime les checkpoints, sauf si une autre requête les utilise encore (elle les supprimera).
+
+        Retourne True si le dossier a été supprimé.
+        """
+        with _users_lock:
+            if _users.get(self.directory, 0) > 1:
+                return False
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return True
+
+
+def request_checkpoints(params):
+    """Checkpoints d'une requête synchrone, identifiée par ses paramètres"""
+    key = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:32]
+    return ChunkCheckpoints(LIFEN_CHECKPOINT_DIR / key, LIFEN_CHECKPOINT_MAX_AGE_HOURS)
@@ -0,0 +1,207 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from checkpoints import ChunkCheckpoints, read_json, write_json
+from progress import start_progress
+from retry import retry_call
+
+logger = logging.getLogger(__name__)
+
+# Extractions Lifen longues exécutées en tâche de fond, hors du cycle requête/réponse HTTP.
+# Chaque job a son dossier dans LIFEN_JOBS_DIR : job.json (état), un checkpoint JSON par chunk de période
+# terminé et result.json une fois tous les chunks obtenus. Relancer un job ne refait que les chunks sans
+# checkpoint. Les jobs terminés depuis plus de LIFEN_JOBS_MAX_AGE_HOURS sont supprimés. Au démarrage de l'API,
+# les jobs restés "queued" ou "running" (arrêt de l'API en cours d'exécution) passent en échec : leur relance,
+# avec un jeton valide, reprend les chunks sans checkpoint.
+
+LIFEN_JOBS_DIR = Path(os.getenv("LIFEN_JOBS_DIR", Path(__file__).resolve().parent / "jobs"))
+LIFEN_JOBS_MAX_WORKERS = int(os.getenv("LIFEN_JOBS_MAX_WORKERS", "2"))
+LIFEN_JOBS_MAX_AGE_HOURS = int(os.getenv("LIFEN_JOBS_MAX_AGE_HOURS", "72"))
+
+_executor = ThreadPoolExecutor(max_workers=LIFEN_JOBS_MAX_WORKERS, thread_name_prefix="lifen-job")
+_lock = threading.Lock()
+# Jobs en file ou en cours (un job n'est jamais exécuté deux fois en parallèle)
+_active = set()
+
+
+def _job_dir(job_id):
+    return LIFEN_JOBS_DIR / job_id
+
+
+def _checkpoints(job_id):
+    return ChunkCheckpoints(_job_dir(job_id) / "chunks")
+
+
+def _save_job(job):
+    job["updated_at"] = datetime.now().isoformat()
+    write_json(_job_dir(job["job_id"]) / "job.json", job)
+
+
+def load_job(job_id):
+    """État d'un job, ou None s'il est inconnu"""
+    try:
+        return read_json(_job_dir(job_id) / "job.json")
+    except (OSError, ValueError):
+        return None
+
+
+def read_result(job_id):
+    """Documents d'un job terminé (dictionnaires JSON)"""
+    return read_json(_job_dir(job_id) / "result.json")
+
+
+def _purge_old_jobs():
+    """Supprime les jobs terminés trop anciens"""
+    if not LIFEN_JOBS_DIR.is_dir():
+        return
+    limit = time.time() - LIFEN_JOBS_MAX_AGE_HOURS * 3600
+    for job_dir in LIFEN_JOBS_DIR.iterdir():
+        if not job_dir.is_dir() or job_dir.name in _active:
+            continue
+        job_file = job_dir / "job.json"
+        if job_file.exists() and job_file.stat().st_mtime < limit:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def recover_interrupted_jobs():
+    """Passe en échec les jobs "queued" ou "running" qu'aucun thread n'exécute (API arrêtée en cours de job).
+
+    Ils ne sont pas relancés automatiquement : le jeton de l'utilisateur, nécessaire aux appels Easily, n'est
+    pas conservé. Retourne les identifiants des jobs concernés.
+    """
+    if not LIFEN_JOBS_DIR.is_dir():
+        return []
+    recovered = []
+    for job_dir in LIFEN_JOBS_DIR.iterdir():
+        with _lock:
+            if job_dir.name in _active:
+                continue
+        job = load_job(job_dir.name)
+        if job is None or job["status"] not in ("queued", "running"):
+            continue
+        job["status"] = "failed"
+        job["error"] = "Job interrompu par un arrêt de l'API, relancer le job pour reprendre les chunks restants"
+        _save_job(job)
+        recovered.append(job["job_id"])
+    if recovered:
+        logger.warning(f"{len(recovered)} job(s) interrompu(s) passé(s) en échec: {', '.join(recovered)}")
+    return recovered
+
+
+def _finish_job(job):
+    """Enregistre l'état final du job et le retire des jobs actifs en une seule étape : une relance demandée
+    dès la lecture de ce statut n'est pas ignorée comme si le job tournait encore"""
+    with _lock:
+        _save_job(job)
+        _active.discard(job["job_id"])
+
+
+def _run_job(job_id, fetch_chunk, merge):
+    try:
+        job = load_job(job_id)
+        job["status"] = "running"
+        job["failed_chunks"] = []
+        _save_job(job)
+
+        progress = start_progress(job_id, job["username"])
+        progress.add_units(len(job["chunks"]))
+        checkpoints = _checkpoints(job_id)
+
+        for chunk_start, chunk_end in job["chunks"]:
+            started = time.time()
+
+            # Chunk déjà obtenu par une exécution précédente
+            records = checkpoints.load(chunk_start, chunk_end)
+            if records is not None:
+                progress.unit_done(len(records), 0.0)
+                continue
+
+            try:
+                records = retry_call(f"Job {job_id}: chunk {chunk_start}", fetch_chunk, chunk_start, chunk_end)
+            except Exception as e:
+                logger.error(f"Job {job_id}: chunk {chunk_start} → {chunk_end} échoué: {str(e)}")
+                job["failed_chunks"].append({"start": chunk_start, "end": chunk_end, "error": str(e)})
+                progress.unit_done(0, time.time() - started)
+                continue
+
+            checkpoints.save(chunk_start, chunk_end, records)
+            progress.unit_done(len(records), time.time() - started)
+            logger.info(f"Job {job_id}: chunk {chunk_start} → {chunk_end}, {len(records)} documents")
+
+        if job["failed_chunks"]:
+            job["status"] = "failed"
+            job["error"] = f"{len(job['failed_chunks'])} chunk(s) en échec, relancer le job pour les reprendre"
+            progress.finish(error=job["error"])
+        else:
+            records = []
+            for chunk_start, chunk_end in job["chunks"]:
+                records.extend(checkpoints.load(chunk_start, chunk_end))
+            records = merge(records)
+            write_json(_job_dir(job_id) / "result.json", records)
+            job["status"] = "done"
+            job["error"] = None
+            job["rows"] = len(records)
+            progress.finish()
+        _finish_job(job)
+        logger.info(f"Job {job_id} terminé: {job['status']}")
+
+    except Exception as e:
+        logger.error(f"Job {job_id} interrompu: {str(e)}", exc_info=True)
+        job = load_job(job_id)
+        if job:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            _finish_job(job)
+    finally:
+        with _lock:
+            _active.discard(job_id)
+
+
+def _enqueue(job, fetch_chunk, merge):
+    with _lock:
+        if job["job_id"] in _active:
+            return job
+        _active.add(job["job_id"])
+    job["status"] = "queued"
+    _save_job(job)
+    _executor.submit(_run_job, job["job_id"], fetch_chunk, merge)
+    return job
+
+
+def submit_job(params, chunks, fetch_chunk, merge, username):
+    """Crée un job pour les chunks de période donnés et le place dans la file.
+
+    `fetch_chunk(debut, fin)` retourne les documents JSON d'un chunk ; `merge(documents)` déduplique
+    les documents de tous les chunks.
+    """
+    _purge_old_jobs()
+    job_id = uuid.uuid4().hex
+    (_job_dir(job_id) / "chunks").mkdir(parents=True)
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "params": params,
+        "username": username,
+        "chunks": [list(chunk) for chunk in chunks],
+        "failed_chunks": [],
+        "rows": None,
+        "error": None,
+        "created_at": datetime.now().isoformat(),
+    }
+    return _enqueue(job, fetch_chunk, merge)
+
+
+def retry_job(job, fetch_chunk, merge):
+    """Relance un job en échec ou interrompu par un arrêt de l'API : seuls les chunks sans checkpoint sont refaits"""
+    with _lock:
+        active = job["job_id"] in _active
+    if job["status"] == "done" or active:
+        return job
+    return _enqueue(job, fetch_chunk, merge)
@@ -0,0 +1,106 @@
+# Indicateurs de diffusion agrégés par Oracle : service × mois d'envoi × canal (+ résultat et type de destinataire).
+# Chaque lot de venues renvoie ses groupes et l'histogramme des délais envoi - sortie (jours) de chaque groupe. Les lots
+# portent sur des séjours distincts : diffusions et séjours distincts s'additionnent entre lots, moyennes et médianes
+# sont calculées sur les histogrammes fusionnés.
+
+KPI_DIMENSIONS = ("mois", "service", "canal_envoi", "statut_envoi", "role_destinataire")
+
+# Expressions Oracle des dimensions et du délai (TRUNC : DATE_ENVOI peut porter une heure)
+KPI_DIMENSION_SQL = "TO_CHAR(DATE_ENVOI, 'YYYY-MM'), SERVICE, CANAL_ENVOI, STATUT_ENVOI, ROLE_DESTINATAIRE"
+KPI_DELAY_SQL = "TRUNC(DATE_ENVOI) - TRUNC(DATE_SORTIE)"
+
+
+def kpi_select(venue_predicate, filter_conditions):
+    """Requête d'agrégation d'un lot : groupes, histogramme des délais par groupe et total du lot"""
+    return f"""
+    SELECT
+        GROUPING(TO_CHAR(DATE_ENVOI, 'YYYY-MM')) AS total,
+        GROUPING({KPI_DELAY_SQL}) AS sans_delai,
+        TO_CHAR(DATE_ENVOI, 'YYYY-MM') AS mois,
+        SERVICE, CANAL_ENVOI, STATUT_ENVOI, ROLE_DESTINATAIRE,
+        {KPI_DELAY_SQL} AS delai_envoi_sortie,
+        COUNT(*) AS nb_diffusions,
+        COUNT(DISTINCT NUM_SEJ) AS nb_sejours
+    FROM NEUSTE.DOCUMENTS
+    WHERE {venue_predicate}
+        AND TYPE_DOC = 'Lettre de liaison'
+        {filter_conditions}
+    GROUP BY GROUPING SETS (
+        ({KPI_DIMENSION_SQL}),
+        ({KPI_DIMENSION_SQL}, {KPI_DELAY_SQL}),
+        ()
+    )
+    """
+
+
+def histogram_median(histogram):
+    """Médiane d'un histogramme {valeur: effectif}, moyenne des deux valeurs centrales pour un effectif pair"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    lower_rank, upper_rank = (total - 1) // 2, total // 2
+    cumul = 0
+    lower = None
+    for value in sorted(histogram):
+        cumul += histogram[value]
+        if lower is None and cumul > lower_rank:
+            lower = value
+        if cumul > upper_rank:
+            return (lower + value) / 2
+
+
+def histogram_mean(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return None
+    return sum(value * count for value, count in histogram.items()) / total
+
+
+class LifenKpis:
+    """Agrégats Lifen fusionnés lot par lot (lignes de kpi_select, colonnes en minuscules)"""
+
+    def __init__(self):
+        self.groups = {}
+        self.delays = {}
+        self.total_delays = {}
+        self.nb_diffusions = 0
+        self.nb_sejours = 0
+
+    def add_rows(self, rows):
+        for row in rows:
+            if row["total"]:
+                self.nb_diffusions += row["nb_diffusions"]
+                self.nb_sejours += row["nb_sejours"]
+                continue
+            key = tuple(row[dimension] for dimension in KPI_DIMENSIONS)
+            if row["sans_delai"]:
+                counts = self.groups.setdefault(key, {"nb_diffusions": 0, "nb_sejours": 0})
+                counts["nb_diffusions"] += row["nb_diffusions"]
+                counts["nb_sejours"] += row["nb_sejours"]
+            elif row["delai_envoi_sortie"] is not None:
+                delay = int(row["delai_envoi_sortie"])
+                histogram = self.delays.setdefault(key, {})
+                histogram[delay] = histogram.get(delay, 0) + row["nb_diffusions"]
+                self.total_delays[delay] = self.total_delays.get(delay, 0) + row["nb_diffusions"]
+
+    def result(self):
+        """Groupes (ordre des dimensions) et totaux au format de /api/lifen/kpis"""
+        groups = []
+        for key in sorted(self.groups, key=lambda key: tuple((value is None, value or "") for value in key)):
+            histogram = self.delays.get(key, {})
+            groups.append(
+                {
+                    **dict(zip(KPI_DIMENSIONS, key, strict=True)),
+                    **self.groups[key],
+                    "delai_envoi_sortie_moyen": histogram_mean(histogram),
+                    "delai_envoi_sortie_median": histogram_median(histogram),
+                }
+            )
+        totals = {
+            "nb_diffusions": self.nb_diffusions,
+            "nb_sejours": self.nb_sejours,
+            "nb_reussites": sum(group["nb_diffusions"] for group in groups if group["statut_envoi"] == "Réussite"),
+            "delai_envoi_sortie_moyen": histogram_mean(self.total_delays),
+            "delai_envoi_sortie_median": histogram_median(self.total_delays),
+        }
+        return {"groups": groups, "totals": totals}
@@ -1,22 +1,33 @@
 import asyncio
+import json
 import logging
 import math
 import os
 import time
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from datetime import date, datetime, timedelta
 from typing import Annotated
 
 import oracledb
 import requests
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query, Request, Depends
+from fastapi import FastAPI, HTTPException, Query, Request, Depends, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from starlette.middleware.base import BaseHTTPMiddleware
 import sys
 sys.path.append(os.path.abspath('..'))  # Chemin vers le dossier contenant auth.py
-from auth import get_current_user
+from adaptive import ADAPTIVE_BATCH_TARGET_SECONDS, ADAPTIVE_CHUNK_TARGET_SECONDS, AimdController
+from auth import get_current_user, oauth2_scheme
+from checkpoints import request_checkpoints
+from jobs import load_job, read_result, recover_interrupted_jobs, retry_job, submit_job
+from lifen_kpis import LifenKpis, kpi_select
+from progress import get_progress, start_progress
+from projection import parse_fields
+from retry import RETRY_MAX_ATTEMPTS, CompletenessReport, IncompleteResultError, retry_call
+from venue_predicates import plan_venue_predicate
 
 # Configure logging avec niveau réduit pour éviter le spam
 logging.basicConfig(
@@ -36,11 +47,19 @@ logging.getLogger("uvicorn.error").setLevel(logging.ERROR)
 # Charger les variables d'environnement
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Jobs laissés "queued"/"running" par un arrêt de l'API : aucun thread ne les exécute plus
+    recover_interrupted_jobs()
+    yield
+
+
 # Configuration de l'application FastAPI
 app = FastAPI(
     title="API Lifen",
     description="API pour récupérer les données de diffusion Lifen depuis Oracle",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configuration CORS plus restrictive
@@ -52,6 +71,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Intervalle (secondes) entre deux lectures de l'avancement pour le flux SSE
+PROGRESS_EVENT_INTERVAL = float(os.getenv("PROGRESS_EVENT_INTERVAL", "0.5"))
+# Durée maximale d'un flux SSE d'avancement : au-delà, le flux se ferme et le client se reconnecte
+PROGRESS_STREAM_TIMEOUT = int(os.getenv("PROGRESS_STREAM_TIMEOUT", "300"))
+
 # Modèle de données pour la réponse Lifen
 class LifenRecord(BaseModel):
     # Champs existants
@@ -91,58 +115,46 @@ class LifenRecord(BaseModel):
     class Config:
         from_attributes = True
 
-# Classes pour la gestion des longues périodes avec seuils réduits
-class PeriodStrategy:
-    """Calcule la stratégie optimale selon la durée de la période"""
-
-    @staticmethod
-    def calculate_optimal_strategy(start_date: str, end_date: str) -> tuple[int, int, str]:
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-        duration = (end - start).days
-
-        # Seuils réduits pour éviter les timeouts
-        if duration <= 15:
-            return 1, duration, "direct"
-        elif duration <= 45:
-            return math.ceil(duration / 15), 15, "medium_chunks"
-        elif duration <= 120:
-            return math.ceil(duration / 10), 10, "small_chunks"
-        else:
-            return math.ceil(duration / 7), 7, "micro_chunks"
 
-    @staticmethod
-    def split_period_intelligently(start_date: str, end_date: str) -> list[tuple[str, str]]:
-        num_chunks, chunk_size, strategy = PeriodStrategy.calculate_optimal_strategy(start_date, end_date)
+# Colonnes toujours lues avec une projection `fields=` : clé de déduplication des chunks de période
+LIFEN_KEY_FIELDS = ("id_doc_lifen", "num_sej", "date_envoi")
 
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
 
-        chunks = []
-        current = start
+def parse_record_fields(fields):
+    """Colonnes demandées par `fields=` (erreur 400 pour une colonne inconnue)"""
+    try:
+        return parse_fields(fields, list(LifenRecord.model_fields), LIFEN_KEY_FIELDS)
+    except ValueError as e:
+        raise HTTPException(400, str(e)) from None
 
-        while current < end:
-            chunk_end = min(current + timedelta(days=chunk_size), end)
-            chunks.append((
-                current.strftime('%Y-%m-%d'),
-                chunk_end.strftime('%Y-%m-%d')
-            ))
-            current = chunk_end + timedelta(days=1)
 
-        return chunks
+def dump_record(record, fields=None):
+    """Document Lifen en JSON (dates ISO), restreint à `fields` s'il est fourni"""
+    return record.model_dump(mode="json", include=set(fields) if fields else None)
+
+# Durée maximale d'une requête suivie par progress_id (le client observe la progression pendant ce temps)
+LIFEN_TRACKED_REQUEST_TIMEOUT = int(os.getenv("LIFEN_TRACKED_REQUEST_TIMEOUT", "900"))
+# Seules routes dont les requêtes suivies disposent de ce budget
+TRACKED_REQUEST_PATHS = {"/api/lifen/data", "/api/lifen/kpis"}
+
 
 # Middleware de timeout plus strict
 class TimeoutMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, timeout: int = 60):  # Réduit à 60 secondes
+    def __init__(self, app, timeout: int = 60, tracked_timeout: int = LIFEN_TRACKED_REQUEST_TIMEOUT):
         super().__init__(app)
-        self.timeout = timeout
+        self.timeout = timeout  # Réduit à 60 secondes
+        self.tracked_timeout = tracked_timeout
 
     async def dispatch(self, request: Request, call_next):
+        # Requête /api/lifen/data ou /kpis suivie par progress_id : budget plus long, mais borné. Les flux d'avancement
+        # (SSE) répondent dès leurs en-têtes : leur durée est bornée par PROGRESS_STREAM_TIMEOUT
+        tracked = request.url.path in TRACKED_REQUEST_PATHS and "progress_id" in request.query_params
+        timeout = self.tracked_timeout if tracked else self.timeout
         try:
-            return await asyncio.wait_for(call_next(request), timeout=self.timeout)
+            return await asyncio.wait_for(call_next(request), timeout=timeout)
         except TimeoutError:
-            logger.error(f"⏰ Timeout {self.timeout}s pour {request.url.path}")
-            raise HTTPException(status_code=504, detail=f"Requête timeout après {self.timeout}s")
+            logger.error(f"⏰ Timeout {timeout}s pour {request.url.path}")
+            raise HTTPException(status_code=504, detail=f"Requête timeout après {timeout}s") from None
 
 # Middleware de logging des requêtes
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
@@ -221,14 +233,18 @@ async def health_check():
 
 # Fonction ultra-robuste pour l'API Easily
 
-def get_venue_numbers_from_easily(start_date: str, end_date: str, max_retries: int = 2):
-    """Version ultra-robuste avec timeout court"""
+def get_venue_numbers_from_easily(start_date: str, end_date: str, max_retries: int = 2, token: str | None = None):
+    """Version ultra-robuste avec timeout court
+
+    `token` : jeton de l'utilisateur, transmis à l'API Easily (qui exige une authentification).
+    """
 
     for attempt in range(max_retries):
         session = None
         try:
             easily_api_url = "http://localhost:8000/api/patients/comptes-rendus"
-            params = {"start_date": start_date, "end_date": end_date}
+            # Seuls les numéros de séjour sont utiles : projection de la réponse Easily
+            params = {"start_date": start_date, "end_date": end_date, "fields": "Num_Venue"}
 
             timeout = 25  # 25 secondes max
 
@@ -242,6 +258,8 @@ def get_venue_numbers_from_easily(start_date: str, end_date: str, max_retries: i
                 'User-Agent': 'Lifen-API/1.0',
                 'Keep-Alive': 'timeout=5, max=1'
             })
+            if token:
+                session.headers["Authorization"] = f"Bearer {token}"
 
             response = session.get(
                 easily_api_url,
@@ -340,233 +358,844 @@ def get_venue_numbers_from_easily(start_date: str, end_date: str, max_retries: i
                 except:
                     pass
 
-def execute_query_in_batches(conn, venues_list, start_date=None, end_date=None, batch_size=150):
-    """Version optimisée avec batches très petits SANS timeout Oracle"""
-    if not venues_list:
-        logger.warning("Liste de venues vide")
-        return []
-
-    results = []
-    total_batches = (len(venues_list) - 1) // batch_size + 1
+# Nombre maximal de documents retournés par lot de venues (ROWNUM)
+BATCH_ROW_LIMIT = 3000
+# Un lot Oracle ne peut pas dépasser 1000 éléments dans une liste IN
+MAX_BATCH_SIZE = 1000
+
+# Taille des lots de venues, commune à toutes les requêtes : la latence par venue est une propriété de la base
+venue_batch_controller = AimdController(
+    "Lots de venues",
+    initial=150,
+    minimum=25,
+    maximum=MAX_BATCH_SIZE,
+    step=25,
+    target_seconds=ADAPTIVE_BATCH_TARGET_SECONDS,
+    row_limit=BATCH_ROW_LIMIT,
+)
 
-    logger.info(f"Traitement {len(venues_list)} venues en {total_batches} lots de {batch_size}")
+# Documents visés par chunk de période : borne la durée des chunks d'après la densité observée (documents par jour)
+ADAPTIVE_CHUNK_MAX_ROWS = int(os.getenv("ADAPTIVE_CHUNK_MAX_ROWS", "20000"))
+
+# Durée des chunks de période, commune aux requêtes et aux jobs : elle apprend la densité et la latence par jour
+period_chunk_controller = AimdController(
+    "Chunks de période (jours)",
+    initial=7,
+    minimum=1,
+    maximum=31,
+    step=2,
+    target_seconds=ADAPTIVE_CHUNK_TARGET_SECONDS,
+    row_limit=ADAPTIVE_CHUNK_MAX_ROWS,
+)
 
-    for i in range(0, len(venues_list), batch_size):
-        batch_num = i // batch_size + 1
-        batch = venues_list[i:i + batch_size]
 
-        cursor = None
+def plan_period_chunks(start_date: str, end_date: str) -> list[tuple[str, str]]:
+    """Découpage de la période (bornes incluses) avec la durée courante de period_chunk_controller"""
+    chunk_days = period_chunk_controller.next_size()
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+    chunks = []
+    current = start
+    while current <= end:
+        chunk_end = min(current + timedelta(days=chunk_days - 1), end)
+        chunks.append((current.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d')))
+        current = chunk_end + timedelta(days=1)
+    return chunks
+
+
+# Filtres sur les documents appliqués dans la requête Oracle (variables liées) : colonne -> paramètre d'API
+DOCUMENT_FILTER_COLUMNS = {
+    "statut_envoi": "STATUT_ENVOI",
+    "canal_envoi": "CANAL_ENVOI",
+    "role_destinataire": "ROLE_DESTINATAIRE",
+}
+
+
+def document_filters(statut_envoi=None, canal_envoi=None, role_destinataire=None, date_envoi_min=None,
+                     date_envoi_max=None) -> dict:
+    """Filtres de documents non vides (listes de valeurs, dates AAAA-MM-JJ incluses)"""
+    filters = {
+        "statut_envoi": statut_envoi,
+        "canal_envoi": canal_envoi,
+        "role_destinataire": role_destinataire,
+        "date_envoi_min": date_envoi_min,
+        "date_envoi_max": date_envoi_max,
+    }
+    return {name: value for name, value in filters.items() if value}
+
+
+def document_filter_clause(filters: dict | None) -> tuple[str, dict]:
+    """Conditions SQL et variables liées des filtres de documents"""
+    conditions = []
+    binds = {}
+    for name, column in DOCUMENT_FILTER_COLUMNS.items():
+        values = (filters or {}).get(name)
+        if values:
+            names = [f"{name}_{i}" for i in range(len(values))]
+            conditions.append(f"AND {column} IN ({', '.join(':' + bind for bind in names)})")
+            binds.update(zip(names, values, strict=True))
+    if (filters or {}).get("date_envoi_min"):
+        conditions.append("AND DATE_ENVOI >= :date_envoi_min")
+        binds["date_envoi_min"] = datetime.strptime(filters["date_envoi_min"], '%Y-%m-%d')
+    if (filters or {}).get("date_envoi_max"):
+        # Borne incluse : avant le lendemain (DATE_ENVOI peut porter une heure)
+        conditions.append("AND DATE_ENVOI < :date_envoi_max_excl")
+        binds["date_envoi_max_excl"] = datetime.strptime(filters["date_envoi_max"], '%Y-%m-%d') + timedelta(days=1)
+    return "\n        ".join(conditions), binds
+
+
+def query_batch(conn, valid_batch, filters=None, fields=None):
+    """Documents Lifen d'un lot de venues (une requête Oracle), restreints par `filters` (document_filters).
+
+    `fields` (colonnes validées de LifenRecord) remplace le SELECT * par la liste des colonnes demandées.
+    """
+    # Suites denses de venues en BETWEEN (parcours d'index par plage), venues isolées en IN
+    venue_predicate = plan_venue_predicate("NUM_SEJ", valid_batch)
+    filter_conditions, binds = document_filter_clause(filters)
+    select_list = ", ".join(field.upper() for field in fields) if fields else "*"
+
+    query = f"""
+    SELECT {select_list}
+    FROM NEUSTE.DOCUMENTS
+    WHERE {venue_predicate.sql}
+        AND TYPE_DOC = 'Lettre de liaison'
+        {filter_conditions}
+        AND ROWNUM <= {BATCH_ROW_LIMIT}
+    ORDER BY DATE_ENVOI DESC
+    """
+
+    cursor = conn.cursor()
+    try:
+        # PAS de configuration de timeout Oracle
+        cursor.execute(query, binds)
+
+        # Récupération avec limite
+        rows = cursor.fetchall()
+        if not rows:
+            return []
+
+        columns = [col[0].lower() for col in cursor.description]
+        return [
+            {columns[j]: row[j] for j in range(len(columns))}
+            for row in rows
+        ]
+    finally:
         try:
-            # Validation du batch
-            valid_batch = [int(venue) for venue in batch if isinstance(venue, int | str) and str(venue).isdigit() and int(venue) > 0]
+            cursor.close()
+        except:
+            pass
+
+
+def query_batch_complete(conn, valid_batch, filters=None, fields=None):
+    """query_batch sans troncature : un lot qui atteint BATCH_ROW_LIMIT est coupé en deux et réinterrogé.
+
+    Lève IncompleteResultError si une venue seule dépasse la limite (ses documents ne peuvent être tous lus).
+    """
+    rows = query_batch(conn, valid_batch, filters, fields)
+    if len(rows) < BATCH_ROW_LIMIT:
+        return rows
+    if len(valid_batch) == 1:
+        raise IncompleteResultError(f"venue {valid_batch[0]}: plus de {BATCH_ROW_LIMIT} documents")
+
+    middle = len(valid_batch) // 2
+    logger.warning(f"⚠️ Lot de {len(valid_batch)} venues tronqué à {BATCH_ROW_LIMIT} documents, redécoupé en deux")
+    return (
+        query_batch_complete(conn, valid_batch[:middle], filters, fields)
+        + query_batch_complete(conn, valid_batch[middle:], filters, fields)
+    )
 
-            if not valid_batch:
-                logger.warning(f"Lot {batch_num}: aucune venue valide")
-                continue
 
-            # Requête simplifiée avec limite stricte
-            in_clause = ", ".join([str(venue) for venue in valid_batch])
+def valid_venues(batch):
+    """Numéros de venue du lot convertis en entiers, hors valeurs invalides"""
+    return [int(venue) for venue in batch if isinstance(venue, int | str) and str(venue).isdigit() and int(venue) > 0]
 
-            query = f"""
-            SELECT *
-            FROM NEUSTE.DOCUMENTS
-            WHERE NUM_SEJ IN ({in_clause})
-                AND TYPE_DOC = 'Lettre de liaison'
-                AND ROWNUM <= 3000
-            ORDER BY DATE_ENVOI DESC
-            """
 
-            logger.info(f"Lot {batch_num}/{total_batches}: {len(valid_batch)} venues")
+def query_batch_adaptive(conn, valid_batch, filters=None, fields=None, adaptive=True):
+    """query_batch_complete ; avec `adaptive`, la latence, la densité ou l'échec du lot (erreur, timeout)
+    ajustent la taille des lots suivants (venue_batch_controller)"""
+    started = time.time()
+    try:
+        rows = query_batch_complete(conn, valid_batch, filters, fields)
+    except Exception as e:
+        if adaptive:
+            venue_batch_controller.record_failure(len(valid_batch), str(e))
+        raise
+    if adaptive:
+        venue_batch_controller.record(len(valid_batch), len(rows), time.time() - started)
+    return rows
+
+
+def execute_query_in_batches(
+    conn,
+    venues_list,
+    start_date=None,
+    end_date=None,
+    batch_size=None,
+    progress=None,
+    report=None,
+    filters=None,
+    fields=None,
+    attempts=RETRY_MAX_ATTEMPTS,
+):
+    """Version optimisée avec batches très petits SANS timeout Oracle
+
+    `filters` (document_filters) restreint les documents dans la requête Oracle, `fields` ses colonnes.
+    Sans `batch_size`, la taille de chaque lot est fixée par venue_batch_controller (latence et densité observées).
+    Un lot qui atteint BATCH_ROW_LIMIT documents est redécoupé et réinterrogé (query_batch_complete).
+    `progress` (ChunkProgress) reçoit l'avancement lot par lot. Un lot en erreur est retenté avec backoff
+    (`attempts` tentatives, 1 quand l'appelant retente déjà l'ensemble) ; s'il échoue encore, il est consigné
+    dans `report` (CompletenessReport).
+    """
+    if not venues_list:
+        logger.warning("Liste de venues vide")
+        return []
 
-            cursor = conn.cursor()
-            # PAS de configuration de timeout Oracle
-            cursor.execute(query)
+    def next_batch_size():
+        return batch_size or venue_batch_controller.next_size()
 
-            # Récupération avec limite
-            rows = cursor.fetchall()
+    results = []
+    estimated_batches = math.ceil(len(venues_list) / next_batch_size())
+    if progress:
+        progress.add_units(estimated_batches)
+
+    logger.info(f"Traitement {len(venues_list)} venues en ~{estimated_batches} lots de {next_batch_size()}")
+
+    position = 0
+    batch_num = 0
+    while position < len(venues_list):
+        batch_num += 1
+        batch = venues_list[position:position + next_batch_size()]
+        position += len(batch)
+        if report:
+            report.add_units(1)
+
+        batch_start = time.time()
+        batch_rows = 0
+        try:
+            # Validation du batch
+            valid_batch = valid_venues(batch)
 
-            if rows:
-                columns = [col[0].lower() for col in cursor.description]
+            if not valid_batch:
+                logger.warning(f"Lot {batch_num}: aucune venue valide")
+                continue
 
-                batch_results = [
-                    {columns[j]: row[j] for j in range(len(columns))}
-                    for row in rows
-                ]
+            logger.info(f"Lot {batch_num}: {len(valid_batch)} venues")
+
+            # Chaque tentative ajuste la taille des lots suivants, sauf taille imposée
+            batch_results = retry_call(
+                f"Lot {batch_num}",
+                query_batch_adaptive,
+                conn,
+                valid_batch,
+                filters,
+                fields,
+                not batch_size,
+                attempts=attempts,
+            )
 
-                results.extend(batch_results)
-                logger.info(f"Lot {batch_num}: {len(batch_results)} documents")
-            else:
-                logger.info(f"Lot {batch_num}: aucun résultat")
+            results.extend(batch_results)
+            batch_rows = len(batch_results)
+            logger.info(f"Lot {batch_num}: {batch_rows} documents")
 
         except Exception as e:
             logger.error(f"Erreur lot {batch_num}: {str(e)}")
+            if report:
+                report.unit_failed(f"lot {batch_num} ({batch[0]} → {batch[-1]})", str(e))
             continue
 
         finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except:
-                    pass
+            if progress:
+                progress.unit_done(batch_rows, time.time() - batch_start)
+                progress.set_remaining(math.ceil((len(venues_list) - position) / next_batch_size()))
 
     logger.info(f"Total: {len(results)} documents trouvés")
     return results
 
 # Fonction simplifiée pour les longues périodes
-def process_long_period_by_chunks(start_date: str, end_date: str, use_easily_api: bool = True) -> list[LifenRecord]:
-    """Version simplifiée et plus robuste"""
+def fetch_period_chunk(
+    chunk_start: str,
+    chunk_end: str,
+    token: str | None = None,
+    filters: dict | None = None,
+    fields: list[str] | None = None,
+) -> list[dict]:
+    """Documents Lifen (validés, dates ISO) des venues Easily d'un chunk de période
+
+    Lève IncompleteResultError si des lots de venues restent en échec : le chunk est alors retenté
+    et n'est jamais enregistré en checkpoint avec des documents manquants. Les nouvelles tentatives se font
+    à ce seul niveau (chunk entier) : l'appel Easily et les lots ne sont tentés qu'une fois par tentative.
+    """
+    chunk_venues = get_venue_numbers_from_easily(chunk_start, chunk_end, max_retries=1, token=token)
+    if not chunk_venues:
+        logger.info(f"ℹ️ Chunk {chunk_start} → {chunk_end}: aucune venue")
+        return []
+
+    batch_report = CompletenessReport()
+    with get_oracle_connection_context() as conn:
+        records = execute_query_in_batches(
+            conn, chunk_venues, report=batch_report, filters=filters, fields=fields, attempts=1
+        )
+    if not batch_report.complete:
+        raise IncompleteResultError(f"{len(batch_report.failed)} lot(s) de venues en échec")
+    return [dump_record(LifenRecord(**record), fields) for record in records]
+
+
+def fetch_period_chunk_adaptive(
+    chunk_start: str,
+    chunk_end: str,
+    token: str | None = None,
+    filters: dict | None = None,
+    fields: list[str] | None = None,
+) -> list[dict]:
+    """fetch_period_chunk dont la latence, la densité ou l'échec (erreur, timeout) ajustent la durée des
+    chunks suivants (period_chunk_controller)"""
+    chunk_days = (datetime.strptime(chunk_end, '%Y-%m-%d') - datetime.strptime(chunk_start, '%Y-%m-%d')).days + 1
+    started = time.time()
+    try:
+        records = fetch_period_chunk(chunk_start, chunk_end, token, filters, fields)
+    except Exception as e:
+        period_chunk_controller.record_failure(chunk_days, str(e))
+        raise
+    period_chunk_controller.record(chunk_days, len(records), time.time() - started)
+    return records
+
+
+def deduplicate_records(records: list[dict]) -> list[dict]:
+    """Déduplication rapide des documents de chunks qui se chevauchent"""
+    seen = set()
+    deduplicated = []
+
+    for result in records:
+        key = result.get('id_doc_lifen') or f"{result.get('num_sej')}_{result.get('date_envoi')}"
+        if key not in seen:
+            seen.add(key)
+            deduplicated.append(result)
+
+    return deduplicated
+
+
+def next_period_chunk(checkpoints, current, end):
+    """(dernier jour, documents repris ou None) du chunk qui commence à `current`.
+
+    Un checkpoint qui commence ce jour est repris tel quel ; sinon la durée est celle de period_chunk_controller,
+    sans empiéter sur le checkpoint suivant.
+    """
+    resumed = checkpoints.starting_at(current.strftime('%Y-%m-%d'))
+    if resumed is not None:
+        chunk_end, records = resumed
+        return datetime.strptime(chunk_end, '%Y-%m-%d').date(), records
+
+    chunk_end_day = min(current + timedelta(days=period_chunk_controller.next_size() - 1), end)
+    next_checkpoint = checkpoints.next_start_after(current.strftime('%Y-%m-%d'))
+    if next_checkpoint:
+        chunk_end_day = min(chunk_end_day, datetime.strptime(next_checkpoint, '%Y-%m-%d').date() - timedelta(days=1))
+    return chunk_end_day, None
+
+
+def process_long_period_by_chunks(
+    start_date: str,
+    end_date: str,
+    use_easily_api: bool = True,
+    progress=None,
+    token: str | None = None,
+    report=None,
+    filters: dict | None = None,
+    fields: list[str] | None = None,
+) -> list[LifenRecord]:
+    """Version simplifiée et plus robuste
+
+    La durée de chaque chunk est fixée par period_chunk_controller, d'après la latence et le nombre de documents
+    par jour des chunks précédents (y compris ceux des requêtes précédentes). `progress` (ChunkProgress) reçoit
+    l'avancement chunk par chunk. Chaque chunk est retenté avec backoff ; les chunks obtenus sont enregistrés
+    en checkpoint tant que la période n'est pas complète, de sorte qu'une relance de la même requête ne refait
+    que les jours non couverts (chunks en échec, consignés dans `report`).
+    """
+    report = report or CompletenessReport()
+    checkpoints = request_checkpoints(
+        {"start_date": start_date, "end_date": end_date, **(filters or {}), **({"fields": fields} if fields else {})}
+    )
+
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-    chunks = PeriodStrategy.split_period_intelligently(start_date, end_date)
-    num_chunks, chunk_size, strategy = PeriodStrategy.calculate_optimal_strategy(start_date, end_date)
+    def remaining_chunks(from_day):
+        return math.ceil(((end - from_day).days + 1) / period_chunk_controller.next_size())
 
-    logger.info(f"📅 Stratégie {strategy}: {len(chunks)} chunks")
+    logger.info(f"📅 ~{remaining_chunks(start)} chunks de {period_chunk_controller.next_size()} jours au départ")
+    if progress:
+        progress.add_units(remaining_chunks(start))
 
     all_results = []
     successful_chunks = 0
+    i = 0
+    current = start
 
-    for i, (chunk_start, chunk_end) in enumerate(chunks):
-        logger.info(f"🔄 Chunk {i+1}/{len(chunks)}: {chunk_start} → {chunk_end}")
+    # Dossier déclaré en cours d'utilisation : une requête identique simultanée ne le supprime pas
+    with checkpoints:
+        while current <= end:
+            i += 1
+            chunk_start = current.strftime('%Y-%m-%d')
+            chunk_start_time = time.time()
+            chunk_rows = 0
 
-        try:
-            # Délai court entre chunks
-            if i > 0:
-                time.sleep(0.5)
+            chunk_end_day, chunk_results = next_period_chunk(checkpoints, current, end)
+            chunk_end = chunk_end_day.strftime('%Y-%m-%d')
 
-            # Récupération des venues
-            chunk_venues = get_venue_numbers_from_easily(chunk_start, chunk_end, max_retries=2)
+            logger.info(f"🔄 Chunk {i}: {chunk_start} → {chunk_end} ({(chunk_end_day - current).days + 1} jours)")
+            report.add_units(1)
 
-            if chunk_venues:
-                with get_oracle_connection_context() as conn:
-                    chunk_results = execute_query_in_batches(conn, chunk_venues)
+            try:
+                if chunk_results is not None:
+                    report.unit_resumed()
+                    logger.info(f"♻️ Chunk {i}: repris du checkpoint")
+                else:
+                    # Délai court entre chunks
+                    if i > 1:
+                        time.sleep(0.5)
+
+                    # Chaque tentative ajuste la durée des chunks suivants
+                    chunk_results = retry_call(
+                        f"Chunk {i}", fetch_period_chunk_adaptive, chunk_start, chunk_end, token, filters, fields
+                    )
+                    checkpoints.save(chunk_start, chunk_end, chunk_results)
 
                 all_results.extend(chunk_results)
+                chunk_rows = len(chunk_results)
                 successful_chunks += 1
-                logger.info(f"✅ Chunk {i+1}: {len(chunk_results)} documents")
-            else:
-                logger.info(f"ℹ️ Chunk {i+1}: aucune venue")
-                successful_chunks += 1
+                logger.info(f"✅ Chunk {i}: {len(chunk_results)} documents")
 
-        except Exception as e:
-            logger.error(f"❌ Chunk {i+1} échoué: {str(e)}")
-            continue
+            except Exception as e:
+                logger.error(f"❌ Chunk {i} échoué: {str(e)}")
+                report.unit_failed(f"chunk {chunk_start} → {chunk_end}", str(e))
+
+            current = chunk_end_day + timedelta(days=1)
+            if progress:
+                progress.unit_done(chunk_rows, time.time() - chunk_start_time)
+                progress.set_remaining(remaining_chunks(current) if current <= end else 0)
+
+        logger.info(f"🏁 Terminé: {successful_chunks}/{i} chunks, {len(all_results)} documents")
 
-    logger.info(f"🏁 Terminé: {successful_chunks}/{len(chunks)} chunks, {len(all_results)} documents")
+        # Période complète : les checkpoints ne servent plus
+        if report.complete:
+            checkpoints.clear()
 
     # Déduplication rapide
     if all_results:
-        seen = set()
-        deduplicated = []
+        all_results = deduplicate_records(all_results)
+        logger.info(f"🔄 Après déduplication: {len(all_results)} documents uniques")
 
-        for result in all_results:
-            key = result.get('id_doc_lifen') or f"{result.get('num_sej')}_{result.get('date_envoi')}"
-            if key not in seen:
-                seen.add(key)
-                deduplicated.append(result)
+    return [LifenRecord(**record) for record in all_results]
 
-        logger.info(f"🔄 Après déduplication: {len(deduplicated)} documents uniques")
-        all_results = deduplicated
 
-    return [LifenRecord(**record) for record in all_results]
+def query_venues(venues_list, progress=None, report=None, filters=None, fields=None):
+    """Documents Lifen des venues, sur une connexion Oracle dédiée"""
+    with get_oracle_connection_context() as conn:
+        return execute_query_in_batches(
+            conn, venues_list, progress=progress, report=report, filters=filters, fields=fields
+        )
+
 
 # Route principale ultra-robuste
 
 @app.get("/api/lifen/data", response_model=list[LifenRecord])
 async def get_lifen_data(
+    response: Response,
+    current_user: Annotated[str, Depends(get_current_user)],
+    token: Annotated[str, Depends(oauth2_scheme)],
     num_venues: Annotated[str | None, Query(description="Numéros de venue séparés par des virgules")] = None,
     start_date: Annotated[str | None, Query(description="Date début (YYYY-MM-DD)")] = None,
     end_date: Annotated[str | None, Query(description="Date fin (YYYY-MM-DD)")] = None,
     use_easily_api: Annotated[bool, Query(description="Utiliser l'API Easily")] = True,
-    current_user: str = Depends(get_current_user)
+    progress_id: Annotated[
+        str | None, Query(description="Identifiant de suivi (GET /api/lifen/progress/{progress_id})")
+    ] = None,
+    statut_envoi: Annotated[list[str] | None, Query(description="Statuts d'envoi retenus (répétable)")] = None,
+    canal_envoi: Annotated[list[str] | None, Query(description="Canaux d'envoi retenus (répétable)")] = None,
+    role_destinataire: Annotated[
+        list[str] | None, Query(description="Rôles de destinataire retenus (répétable)")
+    ] = None,
+    date_envoi_min: Annotated[str | None, Query(description="Date d'envoi minimale incluse (YYYY-MM-DD)")] = None,
+    date_envoi_max: Annotated[str | None, Query(description="Date d'envoi maximale incluse (YYYY-MM-DD)")] = None,
+    fields: Annotated[
+        str | None, Query(description="Colonnes à renvoyer, séparées par des virgules (toutes par défaut)")
+    ] = None,
 ):
+    """Diffusions Lifen des séjours demandés.
+
+    `start_date` / `end_date` sélectionnent les séjours (numéros de venue des séjours Easily sortis dans la
+    période) et ne filtrent pas DATE_ENVOI : une lettre de liaison est souvent envoyée après la sortie, et le
+    rapprochement avec Easily a besoin de ces envois tardifs. Le filtre sur la date d'envoi est `date_envoi_min`
+    / `date_envoi_max`, appliqué dans la requête Oracle comme les autres filtres de documents.
+    """
     start_time = time.time()
     request_id = f"{int(time.time())}"
+    try:
+        progress = start_progress(progress_id, current_user.username) if progress_id else None
+    except PermissionError:
+        raise HTTPException(409, "progress_id déjà utilisé, choisir un autre identifiant") from None
+    # Complétude de la réponse (lots ou chunks en échec après les nouvelles tentatives), en en-têtes X-Lifen-*
+    report = CompletenessReport()
 
     logger.info(f"Requête {request_id} démarrée")
 
     try:
         # Validation stricte
-        if not num_venues and not (start_date and end_date):
-            raise HTTPException(
-                status_code=400,
-                detail="Paramètres manquants: num_venues OU (start_date ET end_date)"
+        validate_selection(num_venues, start_date, end_date)
+
+        # Filtres appliqués dans la requête Oracle : seuls les documents retenus sont transférés
+        filters = validated_document_filters(
+            statut_envoi, canal_envoi, role_destinataire, date_envoi_min, date_envoi_max
+        )
+
+        # Projection : seules les colonnes demandées sont lues dans Oracle, validées et sérialisées
+        columns = parse_record_fields(fields)
+
+        # Requêtes Oracle hors de la boucle d'événements : les suivis d'avancement restent servis
+        if num_venues:
+            logger.info("Mode venues spécifiées")
+            venues_list = parse_venue_list(num_venues)
+            logger.info(f"Recherche {len(venues_list)} venues")
+            batch_results = await run_in_threadpool(query_venues, venues_list, progress, report, filters, columns)
+            results = [LifenRecord(**record) for record in batch_results]
+        elif start_date and end_date and use_easily_api:
+            results = await run_in_threadpool(
+                query_period, start_date, end_date, progress, token, report, filters, columns
             )
+        else:
+            raise HTTPException(400, "Configuration invalide")
 
-        # Validation des dates avec limite plus stricte
-        if start_date and end_date:
-            try:
-                start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+        # Statistiques finales
+        elapsed = time.time() - start_time
+        logger.info(f"Requête {request_id} terminée: {len(results)} résultats en {elapsed:.2f}s")
+        if not report.complete:
+            logger.warning(f"Requête {request_id} incomplète: {report.failed}")
+        if progress:
+            progress.finish(error=None if report.complete else f"{len(report.failed)} unité(s) en échec")
+        return lifen_response(results, columns, report, response)
+
+    except HTTPException as e:
+        if progress:
+            progress.finish(error=str(e.detail))
+        raise
+    except Exception as e:
+        logger.error(f"Erreur critique requête {request_id}: {str(e)}", exc_info=True)
+        if progress:
+            progress.finish(error=str(e))
+        raise HTTPException(500, f"Erreur interne: {str(e)}") from None
+
+
+def validate_selection(num_venues, start_date, end_date):
+    """Erreur 400 sans venues ni période, ou pour une période mal formée, inversée ou de plus de 365 jours"""
+    if not num_venues and not (start_date and end_date):
+        raise HTTPException(
+            status_code=400,
+            detail="Paramètres manquants: num_venues OU (start_date ET end_date)"
+        )
+    if not (start_date and end_date):
+        return
+
+    try:
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(400, "Format de date invalide (YYYY-MM-DD)") from None
+
+    if start_dt > end_dt:
+        raise HTTPException(400, "start_date > end_date")
 
-                if start_dt > end_dt:
-                    raise HTTPException(400, "start_date > end_date")
+    duration = (end_dt - start_dt).days
+    if duration > 365:  # Limite très stricte
+        raise HTTPException(400, f"Période trop longue: {duration} jours (max 365)")
 
-                duration = (end_dt - start_dt).days
-                if duration > 365:  # Limite très stricte
-                    raise HTTPException(400, f"Période trop longue: {duration} jours (max 120)")
 
+def validated_document_filters(statut_envoi, canal_envoi, role_destinataire, date_envoi_min, date_envoi_max):
+    """document_filters, avec une erreur 400 pour une date d'envoi mal formée"""
+    filters = document_filters(statut_envoi, canal_envoi, role_destinataire, date_envoi_min, date_envoi_max)
+    for name in ("date_envoi_min", "date_envoi_max"):
+        if name in filters:
+            try:
+                datetime.strptime(filters[name], '%Y-%m-%d')
             except ValueError:
-                raise HTTPException(400, "Format de date invalide (YYYY-MM-DD)")
+                raise HTTPException(400, f"Format de date invalide pour {name} (YYYY-MM-DD)") from None
+    if filters:
+        logger.info(f"Filtres documents: {filters}")
+    return filters
 
-        # Traitement des venues spécifiées
-        if num_venues:
-            logger.info("Mode venues spécifiées")
-            venues_list = []
 
-            for v in num_venues.split(","):
-                try:
-                    venue_num = int(v.strip())
-                    if venue_num > 0:
-                        venues_list.append(venue_num)
-                except (ValueError, TypeError):
-                    logger.warning(f"Venue invalide: {v.strip()}")
+def parse_venue_list(num_venues: str) -> list[int]:
+    """Numéros de venue valides (> 0), triés et dédoublonnés ; erreur 400 s'il n'y en a aucun"""
+    venues_list = []
+    for v in num_venues.split(","):
+        try:
+            venue_num = int(v.strip())
+            if venue_num > 0:
+                venues_list.append(venue_num)
+        except (ValueError, TypeError):
+            logger.warning(f"Venue invalide: {v.strip()}")
 
-            if not venues_list:
-                raise HTTPException(400, "Aucune venue valide")
+    if not venues_list:
+        raise HTTPException(400, "Aucune venue valide")
+    return sorted(set(venues_list))
 
-            venues_list = sorted(set(venues_list))
-            logger.info(f"Recherche {len(venues_list)} venues")
 
-            with get_oracle_connection_context() as conn:
-                batch_results = execute_query_in_batches(conn, venues_list)
+def query_period(start_date, end_date, progress=None, token=None, report=None, filters=None, fields=None):
+    """Documents Lifen des venues Easily d'une période : en une fois jusqu'à 20 jours, sinon par chunks"""
+    duration = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days
+    logger.info(f"Mode dates: {duration} jours")
 
-            results = [LifenRecord(**record) for record in batch_results]
+    if duration > 20:
+        logger.info("Traitement par chunks")
+        return process_long_period_by_chunks(
+            start_date, end_date, True, progress, token, report, filters, fields
+        )
 
-        # Traitement par dates
-        elif start_date and end_date and use_easily_api:
-            duration = (datetime.strptime(end_date, '%Y-%m-%d') -
-                       datetime.strptime(start_date, '%Y-%m-%d')).days
+    logger.info("Traitement direct")
+    venues_list = get_venue_numbers_from_easily(start_date, end_date, 2, token)
+    if not venues_list:
+        return []
+    return [LifenRecord(**record) for record in query_venues(venues_list, progress, report, filters, fields)]
 
-            logger.info(f"Mode dates: {duration} jours")
 
-            if duration <= 20:  # Seuil très bas
-                logger.info("Traitement direct")
-                venues_list = get_venue_numbers_from_easily(start_date, end_date)
+def lifen_response(results, columns, report, response):
+    """Réponse de /api/lifen/data, avec les en-têtes de complétude X-Lifen-*.
 
-                if not venues_list:
-                    return []
+    Avec une projection, seules les colonnes demandées sont sérialisées (hors response_model complet).
+    """
+    if columns:
+        return JSONResponse(content=[dump_record(record, columns) for record in results], headers=report.headers())
+    response.headers.update(report.headers())
+    return results
 
-                with get_oracle_connection_context() as conn:
-                    batch_results = execute_query_in_batches(conn, venues_list)
 
-                results = [LifenRecord(**record) for record in batch_results]
-            else:
-                logger.info("Traitement par chunks")
-                results = process_long_period_by_chunks(start_date, end_date, use_easily_api)
+def query_kpi_batches(venues_list, progress=None, report=None, filters=None):
+    """Agrégats Oracle (kpi_select) des venues, par lots de MAX_BATCH_SIZE fusionnés dans LifenKpis.
 
-        else:
-            raise HTTPException(400, "Configuration invalide")
+    Un agrégat ne ramène que quelques centaines de lignes par lot : la taille des lots n'est pas pilotée par
+    venue_batch_controller (réglé sur le volume de documents transférés). Un lot en erreur est retenté avec backoff,
+    puis consigné dans `report`.
+    """
+    kpis = LifenKpis()
+    filter_conditions, binds = document_filter_clause(filters)
+    batches = [venues_list[i:i + MAX_BATCH_SIZE] for i in range(0, len(venues_list), MAX_BATCH_SIZE)]
+    if progress:
+        progress.add_units(len(batches))
+    if report:
+        report.add_units(len(batches))
 
-        # Statistiques finales
-        elapsed = time.time() - start_time
-        logger.info(f"Requête {request_id} terminée: {len(results)} résultats en {elapsed:.2f}s")
+    def query_kpi_batch(conn, batch):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(kpi_select(plan_venue_predicate("NUM_SEJ", batch).sql, filter_conditions), binds)
+            columns = [col[0].lower() for col in cursor.description]
+            return [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
 
-        return results
+    with get_oracle_connection_context() as conn:
+        for batch_num, batch in enumerate(batches, start=1):
+            batch_start = time.time()
+            batch_rows = 0
+            try:
+                rows = retry_call(f"Lot KPI {batch_num}", query_kpi_batch, conn, batch)
+                kpis.add_rows(rows)
+                batch_rows = len(rows)
+            except Exception as e:
+                logger.error(f"Erreur lot KPI {batch_num}: {str(e)}")
+                if report:
+                    report.unit_failed(f"lot {batch_num} ({batch[0]} → {batch[-1]})", str(e))
+            finally:
+                if progress:
+                    progress.unit_done(batch_rows, time.time() - batch_start)
+    return kpis.result()
+
+
+def period_venues(start_date, end_date, token=None):
+    """Numéros de venue Easily d'une période, demandés chunk par chunk comme pour les documents"""
+    venues = set()
+    for chunk_start, chunk_end in plan_period_chunks(start_date, end_date):
+        venues.update(get_venue_numbers_from_easily(chunk_start, chunk_end, 2, token) or [])
+    return sorted(venues)
+
+
+@app.get("/api/lifen/kpis")
+async def get_lifen_kpis(
+    response: Response,
+    current_user: Annotated[str, Depends(get_current_user)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+    num_venues: Annotated[str | None, Query(description="Numéros de venue séparés par des virgules")] = None,
+    start_date: Annotated[str | None, Query(description="Date début (YYYY-MM-DD)")] = None,
+    end_date: Annotated[str | None, Query(description="Date fin (YYYY-MM-DD)")] = None,
+    progress_id: Annotated[
+        str | None, Query(description="Identifiant de suivi (GET /api/lifen/progress/{progress_id})")
+    ] = None,
+    statut_envoi: Annotated[list[str] | None, Query(description="Statuts d'envoi retenus (répétable)")] = None,
+    canal_envoi: Annotated[list[str] | None, Query(description="Canaux d'envoi retenus (répétable)")] = None,
+    role_destinataire: Annotated[
+        list[str] | None, Query(description="Rôles de destinataire retenus (répétable)")
+    ] = None,
+    date_envoi_min: Annotated[str | None, Query(description="Date d'envoi minimale incluse (YYYY-MM-DD)")] = None,
+    date_envoi_max: Annotated[str | None, Query(description="Date d'envoi maximale incluse (YYYY-MM-DD)")] = None,
+):
+    """Indicateurs de diffusion agrégés par Oracle par service × mois d'envoi × canal (+ résultat et rôle).
+
+    Mêmes sélection et filtres que /api/lifen/data. `groups` : une ligne par groupe ; `totals` : les indicateurs
+    sur tous les documents (séjours distincts et médianes ne s'additionnent pas entre groupes).
+    """
+    try:
+        progress = start_progress(progress_id, current_user.username) if progress_id else None
+    except PermissionError:
+        raise HTTPException(409, "progress_id déjà utilisé, choisir un autre identifiant") from None
+    report = CompletenessReport()
 
-    except HTTPException:
+    try:
+        validate_selection(num_venues, start_date, end_date)
+        filters = validated_document_filters(
+            statut_envoi, canal_envoi, role_destinataire, date_envoi_min, date_envoi_max
+        )
+        if num_venues:
+            venues_list = parse_venue_list(num_venues)
+        else:
+            venues_list = await run_in_threadpool(period_venues, start_date, end_date, token)
+
+        result = await run_in_threadpool(query_kpi_batches, venues_list, progress, report, filters)
+        if progress:
+            progress.finish(error=None if report.complete else f"{len(report.failed)} unité(s) en échec")
+        response.headers.update(report.headers())
+        return result
+
+    except HTTPException as e:
+        if progress:
+            progress.finish(error=str(e.detail))
         raise
     except Exception as e:
-        logger.error(f"Erreur critique requête {request_id}: {str(e)}", exc_info=True)
-        raise HTTPException(500, f"Erreur interne: {str(e)}")
+        logger.error(f"Erreur KPI Lifen: {str(e)}", exc_info=True)
+        if progress:
+            progress.finish(error=str(e))
+        raise HTTPException(500, f"Erreur interne: {str(e)}") from None
+
+
+def get_user_progress(progress_id: str, current_user):
+    """Suivi d'une requête de l'utilisateur ; 404 s'il est inconnu ou appartient à un autre utilisateur"""
+    progress = get_progress(progress_id, current_user.username)
+    if progress is None:
+        raise HTTPException(404, "Suivi inconnu (requête pas encore démarrée ou expirée)")
+    return progress
+
+
+# Avancement d'une requête /api/lifen/data lancée avec un progress_id (interrogation périodique)
+@app.get("/api/lifen/progress/{progress_id}")
+def get_lifen_progress(progress_id: str, current_user: Annotated[str, Depends(get_current_user)]):
+    return get_user_progress(progress_id, current_user).snapshot()
+
+
+# Même avancement en flux Server-Sent Events : un événement à chaque unité traitée, jusqu'à la fin ou au plus
+# PROGRESS_STREAM_TIMEOUT secondes (un job peut durer plus longtemps : le client se reconnecte)
+@app.get("/api/lifen/progress/{progress_id}/events")
+async def stream_lifen_progress(progress_id: str, current_user: Annotated[str, Depends(get_current_user)]):
+    progress = get_user_progress(progress_id, current_user)
+
+    async def events():
+        last_state = None
+        deadline = time.monotonic() + PROGRESS_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            snapshot = progress.snapshot()
+            state = (snapshot["status"], snapshot["chunks_done"], snapshot["chunks_total"])
+            if state != last_state:
+                last_state = state
+                yield f"data: {json.dumps(snapshot)}\n\n"
+            if snapshot["status"] != "running":
+                break
+            await asyncio.sleep(PROGRESS_EVENT_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# Jobs d'extraction : une période longue est traitée en tâche de fond, chunk par chunk, avec un checkpoint
+# sur disque par chunk terminé. Le job se suit sur /api/lifen/jobs/{job_id} (ou /api/lifen/progress/{job_id})
+# et son résultat se télécharge une fois terminé.
+def job_chunk_fetcher(token: str, filters: dict | None = None):
+    """Fonction de chunk d'un job, avec le jeton de l'utilisateur et les filtres de documents du job"""
+    def fetch_chunk(chunk_start, chunk_end):
+        return fetch_period_chunk_adaptive(chunk_start, chunk_end, token, filters)
+    return fetch_chunk
+
+
+def get_user_job(job_id: str, current_user):
+    job = load_job(job_id)
+    if job is None or job["username"] != current_user.username:
+        raise HTTPException(404, "Job inconnu")
+    return job
+
+
+@app.post("/api/lifen/jobs", status_code=202)
+def create_lifen_job(
+    current_user: Annotated[str, Depends(get_current_user)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+    start_date: Annotated[str, Query(description="Date début (YYYY-MM-DD)")],
+    end_date: Annotated[str, Query(description="Date fin (YYYY-MM-DD)")],
+    statut_envoi: Annotated[list[str] | None, Query(description="Statuts d'envoi retenus (répétable)")] = None,
+    canal_envoi: Annotated[list[str] | None, Query(description="Canaux d'envoi retenus (répétable)")] = None,
+    role_destinataire: Annotated[
+        list[str] | None, Query(description="Rôles de destinataire retenus (répétable)")
+    ] = None,
+    date_envoi_min: Annotated[str | None, Query(description="Date d'envoi minimale incluse (YYYY-MM-DD)")] = None,
+    date_envoi_max: Annotated[str | None, Query(description="Date d'envoi maximale incluse (YYYY-MM-DD)")] = None,
+):
+    # Mêmes validations que /api/lifen/data
+    validate_selection(None, start_date, end_date)
+    filters = validated_document_filters(statut_envoi, canal_envoi, role_destinataire, date_envoi_min, date_envoi_max)
+
+    # Le jeton de l'utilisateur est transmis à l'API Easily ; s'il expire en cours de job, les chunks restants
+    # échouent et une relance (avec un jeton valide) les reprend. Les chunks sont planifiés avec la durée courante
+    # de period_chunk_controller, que les chunks du job ajustent à leur tour
+    chunks = plan_period_chunks(start_date, end_date)
+    job = submit_job(
+        {"start_date": start_date, "end_date": end_date, "filters": filters},
+        chunks,
+        job_chunk_fetcher(token, filters),
+        deduplicate_records,
+        current_user.username,
+    )
+    logger.info(f"Job {job['job_id']} créé: {start_date} → {end_date}, {len(chunks)} chunks")
+    return {"job_id": job["job_id"], "status": job["status"], "chunks": len(chunks)}
+
+
+@app.get("/api/lifen/jobs/{job_id}")
+def get_lifen_job(job_id: str, current_user: Annotated[str, Depends(get_current_user)]):
+    job = get_user_job(job_id, current_user)
+    progress = get_progress(job_id, current_user.username)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "params": job["params"],
+        "chunks": len(job["chunks"]),
+        "failed_chunks": job["failed_chunks"],
+        "rows": job["rows"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "progress": progress.snapshot() if progress else None,
+    }
+
+
+@app.get("/api/lifen/jobs/{job_id}/result", response_model=list[LifenRecord])
+def get_lifen_job_result(job_id: str, current_user: Annotated[str, Depends(get_current_user)]):
+    job = get_user_job(job_id, current_user)
+    if job["status"] != "done":
+        raise HTTPException(409, f"Job non terminé (statut: {job['status']})")
+    return read_result(job_id)
+
+
+@app.post("/api/lifen/jobs/{job_id}/retry", status_code=202)
+def retry_lifen_job(
+    job_id: str,
+    current_user: Annotated[str, Depends(get_current_user)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+):
+    job = get_user_job(job_id, current_user)
+    job = retry_job(job, job_chunk_fetcher(token, job["params"].get("filters")), deduplicate_records)
+    return {"job_id": job_id, "status": job["status"]}
 
 
 # Route de santé
@@ -581,16 +1210,19 @@ async def health_check():
 # Route métadonnées avec limites plus strictes
 @app.get("/api/lifen/metadata")
 def get_period_metadata(
+    current_user: Annotated[str, Depends(get_current_user)],
     start_date: Annotated[str, Query(description="Date début (YYYY-MM-DD)")] = ...,
     end_date: Annotated[str, Query(description="Date fin (YYYY-MM-DD)")] = ...,
-    current_user: str = Depends(get_current_user)
 ):
     try:
         duration = (datetime.strptime(end_date, '%Y-%m-%d') -
                    datetime.strptime(start_date, '%Y-%m-%d')).days
 
-        num_chunks, chunk_size, strategy = PeriodStrategy.calculate_optimal_strategy(start_date, end_date)
-        chunks = PeriodStrategy.split_period_intelligently(start_date, end_date)
+        chunks = plan_period_chunks(start_date, end_date)
+        chunk_state = period_chunk_controller.state()
+        batch_state = venue_batch_controller.state()
+        # Estimation d'après la latence observée par jour, à défaut l'ancienne estimation forfaitaire
+        seconds_per_day = chunk_state["seconds_per_item"] or 0.3
 
         return {
             "period": {
@@ -599,15 +1231,19 @@ def get_period_metadata(
                 "duration_days": duration
             },
             "strategy": {
-                "type": strategy,
-                "num_chunks": num_chunks,
-                "chunk_size_days": chunk_size,
-                "estimated_time_seconds": duration * 0.3
+                "type": "adaptive",
+                "num_chunks": len(chunks),
+                "chunk_size_days": chunk_state["size"],
+                "rows_per_day": chunk_state["rows_per_item"],
+                "venue_batch_size": batch_state["size"],
+                "rows_per_venue": batch_state["rows_per_item"],
+                "batch_row_limit": BATCH_ROW_LIMIT,
+                "estimated_time_seconds": (duration + 1) * seconds_per_day
             },
             "chunks": [{"start": start, "end": end} for start, end in chunks]
         }
     except Exception as e:
-        raise HTTPException(400, f"Format de date invalide: {str(e)}")
+        raise HTTPException(400, f"Format de date invalide: {str(e)}") from None
 
 
 # Point d'entrée avec configuration uvicorn optimisée
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Avancement des requêtes Lifen longues, identifiées par un progress_id choisi par le client.
+# Une unité est un chunk de période (mode dates) ou un lot de numéros de séjour (mode venues).
+# Les suivis terminés restent consultables jusqu'à leur éviction (LRU de PROGRESS_MAX_ENTRIES).
+# Un suivi appartient à l'utilisateur qui a lancé la requête : lui seul peut le consulter ou le remplacer.
+
+PROGRESS_MAX_ENTRIES = int(os.getenv("PROGRESS_MAX_ENTRIES", "256"))
+
+_trackers = OrderedDict()
+_lock = threading.Lock()
+
+
+class ChunkProgress:
+    """Compteurs d'avancement d'une requête : unités traitées, lignes reçues, latences et ETA"""
+
+    def __init__(self, progress_id, username=None):
+        self.progress_id = progress_id
+        self.username = username
+        self.status = "running"
+        self.total = 0
+        self.done = 0
+        self.rows = 0
+        self.latencies = []
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add_units(self, count):
+        """Annonce `count` unités supplémentaires à traiter (le total peut croître en cours de route)"""
+        with self._lock:
+            self.total += count
+            self.updated_at = time.time()
+
+    def set_remaining(self, count):
+        """Réestime le nombre d'unités restantes (taille des unités ajustée en cours de route)"""
+        with self._lock:
+            self.total = self.done + count
+            self.updated_at = time.time()
+
+    def unit_done(self, rows, latency):
+        """Enregistre une unité traitée avec son nombre de lignes et sa durée (secondes)"""
+        with self._lock:
+            self.done += 1
+            self.rows += rows
+            self.latencies.append(latency)
+            self.updated_at = time.time()
+
+    def finish(self, error=None):
+        with self._lock:
+            self.status = "error" if error else "done"
+            self.error = error
+            self.updated_at = time.time()
+
+    def snapshot(self):
+        """État JSON : unités faites/restantes, lignes reçues, latence par unité et ETA (secondes)"""
+        with self._lock:
+            remaining = max(0, self.total - self.done)
+            mean_latency = sum(self.latencies) / len(self.latencies) if self.latencies else None
+            return {
+                "progress_id": self.progress_id,
+                "status": self.status,
+                "chunks_total": self.total,
+                "chunks_done": self.done,
+                "chunks_remaining": remaining,
+                "rows": self.rows,
+                "last_chunk_seconds": round(self.latencies[-1], 3) if self.latencies else None,
+                "mean_chunk_seconds": round(mean_latency, 3) if mean_latency is not None else None,
+                "chunk_seconds": [round(latency, 3) for latency in self.latencies],
+                "elapsed_seconds": round(time.time() - self.started_at, 3),
+                "eta_seconds": round(remaining * mean_latency, 1) if mean_latency is not None else None,
+                "error": self.error,
+            }
+
+
+def start_progress(progress_id, username=None):
+    """Crée (ou remplace) le suivi d'une requête lancée par `username`.
+
+    Lève PermissionError si `progress_id` désigne le suivi d'un autre utilisateur.
+    """
+    tracker = ChunkProgress(progress_id, username)
+    with _lock:
+        existing = _trackers.get(progress_id)
+        if existing is not None and existing.username != username:
+            raise PermissionError(f"Suivi {progress_id} déjà utilisé par un autre utilisateur")
+        _trackers[progress_id] = tracker
+        _trackers.move_to_end(progress_id)
+        while len(_trackers) > PROGRESS_MAX_ENTRIES:
+            _trackers.popitem(last=False)
+    return tracker
+
+
+def get_progress(progress_id, username=None):
+    """Suivi d'une requête, ou None s'il est inconnu (jamais créé ou évincé) ou lancé par un autre utilisateur
+    que `username` (si fourni)"""
+    with _lock:
+        tracker = _trackers.get(progress_id)
+    if tracker is None or (username is not None and tracker.username != username):
+        return None
+    return tracker
@@ -0,0 +1,67 @@
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Nouvelles tentatives des chunks de période et des lots de venues : backoff exponentiel avec gigue complète
+# (attente tirée entre 0 et min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2^tentative)), pour ne pas relancer
+# tous les appels en échec au même instant sur une base déjà chargée.
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30.0"))
+
+
+def backoff_delay(attempt):
+    """Attente avant la tentative suivante (attempt : numéro de la tentative échouée, à partir de 0)"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+def retry_call(label, func, *args, attempts=RETRY_MAX_ATTEMPTS):
+    """Appelle `func(*args)` jusqu'à `attempts` fois ; la dernière exception est relancée"""
+    for attempt in range(attempts):
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{label}: tentative {attempt + 1}/{attempts} échouée ({str(e)}), retry dans {delay:.1f}s")
+            time.sleep(delay)
+
+
+class IncompleteResultError(Exception):
+    """Des unités (lots de venues) sont restées en échec après toutes les tentatives"""
+
+
+class CompletenessReport:
+    """Unités (chunks de période ou lots de venues) attendues, en échec et reprises d'un checkpoint"""
+
+    def __init__(self):
+        self.total = 0
+        self.failed = []
+        self.resumed = 0
+
+    def add_units(self, count):
+        self.total += count
+
+    def unit_failed(self, unit, error):
+        self.failed.append({"unit": unit, "error": error})
+
+    def unit_resumed(self):
+        self.resumed += 1
+
+    @property
+    def complete(self):
+        return not self.failed
+
+    def headers(self):
+        """En-têtes HTTP de la réponse : une réponse incomplète se reconnaît sans inspecter les données"""
+        return {
+            "X-Lifen-Complete": "true" if self.complete else "false",
+            "X-Lifen-Units-Total": str(self.total),
+            "X-Lifen-Units-Failed": str(len(self.failed)),
+            "X-Lifen-Units-Resumed": str(self.resumed),
+        }
@@ -0,0 +1,17 @@
+# Projection des colonnes renvoyées par les APIs (paramètre `fields=`, Easily et Lifen) : seules les colonnes
+# demandées sont lues en base, validées et sérialisées.
+
+
+def parse_fields(fields, available, required=()):
+    """Colonnes demandées par `fields` ("a,b,c"), dans l'ordre de `available` ; None sans projection.
+
+    Les colonnes `required` sont toujours incluses. Lève ValueError pour une colonne inconnue.
+    """
+    if not fields or not fields.strip():
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = sorted(requested - set(available))
+    if unknown:
+        raise ValueError(f"Colonnes inconnues: {unknown}")
+    requested.update(required)
+    return [column for column in available if column in requested]
@@ -0,0 +1,101 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Prédicat SQL sur une liste de numéros de séjour (Easily et Lifen).
+# Les listes importées ou extraites d'Easily contiennent souvent de longues suites de numéros consécutifs :
+# une suite dense devient `col BETWEEN lo AND hi` (un parcours d'index par plage au lieu d'une recherche par
+# valeur), les numéros absents de la plage sont exclus par `NOT IN`, et les numéros isolés restent en `IN (...)`.
+
+# Nombre minimal de numéros pour qu'une suite soit traitée en plage
+VENUE_RANGE_MIN_COUNT = int(os.getenv("VENUE_RANGE_MIN_COUNT", "16"))
+# Écart maximal entre deux numéros consécutifs d'une même plage (les numéros manquants deviennent des exclusions)
+VENUE_RANGE_MAX_GAP = int(os.getenv("VENUE_RANGE_MAX_GAP", "3"))
+# Les listes IN sont découpées par 1000 éléments (limite Oracle)
+IN_LIST_MAX_SIZE = 1000
+
+
+class VenuePredicate:
+    """Plan retenu pour une liste de numéros : plages, valeurs isolées et exclusions"""
+
+    def __init__(self, column, ranges, values, exclusions):
+        self.column = column
+        self.ranges = ranges
+        self.values = values
+        self.exclusions = exclusions
+
+    @property
+    def sql(self):
+        """Condition SQL (numéros entiers validés : aucune valeur externe n'est insérée telle quelle)"""
+        terms = [f"{self.column} BETWEEN {lo} AND {hi}" for lo, hi in self.ranges]
+        terms += [f"{self.column} IN ({_join(chunk)})" for chunk in _chunks(self.values)]
+        if not terms:
+            return "1 = 0"
+        condition = terms[0] if len(terms) == 1 else "(" + " OR ".join(terms) + ")"
+        for chunk in _chunks(self.exclusions):
+            condition += f" AND {self.column} NOT IN ({_join(chunk)})"
+        return condition
+
+    def describe(self):
+        covered = sum(hi - lo + 1 for lo, hi in self.ranges) - len(self.exclusions)
+        return (
+            f"{len(self.ranges)} plage(s) BETWEEN ({covered} numéros), {len(self.values)} valeur(s) IN, "
+            f"{len(self.exclusions)} exclusion(s)"
+        )
+
+
+def _join(values):
+    return ", ".join(str(value) for value in values)
+
+
+def _chunks(values):
+    return [values[i : i + IN_LIST_MAX_SIZE] for i in range(0, len(values), IN_LIST_MAX_SIZE)]
+
+
+def parse_venues(venues):
+    """Numéros de séjour valides (entiers > 0), triés et dédoublonnés, depuis une chaîne "1,2,3" ou une liste"""
+    if isinstance(venues, str):
+        venues = venues.split(",")
+    parsed = set()
+    for venue in venues or []:
+        try:
+            number = int(str(venue).strip())
+        except ValueError:
+            continue
+        if number > 0:
+            parsed.add(number)
+    return sorted(parsed)
+
+
+def plan_venue_predicate(column, venues, min_count=VENUE_RANGE_MIN_COUNT, max_gap=VENUE_RANGE_MAX_GAP):
+    """Plan du prédicat `column` ∈ venues.
+
+    Une suite est traitée en plage si elle compte au moins `min_count` numéros et si la plage plus ses
+    exclusions coûtent moins de termes que l'énumération de ses numéros.
+    """
+    venues = parse_venues(venues)
+    ranges, values, exclusions = [], [], []
+
+    def close_run(run):
+        lo, hi = run[0], run[-1]
+        holes = (hi - lo + 1) - len(run)
+        if len(run) >= min_count and 1 + holes < len(run):
+            members = set(run)
+            ranges.append((lo, hi))
+            exclusions.extend(number for number in range(lo, hi + 1) if number not in members)
+        else:
+            values.extend(run)
+
+    run = []
+    for venue in venues:
+        if run and venue - run[-1] - 1 > max_gap:
+            close_run(run)
+            run = []
+        run.append(venue)
+    if run:
+        close_run(run)
+
+    predicate = VenuePredicate(column, ranges, values, exclusions)
+    logger.debug(f"Plan séjours {column}: {predicate.describe()} -> {predicate.sql}")
+    return predicate
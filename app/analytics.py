@@ -0,0 +1,39 @@
+import logging
+
+from app_conf import ANALYTICS_ENGINE
+from reconciliation import MATCH_TOLERANCE, reconcile, service_stats
+
+logger = logging.getLogger(__name__)
+
+# Choix du moteur de calcul de l'onglet Comparaison : pandas par défaut, DuckDB si configuré et disponible
+try:
+    from duckdb_engine import large_gaps_sql, reconcile_sql, service_stats_sql
+
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+USE_DUCKDB = ANALYTICS_ENGINE == "duckdb" and DUCKDB_AVAILABLE
+if ANALYTICS_ENGINE == "duckdb" and not DUCKDB_AVAILABLE:
+    logger.warning("ANALYTICS_ENGINE=duckdb mais le paquet duckdb n'est pas installé : moteur pandas utilisé")
+
+
+def reconcile_facts(df_lifen, df_easily, tolerance=MATCH_TOLERANCE):
+    """Table de faits du rapprochement Easily/Lifen avec le moteur configuré"""
+    if USE_DUCKDB:
+        return reconcile_sql(df_lifen, df_easily, tolerance)
+    return reconcile(df_lifen, df_easily, tolerance)
+
+
+def services_summary(df_merge):
+    """Statistiques par service, triées par % de LL validées J0 décroissant"""
+    if USE_DUCKDB:
+        return service_stats_sql(df_merge)
+    return service_stats(df_merge)
+
+
+def large_gaps(df_merge, seuil_ecart):
+    """Lignes dont l'écart diffusion-sortie dépasse `seuil_ecart` jours"""
+    if USE_DUCKDB:
+        return large_gaps_sql(df_merge, seuil_ecart)
+    return df_merge[df_merge["diff_date_diffusion_sortie"] > seuil_ecart]
@@ -1,8 +1,47 @@
 import os
+from pathlib import Path
 
 # Configuration des APIs
 EASILY_API_URL = os.getenv("EASILY_API_URL", "http://localhost:8000/api/patients/comptes-rendus")
+EASILY_DELTA_API_URL = os.getenv("EASILY_DELTA_API_URL", "http://localhost:8000/api/patients/comptes-rendus/delta")
 LIFEN_API_URL = os.getenv("LIFEN_API_URL", "http://localhost:8001/api/lifen/data")
+EASILY_KPIS_API_URL = os.getenv("EASILY_KPIS_API_URL", "http://localhost:8000/api/patients/comptes-rendus/kpis")
+LIFEN_KPIS_API_URL = os.getenv("LIFEN_KPIS_API_URL", "http://localhost:8001/api/lifen/kpis")
+LIFEN_PROGRESS_API_URL = os.getenv("LIFEN_PROGRESS_API_URL", "http://localhost:8001/api/lifen/progress")
 AUTH_LOGIN_API_URL = os.getenv("AUTH_LOGIN_API_URL", "http://localhost:8000/token")
 AUTH_VALIDATE_API_URL = os.getenv("AUTH_VALIDATE_API_URL", "http://localhost:8000/me")
-DECONNEXION_API_URL = os.getenv("DECONNEXION_API_URL", "http://localhost:8000/logout")
\ No newline at end of file
+DECONNEXION_API_URL = os.getenv("DECONNEXION_API_URL", "http://localhost:8000/logout")
+
+# Nombre de numéros de séjour envoyés par appel à l'API Lifen (traitement nocturne)
+LIFEN_VENUES_PER_CALL = int(os.getenv("LIFEN_VENUES_PER_CALL", "500"))
+
+# Requête par date : numéros de séjour par appel à l'API Lifen, l'onglet Source Lifen est mis à jour après chaque appel
+LIFEN_RENDER_VENUES = int(os.getenv("LIFEN_RENDER_VENUES", "5000"))
+
+# Cache des extractions Easily par période (rafraîchissement par deltas)
+EASILY_SNAPSHOT_MAX_ENTRIES = int(os.getenv("EASILY_SNAPSHOT_MAX_ENTRIES", "8"))
+EASILY_SNAPSHOT_MAX_AGE_HOURS = int(os.getenv("EASILY_SNAPSHOT_MAX_AGE_HOURS", "168"))
+
+# Cache des tables dérivées et figures entre les reruns Streamlit (nombre de résultats conservés)
+FRAME_CACHE_MAX_ENTRIES = int(os.getenv("FRAME_CACHE_MAX_ENTRIES", "64"))
+
+# Résultats de requête par session : au-delà de RESULT_SPILL_MB (0 : jamais), ils sont écrits sur disque
+RESULT_STORE_DIR = Path(os.getenv("RESULT_STORE_DIR", Path(__file__).resolve().parent / "result_store"))
+RESULT_SPILL_MB = int(os.getenv("RESULT_SPILL_MB", "0"))
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "32"))
+
+# Table de faits IQSS pré-calculée par le traitement nocturne (batch_iqss.py)
+IQSS_STORE_DIR = Path(os.getenv("IQSS_STORE_DIR", Path(__file__).resolve().parent / "iqss_store"))
+IQSS_BATCH_USERNAME = os.getenv("IQSS_BATCH_USERNAME")
+IQSS_BATCH_PASSWORD = os.getenv("IQSS_BATCH_PASSWORD")
+IQSS_BATCH_MONTHS = int(os.getenv("IQSS_BATCH_MONTHS", "2"))
+
+# Écart maximal (en jours) entre une diffusion et la sortie pour le rapprochement Easily/Lifen (vide : sans limite)
+IQSS_MATCH_TOLERANCE_DAYS = int(os.getenv("IQSS_MATCH_TOLERANCE_DAYS") or 0)
+
+# Calendrier des jours ouvrés : "france" ou "alsace-moselle", plus les jours de fermeture propres au site (AAAA-MM-JJ)
+IQSS_HOLIDAY_CALENDAR = os.getenv("IQSS_HOLIDAY_CALENDAR", "france")
+IQSS_EXTRA_HOLIDAYS = [day.strip() for day in os.getenv("IQSS_EXTRA_HOLIDAYS", "").split(",") if day.strip()]
+
+# Moteur du rapprochement Easily/Lifen : "pandas" (défaut) ou "duckdb" (si le paquet duckdb est installé)
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "pandas").lower()
@@ -0,0 +1,107 @@
+"""Traitement nocturne : pré-calcule la table de faits IQSS (une ligne par séjour) et le cube mensuel.
+
+Usage (depuis le dossier app/) :
+    python batch_iqss.py                       # recalcule les IQSS_BATCH_MONTHS derniers mois clos
+    python batch_iqss.py --mois 2025-01 2025-02
+"""
+
+import argparse
+import calendar
+from datetime import date, timedelta
+
+import pandas as pd
+import requests
+from analytics import reconcile_facts
+from app_conf import (
+    AUTH_LOGIN_API_URL,
+    EASILY_API_URL,
+    IQSS_BATCH_MONTHS,
+    IQSS_BATCH_PASSWORD,
+    IQSS_BATCH_USERNAME,
+    LIFEN_API_URL,
+    LIFEN_VENUES_PER_CALL,
+)
+from iqss_store import rebuild_cube, save_facts
+from reconciliation import ReconciliationError
+from schemas import easily_frame, lifen_frame
+
+
+def login():
+    """Obtient un jeton pour le compte de service du traitement"""
+    if not IQSS_BATCH_USERNAME or not IQSS_BATCH_PASSWORD:
+        raise SystemExit("IQSS_BATCH_USERNAME et IQSS_BATCH_PASSWORD doivent être définis")
+    response = requests.post(
+        AUTH_LOGIN_API_URL, data={"username": IQSS_BATCH_USERNAME, "password": IQSS_BATCH_PASSWORD}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def last_closed_months(count, today=None):
+    """Les `count` derniers mois complets, du plus ancien au plus récent"""
+    today = today or date.today()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        months.append(f"{year:04d}-{month:02d}")
+    return months[::-1]
+
+
+def month_bounds(mois):
+    """Premier jour du mois et premier jour du mois suivant (le BETWEEN SQL s'arrête à minuit de la borne haute)"""
+    year, month = (int(part) for part in mois.split("-"))
+    start_date = date(year, month, 1)
+    return start_date, start_date + timedelta(days=calendar.monthrange(year, month)[1])
+
+
+def fetch_month(token, mois):
+    """Récupère les lignes Easily des séjours sortis dans le mois puis les diffusions Lifen correspondantes"""
+    start_date, end_date = month_bounds(mois)
+    headers = {"Authorization": f"Bearer {token}"}
+    period = {"start_date": start_date.strftime("%Y-%m-%d"), "end_date": end_date.strftime("%Y-%m-%d")}
+
+    response = requests.get(EASILY_API_URL, params=period, headers=headers)
+    response.raise_for_status()
+    df_easily = easily_frame(response.json())
+    if not df_easily.empty:
+        df_easily = df_easily[df_easily["sej_date_sortie"].dt.strftime("%Y-%m") == mois]
+    if df_easily.empty:
+        return df_easily, pd.DataFrame()
+
+    venues = [str(v) for v in df_easily["Num_Venue"].dropna().unique() if v]
+    lifen_data = []
+    for i in range(0, len(venues), LIFEN_VENUES_PER_CALL):
+        params = {"num_venues": ",".join(venues[i : i + LIFEN_VENUES_PER_CALL]), **period}
+        response = requests.get(LIFEN_API_URL, params=params, headers=headers)
+        response.raise_for_status()
+        lifen_data.extend(response.json())
+
+    return df_easily, lifen_frame(lifen_data)
+
+
+def run(months):
+    token = login()
+    for mois in months:
+        df_easily, df_lifen = fetch_month(token, mois)
+        try:
+            df_facts = reconcile_facts(df_lifen, df_easily)
+        except ReconciliationError as e:
+            print(f"⚠️ {mois} : {e}")
+            continue
+        save_facts(mois, df_facts)
+        print(f"✅ {mois} : {len(df_facts)} séjours")
+
+    cube = rebuild_cube()
+    print(f"✅ Cube mis à jour : {len(cube)} lignes mois × spécialité")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-calcul de la table de faits IQSS et du cube mensuel")
+    parser.add_argument("--mois", nargs="*", help="Mois à recalculer (AAAA-MM)")
+    args = parser.parse_args()
+    run(args.mois or last_closed_months(IQSS_BATCH_MONTHS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from app_conf import IQSS_EXTRA_HOLIDAYS, IQSS_HOLIDAY_CALENDAR
+
+# Calendrier des jours ouvrés : du lundi au vendredi, hors jours fériés français (et jours propres au site)
+
+# Jours fériés régionaux supplémentaires, en décalage par rapport à Pâques ou en date fixe (mois, jour)
+REGIONAL_HOLIDAYS = {
+    "france": {"paques": [], "fixes": []},
+    "alsace-moselle": {"paques": [-2], "fixes": [(12, 26)]},  # Vendredi saint, Saint-Étienne
+}
+
+
+def easter_sunday(year):
+    """Dimanche de Pâques (calendrier grégorien, algorithme de Meeus/Jones/Butcher)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def french_holidays(year, calendar="france"):
+    """Jours fériés de l'année pour le calendrier demandé ("france" ou "alsace-moselle")"""
+    paques = easter_sunday(year)
+    holidays = [
+        date(year, 1, 1),  # Jour de l'an
+        paques + timedelta(days=1),  # Lundi de Pâques
+        date(year, 5, 1),  # Fête du travail
+        date(year, 5, 8),  # Victoire 1945
+        paques + timedelta(days=39),  # Ascension
+        paques + timedelta(days=50),  # Lundi de Pentecôte
+        date(year, 7, 14),  # Fête nationale
+        date(year, 8, 15),  # Assomption
+        date(year, 11, 1),  # Toussaint
+        date(year, 11, 11),  # Armistice 1918
+        date(year, 12, 25),  # Noël
+    ]
+    regional = REGIONAL_HOLIDAYS[calendar]
+    holidays += [paques + timedelta(days=offset) for offset in regional["paques"]]
+    holidays += [date(year, month, day) for month, day in regional["fixes"]]
+    return sorted(holidays)
+
+
+def holiday_calendar(first_year, last_year, calendar=IQSS_HOLIDAY_CALENDAR, extra_holidays=IQSS_EXTRA_HOLIDAYS):
+    """Jours fériés (datetime64[D]) couvrant les années demandées, jours de fermeture du site inclus"""
+    days = [day for year in range(first_year, last_year + 1) for day in french_holidays(year, calendar)]
+    days += [date.fromisoformat(day) for day in extra_holidays]
+    return np.array(sorted(set(days)), dtype="datetime64[D]")
+
+
+def _holidays_for(*series):
+    years = pd.concat([s.dt.year for s in series]).dropna()
+    if years.empty:
+        return np.array([], dtype="datetime64[D]")
+    return holiday_calendar(int(years.min()), int(years.max()))
+
+
+def business_days_between(start, end):
+    """Écart en jours ouvrés entre deux colonnes de dates (négatif si `end` précède `start`, NaN si manquante).
+
+    Même convention que l'écart calendaire (end - start) : un envoi le jour ouvré suivant compte pour 1,
+    les week-ends et jours fériés intermédiaires ne sont pas comptés.
+    """
+    start = pd.to_datetime(start)
+    end = pd.to_datetime(end)
+    result = pd.Series(np.nan, index=start.index)
+    valid = start.notna() & end.notna()
+    if not valid.any():
+        return result
+
+    holidays = _holidays_for(start[valid], end[valid])
+    begin_days = start[valid].to_numpy().astype("datetime64[D]")
+    end_days = end[valid].to_numpy().astype("datetime64[D]")
+
+    # busday_count compte les jours ouvrés de [début, fin[ (négatif si fin < début) : on décale d'un jour
+    # pour compter le jour d'arrivée plutôt que celui de départ, comme (end - start).days
+    shift = np.timedelta64(1, "D")
+    result[valid] = np.busday_count(begin_days + shift, end_days + shift, holidays=holidays)
+    return result
+
+
+def is_business_day(dates):
+    """Masque des dates tombant un jour ouvré (False pour les dates manquantes)"""
+    dates = pd.to_datetime(dates)
+    result = pd.Series(False, index=dates.index)
+    valid = dates.notna()
+    if valid.any():
+        days = dates[valid].to_numpy().astype("datetime64[D]")
+        result[valid] = np.is_busday(days, holidays=_holidays_for(dates[valid]))
+    return result
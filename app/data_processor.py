@@ -1,7 +1,117 @@
-import pandas as pd
+import uuid
+
 import streamlit as st
-from tabs.easily import get_easily_data
-from tabs.lifen import get_lifen_data
+from app_conf import LIFEN_RENDER_VENUES
+from easily_snapshot import get_easily_data_incremental
+from fetch import FetchRun
+from kpis import save_kpis
+from result_store import save_results
+from schemas import easily_frame, lifen_frame
+from tabs.easily import get_easily_data, get_easily_kpis
+from tabs.lifen import get_lifen_data, get_lifen_kpis, watch_lifen_progress
+
+
+def found_venues(data, key):
+    """Numéros de séjour (entiers) présents dans les lignes renvoyées par une API"""
+    venues = set()
+    for item in data or []:
+        if item.get(key):
+            try:
+                venues.add(int(item[key]))
+            except (ValueError, TypeError):
+                pass
+    return venues
+
+
+def record_missing_venues(easily_data, lifen_data):
+    """Enregistre dans la session les numéros importés absents d'Easily, de Lifen ou des deux"""
+    # Comparer avec la liste originale des numéros importés
+    original_venues = set(st.session_state.original_imported_venues)
+
+    # Numéros manquants dans Easily
+    missing_venues_easily = original_venues - found_venues(easily_data, "Num_Venue")
+    st.session_state.missing_venues_easily = sorted(missing_venues_easily)
+
+    # Numéros manquants dans Lifen
+    missing_venues_lifen = original_venues - found_venues(lifen_data, "num_sej")
+    st.session_state.missing_venues_lifen = sorted(missing_venues_lifen)
+
+    # Numéros manquants dans les deux systèmes
+    missing_venues_both = missing_venues_easily.intersection(missing_venues_lifen)
+    st.session_state.missing_venues_both = sorted(missing_venues_both)
+
+    if missing_venues_both:
+        st.info(f"{len(missing_venues_both)} numéro(s) de séjour n'a/n'ont pas été retrouvés dans Easily ou Lifen.")
+
+
+# Indicateurs agrégés (/kpis) de chaque source
+KPI_FETCHERS = {"Easily": get_easily_kpis, "Lifen": get_lifen_kpis}
+
+
+def submit_kpis(fetch_run, kpi_calls, kpi_sources, source, *args):
+    """Lance l'appel /kpis de la source si ses statistiques sont affichées (Future rangé dans `kpi_calls`)"""
+    if source in kpi_sources:
+        kpi_calls[source] = fetch_run.submit(f"{source} KPI", KPI_FETCHERS[source], *args)
+
+
+def venue_slices(num_venues, size=LIFEN_RENDER_VENUES):
+    """Numéros de séjour découpés en appels successifs à l'API Lifen (au moins un appel)"""
+    return [num_venues[i : i + size] for i in range(0, len(num_venues), size)] or [num_venues]
+
+
+def fetch_lifen_with_progress(
+    fetch_run, num_venues, start_date, end_date, lifen_filters, lifen_fields, on_lifen_slice=None
+):
+    """Diffusions Lifen d'une requête par date, avec l'avancement des lots exposé par l'API
+
+    Les numéros de séjour sont envoyés par appels de LIFEN_RENDER_VENUES : après chaque appel sauf le dernier,
+    `on_lifen_slice(lifen_data, appels_faits, appels_total)` reçoit les diffusions déjà reçues. L'appel suivant est
+    lancé avant, l'affichage ne retarde pas la récupération.
+    """
+    progress = st.progress(0.0, text="Récupération des diffusions Lifen...")
+    slices = venue_slices(num_venues)
+    lifen_data = []
+
+    def submit(venues):
+        progress_id = uuid.uuid4().hex
+        lifen_call = fetch_run.submit(
+            "Lifen", get_lifen_data, venues, start_date, end_date, progress_id, lifen_filters, lifen_fields
+        )
+        return lifen_call, progress_id
+
+    def show_progress(snapshot, index):
+        done, total = snapshot["chunks_done"], snapshot["chunks_total"]
+        call = f"appel {index + 1}/{len(slices)}, " if len(slices) > 1 else ""
+        text = f"Diffusions Lifen : {call}lot {done}/{total} ({len(lifen_data) + snapshot['rows']} lignes reçues)"
+        if snapshot["eta_seconds"] is not None and snapshot["status"] == "running":
+            text += f", fin estimée dans {snapshot['eta_seconds']:.0f} s"
+        progress.progress((index + (done / total if total else 0.0)) / len(slices), text=text)
+
+    pending = submit(slices[0])
+    for index in range(len(slices)):
+        lifen_call, progress_id = pending
+        rows = watch_lifen_progress(
+            lifen_call, progress_id, lambda snapshot, index=index: show_progress(snapshot, index)
+        )
+        if index + 1 < len(slices):
+            pending = submit(slices[index + 1])
+        lifen_data.extend(rows or [])
+        if on_lifen_slice and index + 1 < len(slices):
+            on_lifen_slice(lifen_data, index + 1, len(slices))
+    progress.empty()
+    return lifen_data
+
+
+def filtered_lifen_frame(lifen_data, filter_result=None, filter_channel=None):
+    """DataFrame Lifen typé, filtré par résultat et canal d'envoi ; None sans données"""
+    if not lifen_data:
+        return None
+    df_lifen = lifen_frame(lifen_data)
+    if filter_result and "statut_envoi" in df_lifen.columns:
+        df_lifen = df_lifen[df_lifen["statut_envoi"].isin(filter_result)]
+    if filter_channel and "canal_envoi" in df_lifen.columns:
+        df_lifen = df_lifen[df_lifen["canal_envoi"].isin(filter_channel)]
+    return df_lifen
 
 
 def process_data(
@@ -12,9 +122,25 @@ def process_data(
     filter_specialite=None,
     filter_result=None,
     filter_channel=None,
+    on_easily_ready=None,
+    on_lifen_partial=None,
+    easily_fields=None,
+    lifen_fields=None,
+    lifen_roles=None,
+    kpi_sources=None,
 ):
-    """Process data from APIs and apply filters based on query type"""
-    with st.spinner("Récupération des données..."):
+    """Process data from APIs and apply filters based on query type
+
+    En mode date, `on_easily_ready(df_easily)` est appelé dès que les données Easily filtrées sont prêtes,
+    avant la récupération des diffusions Lifen (affichage progressif), puis `on_lifen_partial(df_lifen, appels_faits,
+    appels_total)` après chaque appel Lifen sauf le dernier, avec les diffusions filtrées déjà reçues.
+    `easily_fields` / `lifen_fields` limitent les colonnes demandées aux APIs (toutes par défaut).
+    `lifen_roles` (rôles de destinataire) restreint les diffusions demandées à l'API Lifen en mode date.
+    `kpi_sources` ("Easily", "Lifen") : sources dont les indicateurs agrégés (/kpis) sont demandés en parallèle
+    des lignes, pour la même sélection et les mêmes filtres.
+    """
+    kpi_sources = kpi_sources or []
+    with st.spinner("Récupération des données..."), FetchRun() as fetch_run:
         # Determine query mode
         is_venue_query = query_type == "Requête par numéros de séjour"
 
@@ -22,6 +148,7 @@ def process_data(
         st.session_state.missing_venues_easily = []
         st.session_state.missing_venues_lifen = []
         st.session_state.missing_venues_both = []
+        kpi_calls = {}
 
         if is_venue_query:
             # Pour les requêtes par numéros de séjour, utiliser null pour les dates
@@ -30,54 +157,27 @@ def process_data(
                 st.warning("Aucun numéro de séjour importé. Veuillez importer des numéros de séjour.")
                 return None, None
 
-            # Récupérer les données Easily en mode venue uniquement
-            easily_data = get_easily_data(start_date=None, end_date=None, venue_numbers=imported_venues)
-
-            # Pour une requête par numéro de séjour, utiliser directement les numéros importés
-            num_venues = imported_venues
-
-            # Récupérer les données Lifen avec les numéros de séjour importés
-            lifen_data = get_lifen_data(num_venues, None, None)
-
-            # Identifier les numéros de séjour retrouvés dans Easily
-            found_venues_easily = set()
-            if easily_data:
-                for item in easily_data:
-                    if "Num_Venue" in item and item["Num_Venue"]:
-                        try:
-                            found_venues_easily.add(int(item["Num_Venue"]))
-                        except (ValueError, TypeError):
-                            pass
-
-            # Identifier les numéros de séjour retrouvés dans Lifen
-            found_venues_lifen = set()
-            if lifen_data:
-                for item in lifen_data:
-                    if "num_sej" in item and item["num_sej"]:
-                        try:
-                            found_venues_lifen.add(int(item["num_sej"]))
-                        except (ValueError, TypeError):
-                            pass
-
-            # Comparer avec la liste originale des numéros importés
-            original_venues = set(st.session_state.original_imported_venues)
-
-            # Numéros manquants dans Easily
-            missing_venues_easily = original_venues - found_venues_easily
-            st.session_state.missing_venues_easily = sorted(missing_venues_easily)
-
-            # Numéros manquants dans Lifen
-            missing_venues_lifen = original_venues - found_venues_lifen
-            st.session_state.missing_venues_lifen = sorted(missing_venues_lifen)
-
-            # Numéros manquants dans les deux systèmes
-            missing_venues_both = missing_venues_easily.intersection(missing_venues_lifen)
-            st.session_state.missing_venues_both = sorted(missing_venues_both)
-
-            if missing_venues_both:
-                st.info(
-                    f"{len(missing_venues_both)} numéro(s) de séjour n'a/n'ont pas été retrouvés dans Easily ou Lifen."
-                )
+            # Les deux sources ne dépendent que des numéros importés : appels Easily et Lifen en parallèle
+            submit_kpis(fetch_run, kpi_calls, kpi_sources, "Easily", None, None, imported_venues, filter_specialite)
+            submit_kpis(
+                fetch_run,
+                kpi_calls,
+                kpi_sources,
+                "Lifen",
+                imported_venues,
+                None,
+                None,
+                uuid.uuid4().hex,
+                {"statut_envoi": filter_result, "canal_envoi": filter_channel},
+            )
+            easily_call = fetch_run.submit("Easily", get_easily_data, None, None, imported_venues, easily_fields)
+            lifen_call = fetch_run.submit(
+                "Lifen", get_lifen_data, imported_venues, None, None, None, None, lifen_fields
+            )
+            easily_data = easily_call.result()
+            lifen_data = lifen_call.result()
+
+            record_missing_venues(easily_data, lifen_data)
 
         else:
             # Pour les requêtes par date, utiliser les dates sélectionnées
@@ -85,12 +185,12 @@ def process_data(
             if not start_date or not end_date:
                 st.warning("Veuillez sélectionner des dates valides pour la requête.")
                 return None, None
-            # Récupérer les données Easily avec les dates
-            easily_data = get_easily_data(
-                start_date=start_date,
-                end_date=end_date,
-                venue_numbers=[],  # Liste vide pour les requêtes par date
-            )
+            # Récupérer les données Easily avec les dates (delta depuis la dernière extraction si disponible) ;
+            # le filtre de spécialités est appliqué par la requête Easily
+            submit_kpis(fetch_run, kpi_calls, kpi_sources, "Easily", start_date, end_date, None, filter_specialite)
+            easily_data = fetch_run.submit(
+                "Easily", get_easily_data_incremental, start_date, end_date, filter_specialite, easily_fields
+            ).result()
 
         if not easily_data:
             message = "Aucune donnée Easily n'a été retournée."
@@ -101,43 +201,66 @@ def process_data(
             st.warning(message)
             return None, None
 
-        # Store in session state
-        st.session_state.easily_data = easily_data
-
-        # Convertir en DataFrame pour faciliter la manipulation
-        df_easily = pd.DataFrame(easily_data)
+        # Convertir en DataFrame typé (catégories, numéros de séjour entiers, dates converties une seule fois)
+        df_easily = easily_frame(easily_data)
 
         # Appliquer les filtres Easily
         if filter_specialite:
             df_easily = df_easily[df_easily["CR_Doss_spe"].isin(filter_specialite)]
 
-        # MODIFICATION ICI: Déterminer quels numéros de séjour utiliser pour Lifen
-        if is_venue_query:
-            # Pour une requête par numéro de séjour, utiliser directement les numéros importés
-            # au lieu d'extraire les numéros depuis la réponse Easily
-            num_venues = imported_venues
-
-            # Récupérer les données Lifen avec les numéros de séjour importés
-            lifen_data = get_lifen_data(num_venues, None, None)
-        else:
+        # En mode séjour, les données Lifen des numéros importés ont déjà été récupérées
+        if not is_venue_query:
             # Pour une requête par date, extraire les numéros de séjour depuis la réponse Easily
-            num_venues = df_easily["Num_Venue"].tolist() if "Num_Venue" in df_easily.columns else []
-
-            # Récupérer les données Lifen avec les dates et les numéros extraits d'Easily
-            lifen_data = get_lifen_data(num_venues, start_date, end_date)
-
-        # Store in session state
-        st.session_state.lifen_data = lifen_data
-
-        # Créer un DataFrame Lifen
-        if lifen_data:
-            df_lifen = pd.DataFrame(lifen_data)
-            # Appliquer les filtres Lifen
-            if filter_result and "statut_envoi" in df_lifen.columns:
-                df_lifen = df_lifen[df_lifen["statut_envoi"].isin(filter_result)]
-            if filter_channel and "canal_envoi" in df_lifen.columns:
-                df_lifen = df_lifen[df_lifen["canal_envoi"].isin(filter_channel)]
-        else:
-            df_lifen = None
+            num_venues = df_easily["Num_Venue"].dropna().tolist() if "Num_Venue" in df_easily.columns else []
+
+            # Affichage progressif : les données Easily sont affichées sans attendre Lifen
+            if on_easily_ready:
+                on_easily_ready(df_easily)
+
+            # Récupérer les données Lifen des numéros extraits d'Easily ; filtres Lifen appliqués par l'API
+            # (en mode séjour, tous les documents servent à repérer les numéros absents de Lifen : ils restent
+            # filtrés ci-dessous)
+            lifen_filters = {
+                "statut_envoi": filter_result,
+                "canal_envoi": filter_channel,
+                "role_destinataire": lifen_roles,
+            }
+
+            def render_lifen_slice(rows, done, total):
+                on_lifen_partial(filtered_lifen_frame(rows, filter_result, filter_channel), done, total)
+
+            # Indicateurs Lifen des mêmes séjours, agrégés par Oracle pendant la récupération des diffusions
+            submit_kpis(
+                fetch_run,
+                kpi_calls,
+                kpi_sources,
+                "Lifen",
+                num_venues,
+                start_date,
+                end_date,
+                uuid.uuid4().hex,
+                lifen_filters,
+            )
+
+            lifen_data = fetch_lifen_with_progress(
+                fetch_run,
+                num_venues,
+                start_date,
+                end_date,
+                lifen_filters,
+                lifen_fields,
+                render_lifen_slice if on_lifen_partial else None,
+            )
+
+        st.session_state.lifen_filters_active = bool(filter_result or filter_channel)
+
+        # Créer un DataFrame Lifen filtré
+        df_lifen = filtered_lifen_frame(lifen_data, filter_result, filter_channel)
+
+        # Conserver les DataFrames typés (et filtrés) pour les reruns de la session
+        save_results(df_easily, df_lifen)
+        save_kpis({source: call.result() for source, call in kpi_calls.items()})
+
+    fetch_run.report()
 
     return df_easily, df_lifen
@@ -0,0 +1,218 @@
+import duckdb
+import pandas as pd
+import pyarrow as pa
+from reconciliation import REQUIRED_EASILY_COLS, ReconciliationError, check_easily, check_lifen, finalize_facts
+from schemas import EASILY_SCHEMA, LIFEN_SCHEMA, apply_schema
+
+# Moteur SQL en mémoire (DuckDB sur tables Arrow) pour le rapprochement Easily/Lifen : mêmes règles que
+# reconciliation.reconcile, exécutées en une requête multi-thread sans copies intermédiaires des DataFrames
+
+RECONCILIATION_SQL = """
+WITH easily AS (
+    SELECT DISTINCT ON (pat_IPP, Num_Venue, ven_theo, sej_date_entree, sej_date_sortie, CR_Doss_spe, date_min_val,
+                        LL_J0, "Date diffusion", fiche_id)
+        *
+    FROM easily_source
+    ORDER BY _ligne
+),
+easily_dates AS (
+    SELECT
+        *,
+        CAST(sej_date_sortie AS TIMESTAMP) AS sortie,
+        CAST("Date diffusion" AS TIMESTAMP) AS diffusion
+    FROM easily
+),
+-- Pour chaque fiche, la ligne dont la diffusion est la plus proche de la sortie (première en cas d'égalité)
+fiches_retenues AS (
+    SELECT *
+    FROM easily_dates
+    WHERE fiche_id IS NOT NULL
+    QUALIFY row_number() OVER (
+        PARTITION BY fiche_id
+        ORDER BY coalesce(abs(epoch(diffusion) - epoch(sortie)), 9999 * 86400), _ligne
+    ) = 1
+),
+lifen AS (
+    SELECT
+        _ligne,
+        TRY_CAST(ipp AS BIGINT) AS ipp,
+        TRY_CAST(num_sej AS BIGINT) AS num_sej,
+        TRY_CAST(date_envoi AS TIMESTAMP) AS envoi
+    FROM lifen_source
+    WHERE role_destinataire = 'Patient'
+),
+lifen_cles AS (
+    SELECT DISTINCT ipp, num_sej FROM lifen WHERE ipp IS NOT NULL AND num_sej IS NOT NULL
+),
+-- Seuls les séjours présents dans Lifen sont rapprochés
+fiches AS (
+    SELECT f.*, TRY_CAST(f.pat_IPP AS BIGINT) AS ipp, TRY_CAST(f.Num_Venue AS BIGINT) AS num_sej
+    FROM fiches_retenues f
+    SEMI JOIN lifen_cles l
+        ON TRY_CAST(f.pat_IPP AS BIGINT) = l.ipp AND TRY_CAST(f.Num_Venue AS BIGINT) = l.num_sej
+),
+sejours AS (
+    SELECT ipp, num_sej, sortie, _ligne AS ordre_sejour
+    FROM fiches
+    QUALIFY row_number() OVER (PARTITION BY ipp, num_sej ORDER BY _ligne) = 1
+),
+-- Envoi Lifen le plus proche de la sortie (le plus ancien à écart égal)
+meilleur_lifen AS (
+    SELECT s.ipp, s.num_sej, l.envoi
+    FROM sejours s
+    JOIN lifen l ON l.ipp = s.ipp AND l.num_sej = s.num_sej
+    WHERE l.envoi IS NOT NULL
+        AND s.sortie IS NOT NULL
+        AND ($tolerance IS NULL OR abs(epoch(l.envoi) - epoch(s.sortie)) <= $tolerance)
+    QUALIFY row_number() OVER (
+        PARTITION BY s.ipp, s.num_sej ORDER BY abs(epoch(l.envoi) - epoch(s.sortie)), l.envoi
+    ) = 1
+),
+-- Diffusion Easily la plus proche de la sortie parmi les fiches du séjour
+meilleur_easily AS (
+    SELECT ipp, num_sej, diffusion
+    FROM fiches
+    WHERE diffusion IS NOT NULL
+        AND sortie IS NOT NULL
+        AND ($tolerance IS NULL OR abs(epoch(diffusion) - epoch(sortie)) <= $tolerance)
+    QUALIFY row_number() OVER (
+        PARTITION BY ipp, num_sej ORDER BY abs(epoch(diffusion) - epoch(sortie)), _ligne
+    ) = 1
+),
+optimale AS (
+    SELECT
+        s.ipp,
+        s.num_sej,
+        s.ordre_sejour,
+        ml.envoi AS date_envoi_lifen,
+        CASE
+            WHEN ml.envoi IS NULL OR me.diffusion IS NULL THEN 'Aucune'
+            WHEN floor(abs(epoch(ml.envoi) - epoch(s.sortie)) / 86400)
+                <= floor(abs(epoch(me.diffusion) - epoch(s.sortie)) / 86400) THEN 'Lifen'
+            ELSE 'Easily'
+        END AS source_optimale,
+        me.diffusion
+    FROM sejours s
+    LEFT JOIN meilleur_lifen ml USING (ipp, num_sej)
+    LEFT JOIN meilleur_easily me USING (ipp, num_sej)
+),
+rapprochement AS (
+    SELECT
+        o.ipp,
+        o.num_sej,
+        o.ordre_sejour,
+        f._ligne,
+        o.source_optimale,
+        f.sortie AS date_sortie_easily,
+        o.date_envoi_lifen,
+        f.diffusion AS date_diffusion_easily,
+        CAST(f.date_min_val AS TIMESTAMP) AS date_min_val_easily,
+        f.CR_Doss_spe AS specialite_easily,
+        CASE o.source_optimale
+            WHEN 'Lifen' THEN o.date_envoi_lifen
+            WHEN 'Easily' THEN o.diffusion
+        END AS date_diffusion_optimale
+    FROM optimale o
+    JOIN fiches f USING (ipp, num_sej)
+)
+SELECT
+    * EXCLUDE (ordre_sejour, _ligne),
+    date_diff('day', CAST(date_sortie_easily AS DATE), CAST(date_diffusion_optimale AS DATE))
+        AS diff_date_diffusion_sortie,
+    date_diff('day', CAST(date_sortie_easily AS DATE), CAST(date_min_val_easily AS DATE))
+        AS diff_validation_easily_sortie_easily,
+    date_diff('day', CAST(date_min_val_easily AS DATE), CAST(date_diffusion_optimale AS DATE))
+        AS delai_envoi_validation
+FROM rapprochement
+ORDER BY num_sej, ordre_sejour, _ligne
+"""
+
+SERVICE_STATS_SQL = """
+SELECT
+    specialite_easily AS "Service",
+    count(*) AS "Total LL",
+    count(*) FILTER (WHERE diff_validation_easily_sortie_easily = 0) AS "LL validées J0",
+    count(*) FILTER (WHERE diff_validation_easily_sortie_easily = 0)::DOUBLE / count(*) * 100
+        AS "% LL validées J0",
+    avg(diff_date_diffusion_sortie) AS "Délai moyen global (j)",
+    median(diff_date_diffusion_sortie) AS "Délai médian global (j)",
+    avg(diff_date_diffusion_sortie) FILTER (WHERE diff_validation_easily_sortie_easily = 0)
+        AS "Délai moyen LL J0 (j)",
+    median(diff_date_diffusion_sortie) FILTER (WHERE diff_validation_easily_sortie_easily = 0)
+        AS "Délai médian LL J0 (j)"
+FROM faits
+WHERE specialite_easily IS NOT NULL
+GROUP BY specialite_easily
+ORDER BY "% LL validées J0" DESC, min(_ligne)
+"""
+
+LARGE_GAPS_SQL = """
+SELECT * EXCLUDE (_ligne)
+FROM faits
+WHERE diff_date_diffusion_sortie > $seuil
+ORDER BY _ligne
+"""
+
+
+def _arrow(df, columns=None):
+    """Table Arrow des colonnes utiles, avec le numéro de ligne d'origine (départage des égalités)"""
+    table = pa.Table.from_pandas(df if columns is None else df[columns], preserve_index=False)
+    return table.append_column("_ligne", pa.array(range(len(df)), type=pa.int64()))
+
+
+def reconcile_sql(df_lifen, df_easily, tolerance=None):
+    """Équivalent SQL de reconciliation.reconcile (mêmes colonnes, mêmes erreurs)"""
+    check_easily(df_easily)
+    check_lifen(df_lifen)
+    if not (df_lifen["role_destinataire"] == "Patient").any():
+        raise ReconciliationError("Aucune donnée Lifen pour les patients après filtrage")
+
+    con = duckdb.connect()
+    try:
+        # Dates déjà converties par le schéma (sans effet sur un DataFrame typé à la réception)
+        df_easily = apply_schema(df_easily[REQUIRED_EASILY_COLS], EASILY_SCHEMA)
+        df_lifen = apply_schema(df_lifen[["ipp", "num_sej", "date_envoi", "role_destinataire"]], LIFEN_SCHEMA)
+        con.register("easily_source", _arrow(df_easily))
+        con.register("lifen_source", _arrow(df_lifen))
+        params = {"tolerance": tolerance.total_seconds() if tolerance is not None else None}
+        df_merge = con.execute(RECONCILIATION_SQL, params).df()
+    except duckdb.ConversionException as e:
+        raise ReconciliationError(f"Erreur lors de la conversion des dates: {e}") from e
+    finally:
+        con.close()
+
+    if df_merge.empty:
+        raise ReconciliationError(
+            "Aucune correspondance trouvée entre les données Easily et Lifen",
+            hint="Vérifiez que les numéros de séjour correspondent entre les deux sources",
+        )
+
+    df_merge["ipp"] = df_merge["ipp"].astype("Int64")
+    df_merge["num_sej"] = df_merge["num_sej"].astype("Int64")
+    return finalize_facts(df_merge)
+
+
+def service_stats_sql(df_merge):
+    """Équivalent SQL de reconciliation.service_stats (même ordre, mêmes types)"""
+    con = duckdb.connect()
+    try:
+        con.register("faits", _arrow(df_merge))
+        df_stats_services = con.sql(SERVICE_STATS_SQL).df()
+    finally:
+        con.close()
+    if df_stats_services.empty:
+        return pd.DataFrame()
+    specialites = df_merge["specialite_easily"]
+    categories = specialites.cat.categories if isinstance(specialites.dtype, pd.CategoricalDtype) else None
+    df_stats_services["Service"] = pd.Categorical(df_stats_services["Service"], categories=categories)
+    return df_stats_services
+
+
+def large_gaps_sql(df_merge, seuil_ecart):
+    """Séjours dont l'écart diffusion-sortie dépasse le seuil (en jours)"""
+    con = duckdb.connect()
+    try:
+        con.register("faits", _arrow(df_merge))
+        return con.execute(LARGE_GAPS_SQL, {"seuil": seuil_ecart}).df()
+    finally:
+        con.close()
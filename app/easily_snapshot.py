@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from app_conf import EASILY_SNAPSHOT_MAX_AGE_HOURS, EASILY_SNAPSHOT_MAX_ENTRIES
+from tabs.easily import get_easily_snapshot
+
+# Extractions Easily par période, partagées entre les sessions (les données ne dépendent pas de l'utilisateur)
+_snapshots = OrderedDict()
+_lock = threading.Lock()
+
+
+def _sortie_bounds(start_date, end_date):
+    """Bornes ISO équivalentes au `BETWEEN start AND end` appliqué côté SQL sur sej_date_sortie"""
+    return f"{start_date:%Y-%m-%d}T00:00:00", f"{end_date:%Y-%m-%d}T00:00:00"
+
+
+def _trim_to_period(records, start_date, end_date):
+    """Ne conserve que les lignes dont la date de sortie est dans la période demandée"""
+    low, high = _sortie_bounds(start_date, end_date)
+    return [r for r in records if r.get("sej_date_sortie") and low <= r["sej_date_sortie"] <= high]
+
+
+def apply_easily_delta(records, delta_records):
+    """Remplace dans `records` toutes les lignes des fiches présentes dans `delta_records`"""
+    if not delta_records:
+        return records
+
+    # Une fiche peut apparaître sur plusieurs lignes (une par destinataire) : on remplace la fiche entière
+    updated_fiches = {r.get("fiche_id") for r in delta_records}
+    patched = [r for r in records if r.get("fiche_id") not in updated_fiches]
+
+    # Les plages extraites se chevauchent à leurs bornes : on ignore les lignes strictement identiques
+    seen = set()
+    for record in delta_records:
+        row_key = tuple(sorted(record.items()))
+        if row_key not in seen:
+            seen.add(row_key)
+            patched.append(record)
+
+    return patched
+
+
+def _find_overlapping_snapshot(start_date, end_date, specialites, fields):
+    """Retourne la clé de l'extraction en cache (mêmes spécialités et colonnes) qui recouvre le plus la période"""
+    best_key, best_overlap = None, -1
+    now = datetime.now()
+    for key, snapshot in _snapshots.items():
+        if snapshot["specialites"] != specialites or snapshot["fields"] != fields:
+            continue
+        if now - snapshot["fetched_at"] > timedelta(hours=EASILY_SNAPSHOT_MAX_AGE_HOURS):
+            continue
+        overlap = (min(end_date, snapshot["end_date"]) - max(start_date, snapshot["start_date"])).days
+        if overlap >= 0 and overlap > best_overlap:
+            best_key, best_overlap = key, overlap
+    return best_key
+
+
+def _store_snapshot(start_date, end_date, specialites, fields, records, snapshot_time, fetched_at, replaces=None):
+    """Met en cache l'extraction de la période ; `replaces` est la clé de l'extraction qu'elle remplace (patchée
+    par le delta), supprimée pour ne pas garder deux copies des mêmes fiches"""
+    key = (start_date, end_date, specialites, fields)
+    if replaces is not None and replaces != key:
+        _snapshots.pop(replaces, None)
+    _snapshots[key] = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "specialites": specialites,
+        "fields": fields,
+        "records": records,
+        "snapshot_time": snapshot_time,
+        "fetched_at": fetched_at,
+    }
+    _snapshots.move_to_end(key)
+    while len(_snapshots) > EASILY_SNAPSHOT_MAX_ENTRIES:
+        _snapshots.popitem(last=False)
+
+
+def get_easily_data_incremental(start_date, end_date, specialites=None, fields=None):
+    """Récupère les données Easily d'une période en ne transférant que le delta depuis la dernière extraction.
+
+    Si une extraction en cache recouvre la période, seules les fiches créées/modifiées depuis cette
+    extraction et les jours non couverts sont demandés à l'API ; sinon la période est téléchargée en entier.
+    Les fiches supprimées ou sorties du périmètre ne sont purgées qu'au renouvellement complet
+    (après EASILY_SNAPSHOT_MAX_AGE_HOURS). Avec `specialites` ou `fields` (colonnes renvoyées, qui doivent
+    inclure fiche_id et sej_date_sortie), le filtre est appliqué par l'API et l'extraction est mise en cache
+    séparément.
+    """
+    specialites = tuple(sorted(specialites)) if specialites else ()
+    fields = tuple(fields) if fields else ()
+    with _lock:
+        key = _find_overlapping_snapshot(start_date, end_date, specialites, fields)
+        snapshot = dict(_snapshots[key]) if key is not None else None
+
+    if snapshot is None or not snapshot["snapshot_time"]:
+        records, snapshot_time = get_easily_snapshot(start_date, end_date, specialites=specialites, fields=fields)
+        if records is None:
+            return []
+        with _lock:
+            _store_snapshot(start_date, end_date, specialites, fields, records, snapshot_time, datetime.now())
+        return records
+
+    # Delta sur toute la période depuis l'extraction précédente
+    delta_records, snapshot_time = get_easily_snapshot(
+        start_date, end_date, since=snapshot["snapshot_time"], specialites=specialites, fields=fields
+    )
+    if delta_records is None:
+        return []
+
+    # Extraction complète des jours non couverts par le cache (bornes incluses, dédoublonnées à la fusion)
+    new_records = list(delta_records)
+    uncovered = []
+    if start_date < snapshot["start_date"]:
+        uncovered.append((start_date, snapshot["start_date"]))
+    if end_date > snapshot["end_date"]:
+        uncovered.append((snapshot["end_date"], end_date))
+    for range_start, range_end in uncovered:
+        range_records, _ = get_easily_snapshot(range_start, range_end, specialites=specialites, fields=fields)
+        if range_records is None:
+            return []
+        new_records.extend(range_records)
+
+    records = _trim_to_period(apply_easily_delta(snapshot["records"], new_records), start_date, end_date)
+
+    with _lock:
+        _store_snapshot(
+            start_date, end_date, specialites, fields, records, snapshot_time, snapshot["fetched_at"], replaces=key
+        )
+
+    return records
@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Appels aux APIs d'une exécution de process_data : les appels indépendants partent en parallèle, un appel
+# identique (même fonction, mêmes arguments) n'est émis qu'une fois, et la durée de chaque source est mesurée.
+
+MAX_CONCURRENT_CALLS = 4
+
+
+def _freeze(value):
+    """Clé hashable pour les arguments d'un appel (listes de numéros de séjour, dates...)"""
+    if isinstance(value, list | tuple):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class FetchRun:
+    """Orchestrateur des appels d'une exécution (à utiliser dans un bloc `with`)"""
+
+    def __init__(self, max_workers=MAX_CONCURRENT_CALLS):
+        # Les fonctions d'appel utilisent st.session_state (jeton) et st.error : les threads reçoivent le
+        # contexte du script Streamlit courant
+        ctx = get_script_run_ctx()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+        )
+        self._calls = {}
+        self.timings = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown(wait=True)
+        return False
+
+    def _timed(self, source, func, args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            # Appels successifs d'une même source (diffusions Lifen par tranches) : durées cumulées
+            self.timings[source] = self.timings.get(source, 0.0) + time.perf_counter() - start
+
+    def submit(self, source, func, *args):
+        """Lance `func(*args)` en arrière-plan (ou réutilise l'appel identique déjà lancé) et retourne le Future"""
+        key = (func, _freeze(args))
+        if key not in self._calls:
+            self._calls[key] = self._executor.submit(self._timed, source, func, args)
+        return self._calls[key]
+
+    def report(self):
+        """Affiche la durée des appels par source"""
+        if self.timings:
+            st.caption(" · ".join(f"⏱️ {source} : {seconds:.1f} s" for source, seconds in self.timings.items()))
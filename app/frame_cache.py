@@ -0,0 +1,100 @@
+import functools
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+from app_conf import FRAME_CACHE_MAX_ENTRIES
+
+# Tables dérivées et figures Plotly mises en cache entre les reruns Streamlit (slider, changement d'onglet...).
+# La clé est une empreinte du contenu des DataFrames d'entrée et des autres paramètres : deux sessions qui
+# affichent les mêmes données partagent les résultats. Les DataFrames passés aux fonctions mises en cache
+# ne doivent pas être modifiés sur place (les résultats renvoyés sont des copies).
+
+_results = OrderedDict()
+_lock = threading.Lock()
+
+# Empreintes déjà calculées, par objet DataFrame vivant (oubliées quand l'objet est libéré)
+_fingerprints = {}
+
+
+def _content_hash(data):
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr([(str(column), str(dtype)) for column, dtype in data.dtypes.items()]).encode())
+    else:
+        digest.update(repr((data.name, str(data.dtype))).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def fingerprint(data):
+    """Empreinte du contenu d'un DataFrame ou d'une Series (colonnes, types, index et valeurs).
+
+    Le hachage parcourt toutes les valeurs : il n'est fait qu'une fois par objet, tant que ses colonnes
+    et son nombre de lignes ne changent pas.
+    """
+    shape = (data.shape, tuple(data.columns) if isinstance(data, pd.DataFrame) else data.name)
+    with _lock:
+        known = _fingerprints.get(id(data))
+    if known is not None and known[0]() is data and known[1] == shape:
+        return known[2]
+
+    value = _content_hash(data)
+    object_id = id(data)
+    with _lock:
+        _fingerprints[object_id] = (weakref.ref(data, lambda _: _fingerprints.pop(object_id, None)), shape, value)
+    return value
+
+
+def _key(value):
+    if isinstance(value, pd.DataFrame | pd.Series):
+        return ("frame", fingerprint(value))
+    if isinstance(value, list | tuple):
+        return tuple(_key(item) for item in value)
+    if isinstance(value, set | frozenset):
+        return ("set", tuple(sorted(repr(item) for item in value)))
+    if isinstance(value, dict):
+        return ("dict", tuple(sorted((repr(k), _key(v)) for k, v in value.items())))
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _copy(result):
+    if isinstance(result, pd.DataFrame | pd.Series):
+        return result.copy()
+    if isinstance(result, tuple):
+        return tuple(_copy(item) for item in result)
+    if isinstance(result, dict):
+        return {key: _copy(value) for key, value in result.items()}
+    return result
+
+
+def memoize(func):
+    """Met en cache le résultat de `func` selon le contenu de ses arguments (LRU de FRAME_CACHE_MAX_ENTRIES).
+
+    Les exceptions ne sont pas mises en cache.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, _key(args), _key(kwargs))
+        with _lock:
+            if key in _results:
+                _results.move_to_end(key)
+                return _copy(_results[key])
+
+        result = func(*args, **kwargs)
+
+        with _lock:
+            _results[key] = result
+            _results.move_to_end(key)
+            while len(_results) > FRAME_CACHE_MAX_ENTRIES:
+                _results.popitem(last=False)
+        return _copy(result)
+
+    return wrapper
@@ -0,0 +1,164 @@
+from datetime import date
+
+import pandas as pd
+from analytics import reconcile_facts
+from app_conf import IQSS_STORE_DIR
+from reconciliation import FACT_COLUMNS, ReconciliationError
+from summaries import SUMMARY_COLUMNS, build_summaries
+
+# Table de faits pré-calculée (un fichier parquet par mois de sortie) et cube mensuel par spécialité
+CUBE_FILE = "cube.parquet"
+# Histogrammes fusionnables des délais par mois × spécialité (statistiques multi-mois sans relire les faits)
+SUMMARIES_FILE = "resumes.parquet"
+
+CUBE_COLUMNS = [
+    "mois",
+    "specialite",
+    "nb_ll",
+    "nb_ll_j0",
+    "pct_ll_j0",
+    "delai_diffusion_sortie_moyen",
+    "delai_diffusion_sortie_median",
+    "delai_envoi_validation_moyen",
+    "delai_envoi_validation_median",
+    "nb_source_lifen",
+    "nb_source_easily",
+]
+
+
+def _facts_path(mois):
+    return IQSS_STORE_DIR / f"faits_{mois}.parquet"
+
+
+def month_key(value):
+    """Mois de sortie au format AAAA-MM"""
+    return f"{value:%Y-%m}"
+
+
+def current_month():
+    return month_key(date.today())
+
+
+def stored_months():
+    """Mois pour lesquels la table de faits a été pré-calculée"""
+    if not IQSS_STORE_DIR.is_dir():
+        return set()
+    return {path.stem[len("faits_") :] for path in IQSS_STORE_DIR.glob("faits_*.parquet")}
+
+
+def store_version():
+    """Horodatage des fichiers du stockage : change dès que le traitement nocturne réécrit un fichier"""
+    if not IQSS_STORE_DIR.is_dir():
+        return ()
+    return tuple(sorted((path.name, path.stat().st_mtime_ns) for path in IQSS_STORE_DIR.iterdir()))
+
+
+def save_facts(mois, df_facts):
+    """Écrit la table de faits d'un mois (remplacement atomique du fichier)"""
+    IQSS_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _facts_path(mois)
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    df_facts[FACT_COLUMNS].to_parquet(tmp_path, index=False)
+    tmp_path.replace(path)
+
+
+def load_facts(months):
+    """Relit et concatène les tables de faits des mois demandés"""
+    frames = [pd.read_parquet(_facts_path(mois)) for mois in sorted(months)]
+    if not frames:
+        return pd.DataFrame(columns=FACT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_cube(df_facts):
+    """Agrège la table de faits par mois de sortie × spécialité"""
+    if df_facts.empty:
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+
+    df = df_facts.assign(
+        mois=pd.to_datetime(df_facts["date_sortie_easily"], format="%d/%m/%Y").dt.strftime("%Y-%m"),
+        sejour_j0=df_facts["num_sej"].where(df_facts["diff_validation_easily_sortie_easily"] == 0),
+        source_lifen=df_facts["source_optimale"] == "Lifen",
+        source_easily=df_facts["source_optimale"] == "Easily",
+    )
+    cube = (
+        df.groupby(["mois", "specialite_easily"], sort=True, observed=True)
+        .agg(
+            nb_ll=("num_sej", "size"),
+            nb_ll_j0=("sejour_j0", "count"),
+            delai_diffusion_sortie_moyen=("diff_date_diffusion_sortie", "mean"),
+            delai_diffusion_sortie_median=("diff_date_diffusion_sortie", "median"),
+            delai_envoi_validation_moyen=("delai_envoi_validation", "mean"),
+            delai_envoi_validation_median=("delai_envoi_validation", "median"),
+            nb_source_lifen=("source_lifen", "sum"),
+            nb_source_easily=("source_easily", "sum"),
+        )
+        .reset_index()
+        .rename(columns={"specialite_easily": "specialite"})
+    )
+    cube["pct_ll_j0"] = (cube["nb_ll_j0"] / cube["nb_ll"] * 100).round(1)
+    return cube[CUBE_COLUMNS]
+
+
+def _write_store_file(df, name):
+    IQSS_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    path = IQSS_STORE_DIR / name
+    tmp_path = path.with_name(f"{name}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    tmp_path.replace(path)
+
+
+def _read_store_file(name, columns):
+    path = IQSS_STORE_DIR / name
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+    return pd.read_parquet(path)
+
+
+def rebuild_cube():
+    """Recalcule le cube et les résumés mensuels à partir de l'ensemble des tables de faits stockées"""
+    df_facts = load_facts(stored_months())
+    cube = build_cube(df_facts)
+    _write_store_file(cube, CUBE_FILE)
+    _write_store_file(build_summaries(df_facts), SUMMARIES_FILE)
+    return cube
+
+
+def load_cube():
+    return _read_store_file(CUBE_FILE, CUBE_COLUMNS)
+
+
+def load_summaries():
+    """Histogrammes des délais par mois × spécialité (voir summaries.py)"""
+    return _read_store_file(SUMMARIES_FILE, SUMMARY_COLUMNS)
+
+
+def reconcile_with_store(df_lifen, df_easily):
+    """Rapprochement Easily/Lifen : faits pré-calculés pour les mois clos, calcul à la volée pour le reste.
+
+    Un séjour appartient à un seul mois de sortie : on peut donc découper le rapprochement par mois
+    sans changer le résultat. Les faits stockés sont restreints aux séjours présents dans `df_easily`.
+    L'onglet lit ici les faits mensuels et non le cube : histogrammes, écarts et jours de la semaine ont
+    besoin d'une ligne par séjour, que l'agrégat mois × spécialité ne conserve pas (le cube alimente
+    l'historique mensuel).
+    """
+    sortie_months = pd.to_datetime(df_easily["sej_date_sortie"], errors="coerce").dt.strftime("%Y-%m")
+    historical = (stored_months() - {current_month()}) & set(sortie_months.dropna())
+    if not historical:
+        return reconcile_facts(df_lifen, df_easily)
+
+    venues = pd.to_numeric(df_easily["Num_Venue"], errors="coerce").dropna().astype("int64")
+    df_stored = load_facts(historical)
+    df_stored = df_stored[df_stored["num_sej"].astype("int64").isin(set(venues))]
+
+    df_live_easily = df_easily[~sortie_months.isin(historical)]
+    if df_live_easily.empty:
+        return df_stored.reset_index(drop=True)
+
+    try:
+        df_live = reconcile_facts(df_lifen, df_live_easily)
+    except ReconciliationError:
+        if df_stored.empty:
+            raise
+        return df_stored.reset_index(drop=True)
+    return pd.concat([df_stored, df_live], ignore_index=True)
@@ -0,0 +1,42 @@
+import pandas as pd
+import streamlit as st
+
+# Indicateurs des sous-onglets "Statistiques" Easily et Lifen, agrégés par les APIs (/kpis) : spécialité × mois ×
+# canal côté Easily, service × mois × canal côté Lifen. Chaque réponse contient les groupes (effectifs additifs) et
+# les totaux (effectifs distincts et médianes, qui ne s'additionnent pas entre groupes) ; l'affichage ne lit que ça.
+
+
+def save_kpis(kpis):
+    """Conserve les réponses /kpis de la requête ({source: réponse, None si l'API n'a pas répondu}) pour la session"""
+    st.session_state.kpis = kpis
+
+
+def load_kpis(source):
+    """(groupes, totaux) de la dernière requête pour la source ("Easily" ou "Lifen"), ou None sans réponse"""
+    payload = st.session_state.get("kpis", {}).get(source)
+    if not payload:
+        return None
+    return pd.DataFrame(payload["groups"]), payload["totals"]
+
+
+def distribution(groups, column, count_column, labels):
+    """Répartition par une dimension, reconstituée à partir des agrégats (équivalent d'un value_counts)"""
+    counts = (
+        groups.groupby(column, dropna=True, sort=False, observed=True)[count_column]
+        .sum()
+        .sort_values(ascending=False, kind="stable")
+        .reset_index()
+    )
+    counts.columns = labels
+    return counts
+
+
+def month_distribution(groups, count_column, labels):
+    """Effectifs par mois dans l'ordre chronologique (année puis numéro du mois, pas le nom du mois)"""
+    keys = [column for column in ("annee", "mois_num", "mois") if column in groups.columns]
+    counts = groups.groupby(keys, dropna=True, sort=True, observed=True)[count_column].sum().reset_index()
+    if "annee" in counts.columns:
+        counts["mois"] = counts["mois"].astype(str) + " " + counts["annee"].astype("Int64").astype(str)
+    counts = counts[["mois", count_column]]
+    counts.columns = labels
+    return counts
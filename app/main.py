@@ -1,9 +1,10 @@
-import pandas as pd
 import streamlit as st
 
 # Import du module d'authentification
 from auth import check_permission, render_login_page, render_user_info, is_logged_in
 from data_processor import process_data
+from result_store import load_results
+from schemas import EASILY_BASE_FIELDS, LIFEN_BASE_FIELDS
 
 # Import modular components
 from sidebar import render_sidebar
@@ -90,12 +91,6 @@ def main():
         unsafe_allow_html=True,
     )
 
-    # Initialize session state
-    if "easily_data" not in st.session_state:
-        st.session_state.easily_data = None
-    if "lifen_data" not in st.session_state:
-        st.session_state.lifen_data = None
-
     # Vérifier les permissions avant d'afficher la sidebar
     if not check_permission("easily"):
         st.markdown(
@@ -130,39 +125,134 @@ def main():
 
     # Process data if requested or display cached data
     if run_query:
-        # Vérifier les permissions avant de traiter les données
-        if not check_permission("easily"):
-            st.error("❌ Vous n'avez pas l'autorisation d'accéder aux données Easily")
-            return
-
-        # Call process_data with all parameters from sidebar
-        df_easily, df_lifen = process_data(
-            query_type=query_type,
-            start_date=start_date,
-            end_date=end_date,
-            imported_venues=imported_venues,
-            filter_specialite=filter_specialite,
-            filter_result=filter_result,
-            filter_channel=filter_channel,
+        run_and_render(
+            query_type,
+            start_date,
+            end_date,
+            imported_venues,
+            filter_specialite,
+            filter_result,
+            filter_channel,
         )
 
+    else:
+        # Résultats de la dernière requête (DataFrames typés conservés pour la session)
+        df_easily, df_lifen = load_results()
         if df_easily is not None:
             display_tabs_content_with_permissions(df_easily, df_lifen)
+        else:
+            # Initial state - no data yet
+            render_initial_tabs_with_permissions()
 
-    elif st.session_state.easily_data:
-        # Use cached data
-        df_easily = pd.DataFrame(st.session_state.easily_data)
-        df_lifen = pd.DataFrame(st.session_state.lifen_data) if st.session_state.lifen_data else None
-        display_tabs_content_with_permissions(df_easily, df_lifen)
-    else:
-        # Initial state - no data yet
-        render_initial_tabs_with_permissions()
+
+def run_and_render(query_type, start_date, end_date, imported_venues, filter_specialite, filter_result, filter_channel):
+    """Lance la requête de la barre latérale et affiche l'onglet sélectionné"""
+    # Vérifier les permissions avant de traiter les données
+    if not check_permission("easily"):
+        st.error("❌ Vous n'avez pas l'autorisation d'accéder aux données Easily")
+        return
+
+    # L'onglet affiché est choisi avant la requête : en mode date, l'onglet Easily s'affiche dès la réception
+    # des données Easily, l'onglet Lifen (tableau des diffusions reçues) après chaque appel Lifen, et l'onglet
+    # Comparaison après le dernier appel (le slider du rapprochement ne peut être créé qu'une fois par exécution)
+    onglet = select_tab()
+    if onglet is None:
+        return
+    rendered = []
+    lifen_preview = st.empty()
+    # Seules les colonnes utilisées par les onglets autorisés sont demandées aux APIs : tous les onglets
+    # restent affichables sans relancer la requête
+    easily_fields, lifen_fields = query_fields(permitted_tabs())
+    lifen_roles = lifen_roles_filter(permitted_tabs())
+
+    def render_easily_first(df_easily):
+        if onglet == "Source Easily":
+            render_tab(onglet, df_easily, None)
+            rendered.append(onglet)
+
+    def render_lifen_partial(df_lifen, done, total):
+        if onglet == "Source Lifen" and df_lifen is not None:
+            from tabs.lifen import display_lifen_preview
+
+            with lifen_preview.container():
+                display_lifen_preview(df_lifen, done, total)
+
+    # Call process_data with all parameters from sidebar
+    df_easily, df_lifen = process_data(
+        query_type=query_type,
+        start_date=start_date,
+        end_date=end_date,
+        imported_venues=imported_venues,
+        filter_specialite=filter_specialite,
+        filter_result=filter_result,
+        filter_channel=filter_channel,
+        on_easily_ready=render_easily_first,
+        on_lifen_partial=render_lifen_partial,
+        easily_fields=easily_fields,
+        lifen_fields=lifen_fields,
+        lifen_roles=lifen_roles,
+        # Indicateurs agrégés demandés pour les seuls onglets source affichés
+        kpi_sources=[tab.removeprefix("Source ") for tab in permitted_tabs() if tab.startswith("Source ")],
+    )
+
+    lifen_preview.empty()
+    if df_easily is not None:
+        if not rendered:
+            render_tab(onglet, df_easily, df_lifen)
+        render_missing_venues()
 
 
 def display_tabs_content_with_permissions(df_easily, df_lifen):
     """Display content in each tab based on available data and user permissions"""
+    onglet = select_tab()
+    if onglet is None:
+        return
+    render_tab(onglet, df_easily, df_lifen)
+    render_missing_venues()
+
+
+def tab_fields(onglet):
+    """Colonnes (Easily, Lifen) demandées aux APIs pour l'onglet ; None : toutes les colonnes"""
+    if onglet == "Source Easily":
+        # Tableau Easily complet ; Lifen ne sert qu'au repérage des numéros de séjour manquants
+        return None, LIFEN_BASE_FIELDS
+    if onglet == "Source Lifen":
+        return EASILY_BASE_FIELDS, None
+    if onglet == "Comparaison Easily/Lifen":
+        from reconciliation import REQUIRED_EASILY_COLS, REQUIRED_LIFEN_COLS
+
+        return (
+            list(dict.fromkeys([*EASILY_BASE_FIELDS, *REQUIRED_EASILY_COLS])),
+            list(dict.fromkeys([*LIFEN_BASE_FIELDS, *REQUIRED_LIFEN_COLS])),
+        )
+    return None, None
 
-    # Créer les onglets selon les permissions
+
+def query_fields(onglets):
+    """Union des colonnes (Easily, Lifen) des onglets ; None dès qu'un onglet utilise toutes les colonnes"""
+    union = []
+    for side in (0, 1):
+        needed = [tab_fields(onglet)[side] for onglet in onglets]
+        if not needed or any(fields is None for fields in needed):
+            union.append(None)
+        else:
+            union.append(list(dict.fromkeys(field for fields in needed for field in fields)))
+    return tuple(union)
+
+
+def lifen_roles_filter(onglets):
+    """Rôles de destinataire à demander à l'API Lifen ; None : tous les rôles.
+
+    La comparaison ne rapproche que les envois au patient : sans l'onglet Source Lifen (qui affiche tous les
+    destinataires), seules ces diffusions sont transférées.
+    """
+    if "Comparaison Easily/Lifen" in onglets and "Source Lifen" not in onglets:
+        return ["Patient"]
+    return None
+
+
+def permitted_tabs():
+    """Onglets autorisés pour l'utilisateur, dans l'ordre d'affichage"""
     tabs_config = []
 
     if check_permission("easily"):
@@ -174,41 +264,55 @@ def display_tabs_content_with_permissions(df_easily, df_lifen):
     if check_permission("analysis"):
         tabs_config.append("Comparaison Easily/Lifen")
 
+    return tabs_config
+
+
+def select_tab():
+    """Sélecteur des onglets autorisés ; retourne l'onglet sélectionné (None sans permission)"""
+    tabs_config = permitted_tabs()
+
     if not tabs_config:
         st.error("❌ Aucune permission d'accès aux données")
-        return
+        return None
 
-    tabs = st.tabs(tabs_config)
-    tab_index = 0
+    # Onglets paresseux : seul l'onglet sélectionné est calculé (st.tabs exécute le contenu de tous les onglets
+    # à chaque rerun). Les tables et figures déjà calculées restent en cache (frame_cache) au retour sur un onglet.
+    onglet = st.segmented_control(
+        "Onglet", tabs_config, default=tabs_config[0], key="onglet_actif", label_visibility="collapsed"
+    )
+    return onglet or tabs_config[0]
+
+
+def render_tab(onglet, df_easily, df_lifen):
+    """Affiche le contenu de l'onglet sélectionné"""
 
     # Onglet Easily
-    if check_permission("easily"):
-        with tabs[tab_index]:
-            from tabs.easily import display_easily_data
+    if onglet == "Source Easily":
+        from tabs.easily import display_easily_data
 
-            display_easily_data(df_easily)
-        tab_index += 1
+        display_easily_data(df_easily)
 
     # Onglet Lifen
-    if check_permission("lifen"):
-        with tabs[tab_index]:
-            if df_lifen is not None:
-                from tabs.lifen import display_lifen_data
+    elif onglet == "Source Lifen":
+        if df_lifen is not None:
+            from tabs.lifen import display_lifen_data
 
-                display_lifen_data(df_lifen, df_easily)
-            else:
-                st.warning("Aucune donnée Lifen disponible pour les numéros de séjour sélectionnés.")
-        tab_index += 1
+            display_lifen_data(df_lifen, df_easily)
+        else:
+            st.warning("Aucune donnée Lifen disponible pour les numéros de séjour sélectionnés.")
 
     # Onglet Analyse
-    if check_permission("analysis"):
-        with tabs[tab_index]:
-            if df_lifen is not None:
-                from tabs.analyse import display_analyse_documents
+    elif onglet == "Comparaison Easily/Lifen":
+        if df_lifen is not None:
+            from tabs.analyse import display_analyse_documents
 
-                display_analyse_documents(df_lifen, df_easily)
-            else:
-                st.warning("Aucune donnée Lifen disponible pour analyser les délais.")
+            display_analyse_documents(df_lifen, df_easily)
+        else:
+            st.warning("Aucune donnée Lifen disponible pour analyser les délais.")
+
+
+def render_missing_venues():
+    """Bouton de téléchargement des numéros de séjour absents des deux sources"""
 
     # Ajouter le bouton de téléchargement des numéros manquants si disponibles et autorisé
     if (
@@ -0,0 +1,368 @@
+import numpy as np
+import pandas as pd
+from app_conf import IQSS_MATCH_TOLERANCE_DAYS
+from business_days import business_days_between
+from schemas import EASILY_SCHEMA, LIFEN_SCHEMA, apply_schema
+
+# Colonnes Easily nécessaires au rapprochement
+REQUIRED_EASILY_COLS = [
+    "pat_IPP",
+    "Num_Venue",
+    "ven_theo",
+    "sej_date_entree",
+    "sej_date_sortie",
+    "CR_Doss_spe",
+    "date_min_val",
+    "LL_J0",
+    "Date diffusion",
+    "fiche_id",
+]
+
+# Colonnes Lifen nécessaires au rapprochement
+REQUIRED_LIFEN_COLS = ["ipp", "num_sej", "date_sortie", "date_envoi", "role_destinataire", "type_sej"]
+
+# Colonnes de la table de faits (une ligne par séjour rapproché)
+FACT_COLUMNS = [
+    "ipp",
+    "num_sej",
+    "source_optimale",
+    "date_sortie_easily",
+    "date_envoi_lifen",
+    "date_diffusion_easily",
+    "date_min_val_easily",
+    "specialite_easily",
+    "diff_date_diffusion_sortie",
+    "diff_validation_easily_sortie_easily",
+    "delai_envoi_validation",
+    "diff_date_diffusion_sortie_ouvres",
+    "delai_envoi_validation_ouvres",
+]
+
+
+# Écart maximal entre une diffusion et la sortie pour qu'elle soit rapprochée du séjour (None : pas de limite)
+MATCH_TOLERANCE = pd.Timedelta(days=IQSS_MATCH_TOLERANCE_DAYS) if IQSS_MATCH_TOLERANCE_DAYS else None
+
+
+class ReconciliationError(Exception):
+    """Rapprochement Easily/Lifen impossible (données absentes ou incompatibles)"""
+
+    def __init__(self, message, hint=None):
+        super().__init__(message)
+        self.hint = hint
+
+
+def check_easily(df_easily):
+    if df_easily is None or df_easily.empty:
+        raise ReconciliationError("Aucune donnée Easily disponible pour l'analyse")
+
+    missing_cols = [col for col in REQUIRED_EASILY_COLS if col not in df_easily.columns]
+    if missing_cols:
+        raise ReconciliationError(
+            f"Colonnes manquantes dans les données Easily: {missing_cols}",
+            hint=f"Colonnes disponibles: {list(df_easily.columns)}",
+        )
+
+
+def check_lifen(df_lifen):
+    if df_lifen is None or df_lifen.empty:
+        raise ReconciliationError(
+            "Aucune donnée Lifen disponible pour l'analyse",
+            hint="Vérifiez que l'API Lifen fonctionne et que les données sont correctement récupérées",
+        )
+
+    missing_lifen_cols = [col for col in REQUIRED_LIFEN_COLS if col not in df_lifen.columns]
+    if missing_lifen_cols:
+        raise ReconciliationError(
+            f"Colonnes manquantes dans les données Lifen: {missing_lifen_cols}",
+            hint=f"Colonnes disponibles: {list(df_lifen.columns)}",
+        )
+
+
+def prepare_easily(df_easily):
+    """Garde, pour chaque fiche, la ligne dont la date de diffusion Easily est la plus proche de la sortie"""
+    check_easily(df_easily)
+
+    # Types appliqués à la réception des données : sans effet ici, sauf pour des lignes JSON brutes
+    df_easily = apply_schema(df_easily[REQUIRED_EASILY_COLS].copy(), EASILY_SCHEMA)
+
+    df_easily.rename(
+        columns={
+            "pat_IPP": "ipp",
+            "Num_Venue": "num_sej",
+            "ven_theo": "ven_theo_easily",
+            "sej_date_entree": "date_entree_easily",
+            "sej_date_sortie": "date_sortie_easily",
+            "CR_Doss_spe": "specialite_easily",
+            "date_min_val": "date_min_val_easily",
+            "LL_J0": "ll_j0_easily",
+            "Date diffusion": "date_diffusion_easily",
+        },
+        inplace=True,
+    )
+
+    df_easily.drop_duplicates(inplace=True)
+
+    if df_easily.empty:
+        raise ReconciliationError("Aucune donnée Easily après nettoyage")
+
+    df_easily["date_sortie_dt"] = df_easily["date_sortie_easily"]
+    df_easily["date_diffusion_dt"] = df_easily["date_diffusion_easily"]
+
+    # Écart absolu diffusion-sortie, valeur très grande quand l'une des dates manque
+    df_easily["time_diff"] = (
+        (df_easily["date_diffusion_dt"] - df_easily["date_sortie_dt"]).abs().fillna(pd.Timedelta(days=9999))
+    )
+
+    # Première ligne de plus petit écart pour chaque fiche (tri stable)
+    df_easily_keep_only_good_dates = (
+        df_easily.dropna(subset=["fiche_id"])
+        .sort_values("time_diff", kind="stable")
+        .drop_duplicates(subset="fiche_id")
+        .sort_index()
+    )
+
+    if df_easily_keep_only_good_dates.empty:
+        raise ReconciliationError("Aucune donnée après filtrage par fiche_id")
+
+    return df_easily_keep_only_good_dates
+
+
+def prepare_lifen(df_lifen):
+    """Ne garde que les envois aux patients, avec les colonnes utiles au rapprochement"""
+    check_lifen(df_lifen)
+
+    df_lifen = apply_schema(df_lifen, LIFEN_SCHEMA)
+    df_lifen = df_lifen.rename(
+        columns={
+            "date_sortie": "date_sortie_lifen",
+            "date_envoi": "date_envoi_lifen",
+            "type_sej": "specialite_lifen",
+        },
+    )
+
+    df_lifen = df_lifen[
+        ["ipp", "num_sej", "date_sortie_lifen", "specialite_lifen", "date_envoi_lifen", "role_destinataire"]
+    ]
+
+    # Filtrer les patients uniquement
+    df_lifen = df_lifen[df_lifen["role_destinataire"] == "Patient"]
+
+    if df_lifen.empty:
+        raise ReconciliationError("Aucune donnée Lifen pour les patients après filtrage")
+
+    return df_lifen
+
+
+def nearest_diffusions(df_lifen, fiches, tolerance=None):
+    """Pour chaque séjour, l'envoi Lifen et la diffusion Easily les plus proches de la date de sortie.
+
+    Jointures as-of triées par date (O(n log n)), sans produit cartésien envois Lifen × fiches Easily.
+    Au-delà de `tolerance` (pd.Timedelta) une diffusion n'est pas retenue.
+    """
+    keys = ["ipp", "num_sej"]
+    sejours = fiches.drop_duplicates(subset=keys)[[*keys, "date_sortie_dt"]]
+
+    # Envoi Lifen le plus proche de la sortie (les dates manquantes ne peuvent pas être rapprochées)
+    envois = df_lifen.dropna(subset=["date_envoi_lifen"]).sort_values("date_envoi_lifen", kind="stable")
+    with_sortie = sejours.dropna(subset=["date_sortie_dt"]).sort_values("date_sortie_dt", kind="stable")
+    best_lifen = pd.merge_asof(
+        with_sortie,
+        envois[[*keys, "date_envoi_lifen", "date_sortie_lifen", "specialite_lifen"]],
+        left_on="date_sortie_dt",
+        right_on="date_envoi_lifen",
+        by=keys,
+        direction="nearest",
+        tolerance=tolerance,
+    ).drop(columns="date_sortie_dt")
+
+    # Diffusion Easily la plus proche de la sortie parmi les fiches du séjour
+    diffusions = fiches.assign(ecart=(fiches["date_diffusion_dt"] - fiches["date_sortie_dt"]).abs())
+    diffusions = diffusions.dropna(subset=["ecart"])
+    if tolerance is not None:
+        diffusions = diffusions[diffusions["ecart"] <= tolerance]
+    best_easily = diffusions.sort_values("ecart", kind="stable").drop_duplicates(subset=keys)[
+        [*keys, "date_diffusion_dt"]
+    ]
+
+    return (
+        sejours.merge(best_lifen, on=keys, how="left")
+        .merge(best_easily, on=keys, how="left")
+        .sort_values("num_sej", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def reconcile(df_lifen, df_easily, tolerance=MATCH_TOLERANCE):
+    """Rapproche Easily et Lifen : une ligne par séjour avec la diffusion la plus proche de la sortie.
+
+    Retourne la table de faits (colonnes FACT_COLUMNS, dates au format JJ/MM/AAAA) avec les délais
+    diffusion-sortie, validation-sortie et envoi-validation. Lève ReconciliationError si le
+    rapprochement est impossible.
+    """
+    df_easily_keep_only_good_dates = prepare_easily(df_easily)
+    df_lifen = prepare_lifen(df_lifen)
+
+    # Conversion en entiers des clés de jointure
+    try:
+        df_lifen["ipp"] = pd.to_numeric(df_lifen["ipp"], errors="coerce").astype("Int64")
+        df_lifen["num_sej"] = pd.to_numeric(df_lifen["num_sej"], errors="coerce").astype("Int64")
+
+        df_easily_keep_only_good_dates["ipp"] = pd.to_numeric(
+            df_easily_keep_only_good_dates["ipp"], errors="coerce"
+        ).astype("Int64")
+        df_easily_keep_only_good_dates["num_sej"] = pd.to_numeric(
+            df_easily_keep_only_good_dates["num_sej"], errors="coerce"
+        ).astype("Int64")
+
+        # Supprimer les lignes avec des NaN dans les clés de jointure
+        df_lifen = df_lifen.dropna(subset=["ipp", "num_sej"])
+        df_easily_keep_only_good_dates = df_easily_keep_only_good_dates.dropna(subset=["ipp", "num_sej"])
+    except Exception as e:
+        raise ReconciliationError(f"Erreur lors de la conversion des types: {e}") from e
+
+    # Seuls les séjours présents dans Lifen sont rapprochés
+    fiches = df_easily_keep_only_good_dates.merge(
+        df_lifen[["ipp", "num_sej"]].drop_duplicates(), on=["ipp", "num_sej"], how="inner"
+    )
+
+    if fiches.empty:
+        raise ReconciliationError(
+            "Aucune correspondance trouvée entre les données Easily et Lifen",
+            hint="Vérifiez que les numéros de séjour correspondent entre les deux sources",
+        )
+
+    df_min = nearest_diffusions(df_lifen, fiches, tolerance)
+
+    # Écarts absolus à la sortie (en jours) de chaque source, infini quand une date manque
+    diff_date_lifen = (df_min["date_envoi_lifen"] - df_min["date_sortie_dt"]).abs().dt.days.fillna(np.inf)
+    diff_date_easily = (df_min["date_diffusion_dt"] - df_min["date_sortie_dt"]).abs().dt.days.fillna(np.inf)
+
+    # Source la plus proche de la sortie quand les deux dates sont disponibles. Quand une seule est
+    # disponible la ligne reste à "Aucune" : c'est le comportement historique de l'indicateur.
+    mask_both_valid = (diff_date_lifen != np.inf) & (diff_date_easily != np.inf)
+    df_min["source_optimale"] = np.where(
+        mask_both_valid, np.where(diff_date_lifen <= diff_date_easily, "Lifen", "Easily"), "Aucune"
+    )
+
+    df_min["date_diffusion_optimale"] = df_min["date_envoi_lifen"].where(
+        df_min["source_optimale"] == "Lifen",
+        df_min["date_diffusion_dt"].where(df_min["source_optimale"] == "Easily"),
+    )
+
+    # Écart en jours entiers (jours révolus de la différence, puis valeur absolue)
+    df_min["diff_optimale_jours"] = (
+        (df_min["date_diffusion_optimale"] - df_min["date_sortie_dt"]).dt.days.abs().astype("float64")
+    )
+
+    columns_to_keep = [
+        "ipp",
+        "num_sej",
+        "date_sortie_lifen",
+        "specialite_lifen",
+        "date_envoi_lifen",
+        "source_optimale",
+        "date_diffusion_optimale",
+        "diff_optimale_jours",
+    ]
+    df_min = df_min[columns_to_keep]
+
+    # Jointure des données easily - lifen et source optimale
+    df_merge = df_min.merge(
+        fiches[
+            [
+                "ipp",
+                "num_sej",
+                "date_entree_easily",
+                "date_sortie_easily",
+                "specialite_easily",
+                "date_min_val_easily",
+                "date_diffusion_easily",
+            ]
+        ],
+        on=["ipp", "num_sej"],
+    )
+
+    diffusion_optimale_jour = df_merge["date_diffusion_optimale"].dt.floor("D")
+
+    # Calcul de la différence entre date de diffusion optimale et date de sortie du patient (en jours)
+    df_merge["diff_date_diffusion_sortie"] = (
+        diffusion_optimale_jour - df_merge["date_sortie_easily"].dt.floor("D")
+    ).dt.days
+
+    # Calcul de la différence entre date de validation du document et date de sortie du patient (en jours)
+    df_merge["diff_validation_easily_sortie_easily"] = (
+        df_merge["date_min_val_easily"].dt.floor("D") - df_merge["date_sortie_easily"].dt.floor("D")
+    ).dt.days
+
+    # Délai d'envoi par rapport à la date de validation du médecin
+    df_merge["delai_envoi_validation"] = (
+        diffusion_optimale_jour - df_merge["date_min_val_easily"].dt.floor("D")
+    ).dt.days
+
+    return finalize_facts(df_merge)
+
+
+def finalize_facts(df_merge):
+    """Délais en jours ouvrés, exclusion des LL validées > 3 jours avant la sortie et format des dates"""
+    # Mêmes délais en jours ouvrés (week-ends et jours fériés non comptés)
+    df_merge["diff_date_diffusion_sortie_ouvres"] = business_days_between(
+        df_merge["date_sortie_easily"], df_merge["date_diffusion_optimale"]
+    )
+    df_merge["delai_envoi_validation_ouvres"] = business_days_between(
+        df_merge["date_min_val_easily"], df_merge["date_diffusion_optimale"]
+    )
+
+    # Filtrage pour exclure les lettres validées plus de 3 jours avant la sortie
+    df_merge = df_merge[df_merge["diff_validation_easily_sortie_easily"] >= -3]
+    df_merge = df_merge[FACT_COLUMNS]
+
+    # Mêmes types quel que soit le moteur et la présence de valeurs manquantes : délais en jours décimaux
+    # (vides sans source optimale), délai validation-sortie entier (toujours renseigné après le filtre)
+    df_merge = df_merge.astype(
+        {
+            "specialite_easily": "category",
+            "diff_date_diffusion_sortie": "float64",
+            "diff_validation_easily_sortie_easily": "int64",
+            "delai_envoi_validation": "float64",
+        }
+    )
+
+    datetime_columns = ["date_sortie_easily", "date_envoi_lifen", "date_diffusion_easily", "date_min_val_easily"]
+    for column in datetime_columns:
+        df_merge[column] = df_merge[column].dt.strftime("%d/%m/%Y")
+
+    if df_merge.empty:
+        raise ReconciliationError("Aucune donnée finale après tous les traitements")
+
+    return df_merge
+
+
+def service_stats(df_merge):
+    """Statistiques par service (% de LL validées le jour de la sortie et délais), triées par % décroissant"""
+    validee_j0 = df_merge["diff_validation_easily_sortie_easily"] == 0
+    df = df_merge.assign(validee_j0=validee_j0, delai_j0=df_merge["diff_date_diffusion_sortie"].where(validee_j0))
+    stats = df.groupby("specialite_easily", sort=False, observed=True).agg(
+        total_ll=("specialite_easily", "size"),
+        ll_j0=("validee_j0", "sum"),
+        delai_moyen=("diff_date_diffusion_sortie", "mean"),
+        delai_median=("diff_date_diffusion_sortie", "median"),
+        delai_moyen_j0=("delai_j0", "mean"),
+        delai_median_j0=("delai_j0", "median"),
+    )
+    if stats.empty:
+        return pd.DataFrame()
+
+    df_stats_services = pd.DataFrame(
+        {
+            "Service": stats.index,
+            "Total LL": stats["total_ll"].to_numpy(),
+            "LL validées J0": stats["ll_j0"].to_numpy(),
+            "% LL validées J0": (stats["ll_j0"] / stats["total_ll"] * 100).to_numpy(),
+            "Délai moyen global (j)": stats["delai_moyen"].to_numpy(),
+            "Délai médian global (j)": stats["delai_median"].to_numpy(),
+            "Délai moyen LL J0 (j)": stats["delai_moyen_j0"].to_numpy(),
+            "Délai médian LL J0 (j)": stats["delai_median_j0"].to_numpy(),
+        }
+    )
+    # Tri stable : à pourcentage égal, les services restent dans leur ordre d'apparition
+    return df_stats_services.sort_values("% LL validées J0", ascending=False, kind="stable").reset_index(drop=True)
@@ -0,0 +1,102 @@
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+from app_conf import RESULT_SPILL_MB, RESULT_STORE_DIR, RESULT_STORE_MAX_ENTRIES
+from schemas import STRING_DTYPE
+
+# Résultats de la dernière requête de chaque session, conservés sous forme de DataFrames typés (chaînes Arrow,
+# catégories, entiers 32 bits) et réutilisés tels quels à chaque rerun. Au-delà de RESULT_SPILL_MB, ils sont
+# écrits en Parquet dans RESULT_STORE_DIR (LRU commun à toutes les sessions) et seule leur clé reste en session.
+# Les DataFrames renvoyés peuvent être partagés : ils ne doivent pas être modifiés sur place.
+
+# Derniers résultats relus depuis le disque, partagés entre les sessions (évite une relecture à chaque rerun)
+LOADED_MAX_ENTRIES = 4
+_loaded = OrderedDict()
+_lock = threading.Lock()
+
+
+def _memory_mb(*frames):
+    return sum(df.memory_usage(index=True, deep=True).sum() for df in frames if df is not None) / 2**20
+
+
+def _entry_dir(key):
+    return RESULT_STORE_DIR / key
+
+
+def _evict():
+    """Supprime les résultats les moins récemment utilisés au-delà de RESULT_STORE_MAX_ENTRIES"""
+    entries = [path for path in RESULT_STORE_DIR.iterdir() if path.is_dir() and path.suffix != ".tmp"]
+    entries.sort(key=lambda path: path.stat().st_mtime)
+    for path in entries[: max(0, len(entries) - RESULT_STORE_MAX_ENTRIES)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _read_frame(path):
+    """Relit un DataFrame Parquet ; les chaînes reviennent en stockage Python, on les remet en Arrow"""
+    df = pd.read_parquet(path)
+    return df.astype(dict.fromkeys(df.select_dtypes("string").columns, STRING_DTYPE))
+
+
+def _spill(df_easily, df_lifen):
+    """Écrit les résultats en Parquet (types conservés) et retourne leur clé"""
+    key = uuid.uuid4().hex
+    path = _entry_dir(key)
+    tmp_path = path.with_name(f"{key}.tmp")
+    tmp_path.mkdir(parents=True)
+    df_easily.to_parquet(tmp_path / "easily.parquet")
+    if df_lifen is not None:
+        df_lifen.to_parquet(tmp_path / "lifen.parquet")
+    tmp_path.replace(path)
+    _evict()
+    return key
+
+
+def _read(key):
+    with _lock:
+        if key in _loaded:
+            _loaded.move_to_end(key)
+            return _loaded[key]
+
+    path = _entry_dir(key)
+    lifen_path = path / "lifen.parquet"
+    try:
+        path.touch()  # Marque le résultat comme récemment utilisé
+        df_easily = _read_frame(path / "easily.parquet")
+        df_lifen = _read_frame(lifen_path) if lifen_path.exists() else None
+    except OSError:
+        # Résultat supprimé entre-temps (LRU d'une autre session) : il faudra relancer la requête
+        return None, None
+
+    with _lock:
+        _loaded[key] = (df_easily, df_lifen)
+        while len(_loaded) > LOADED_MAX_ENTRIES:
+            _loaded.popitem(last=False)
+    return df_easily, df_lifen
+
+
+def save_results(df_easily, df_lifen):
+    """Conserve les DataFrames de la requête pour les reruns de la session (sur disque s'ils sont volumineux)"""
+    st.session_state.result_key = None
+    st.session_state.df_easily = df_easily
+    st.session_state.df_lifen = df_lifen
+
+    if RESULT_SPILL_MB and _memory_mb(df_easily, df_lifen) > RESULT_SPILL_MB:
+        try:
+            st.session_state.result_key = _spill(df_easily, df_lifen)
+        except OSError:
+            # Stockage indisponible : les résultats restent en mémoire
+            return
+        st.session_state.df_easily = None
+        st.session_state.df_lifen = None
+
+
+def load_results():
+    """Résultats de la dernière requête de la session : (df_easily, df_lifen), ou (None, None)"""
+    key = st.session_state.get("result_key")
+    if key:
+        return _read(key)
+    return st.session_state.get("df_easily"), st.session_state.get("df_lifen")
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# Types des colonnes Easily et Lifen, appliqués une seule fois à la réception des réponses des APIs :
+# catégories pour les dimensions peu variées, entiers 32 bits pour les numéros de séjour, chaînes Arrow
+# pour le texte libre et dates converties une fois pour toutes avec leur format explicite.
+
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+EASILY_SCHEMA = {
+    "categories": ["CR_Doss_spe", "Statut Envoi", "Dos_Spe_ESL", "Type_courrier", "mois", "sej_uf_medicale_code"],
+    "venues": ["Num_Venue", "ven_theo"],
+    "dates": {
+        "sej_date_entree": "ISO8601",
+        "sej_date_der_entree": "ISO8601",
+        "sej_date_sortie": "ISO8601",
+        "pat_date_deces": "ISO8601",
+        "fic_date_creation": "ISO8601",
+        "fic_date_modification": "ISO8601",
+        "date_min_val": "ISO8601",
+        "Date diffusion": "%d/%m/%Y",  # convert(Varchar, ..., 103) côté SQL Server
+    },
+}
+
+LIFEN_SCHEMA = {
+    "categories": [
+        "canal_envoi",
+        "statut_envoi",
+        "role_destinataire",
+        "service",
+        "type_doc",
+        "statut_doc",
+        "type_sej",
+    ],
+    "venues": ["num_sej"],
+    "dates": {
+        "date_envoi": "ISO8601",
+        "date_creation_doc": "ISO8601",
+        "date_admission": "ISO8601",
+        "date_sortie": "ISO8601",
+    },
+}
+
+# Colonnes toujours demandées avec une projection (`fields=`) : numéros de séjour (rapprochement et numéros
+# manquants), colonnes des filtres de la barre latérale et clés du cache des extractions Easily
+EASILY_BASE_FIELDS = ["Num_Venue", "CR_Doss_spe", "fiche_id", "sej_date_sortie"]
+LIFEN_BASE_FIELDS = ["num_sej", "statut_envoi", "canal_envoi"]
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def _venue_column(series):
+    """Entier 32 bits nullable, ou 64 bits si un numéro dépasse la capacité"""
+    values = pd.to_numeric(series, errors="coerce")
+    if values.abs().max() > INT32_MAX:
+        return values.astype("Int64")
+    return values.astype("Int32")
+
+
+def apply_schema(df, schema):
+    """Convertit les colonnes présentes selon le schéma. Sans effet sur un DataFrame déjà typé."""
+    columns = {}
+    for column, date_format in schema["dates"].items():
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            columns[column] = pd.to_datetime(df[column], format=date_format, errors="coerce")
+    for column in schema["categories"]:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            columns[column] = df[column].astype("category")
+    for column in schema["venues"]:
+        if column in df.columns and str(df[column].dtype) not in ("Int32", "Int64"):
+            columns[column] = _venue_column(df[column])
+    for column in df.columns:
+        if column not in columns and df[column].dtype == "object":
+            columns[column] = df[column].astype(STRING_DTYPE)
+    return df.assign(**columns) if columns else df
+
+
+def easily_frame(records):
+    """DataFrame typé à partir des lignes JSON de l'API Easily"""
+    return apply_schema(pd.DataFrame(records), EASILY_SCHEMA)
+
+
+def lifen_frame(records):
+    """DataFrame typé à partir des lignes JSON de l'API Lifen"""
+    return apply_schema(pd.DataFrame(records), LIFEN_SCHEMA)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Résumés fusionnables par mois × service : pour chaque mesure, l'histogramme exact des délais en jours entiers.
+# Les délais étant des nombres entiers de jours, l'histogramme tient lieu d'esquisse de quantiles sans erreur :
+# effectifs, sommes, moyennes, min/max et médianes de plusieurs mois se déduisent exactement de la somme des
+# histogrammes (erreur nulle), pour un volume borné par le nombre de valeurs de délai distinctes (quelques
+# centaines au plus) au lieu du nombre de lettres.
+
+SUMMARY_COLUMNS = ["mois", "specialite", "mesure", "jours", "effectif"]
+
+# Mesures résumées : délai diffusion-sortie de toutes les LL, et des seules LL validées le jour de la sortie
+MESURE_GLOBALE = "diffusion_sortie"
+MESURE_J0 = "diffusion_sortie_j0"
+
+
+def build_summaries(df_facts):
+    """Histogrammes des délais par mois de sortie × service, sur les lignes affichées (délai >= -3 jours)"""
+    if df_facts.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    df = df_facts[df_facts["diff_date_diffusion_sortie"] >= -3].assign(
+        mois=lambda d: pd.to_datetime(d["date_sortie_easily"], format="%d/%m/%Y").dt.strftime("%Y-%m"),
+        jours=lambda d: d["diff_date_diffusion_sortie"].astype("int64"),
+    )
+    mesures = [
+        df.assign(mesure=MESURE_GLOBALE),
+        df[df["diff_validation_easily_sortie_easily"] == 0].assign(mesure=MESURE_J0),
+    ]
+    return (
+        pd.concat(mesures, ignore_index=True)
+        .groupby(["mois", "specialite_easily", "mesure", "jours"], sort=True, dropna=False, observed=True)
+        .size()
+        .rename("effectif")
+        .reset_index()
+        .rename(columns={"specialite_easily": "specialite"})[SUMMARY_COLUMNS]
+    )
+
+
+def merge_summaries(summaries, months=None, specialites=None):
+    """Fusionne les histogrammes des mois (et services) demandés : simple somme des effectifs"""
+    if months is not None:
+        summaries = summaries[summaries["mois"].isin(months)]
+    if specialites is not None:
+        summaries = summaries[summaries["specialite"].isin(specialites)]
+    return summaries.groupby(["specialite", "mesure", "jours"], sort=True, dropna=False, observed=True, as_index=False)[
+        "effectif"
+    ].sum()
+
+
+def histogram_quantile(jours, effectifs, q):
+    """Quantile d'un histogramme trié, avec l'interpolation linéaire de pandas (médiane = moyenne des deux
+    valeurs centrales pour un effectif pair)"""
+    total = effectifs.sum()
+    if total == 0:
+        return np.nan
+    position = q * (total - 1)
+    cumul = np.cumsum(effectifs)
+    bas = jours[np.searchsorted(cumul, np.floor(position), side="right")]
+    haut = jours[np.searchsorted(cumul, np.ceil(position), side="right")]
+    return bas + (haut - bas) * (position - np.floor(position))
+
+
+def _describe(histogram):
+    jours = histogram["jours"].to_numpy()
+    effectifs = histogram["effectif"].to_numpy()
+    n = effectifs.sum()
+    return {
+        "n": n,
+        "moyenne": (jours * effectifs).sum() / n if n else np.nan,
+        "mediane": histogram_quantile(jours, effectifs, 0.5),
+        "min": jours.min() if n else np.nan,
+        "max": jours.max() if n else np.nan,
+    }
+
+
+def service_stats_from_summaries(merged):
+    """Même tableau que reconciliation.service_stats, calculé à partir des histogrammes fusionnés"""
+    rows = []
+    for service, histogrammes in merged.groupby("specialite", sort=True, observed=True):
+        globale = _describe(histogrammes[histogrammes["mesure"] == MESURE_GLOBALE])
+        j0 = _describe(histogrammes[histogrammes["mesure"] == MESURE_J0])
+        rows.append(
+            {
+                "Service": service,
+                "Total LL": globale["n"],
+                "LL validées J0": j0["n"],
+                "% LL validées J0": j0["n"] / globale["n"] * 100 if globale["n"] else 0,
+                "Délai moyen global (j)": globale["moyenne"],
+                "Délai médian global (j)": globale["mediane"],
+                "Délai moyen LL J0 (j)": j0["moyenne"],
+                "Délai médian LL J0 (j)": j0["mediane"],
+            }
+        )
+    df_stats = pd.DataFrame(rows)
+    if df_stats.empty:
+        return df_stats
+    return df_stats.sort_values("% LL validées J0", ascending=False, kind="stable")
+
+
+def global_stats_from_summaries(merged, mesure=MESURE_GLOBALE):
+    """Moyenne, médiane, min et max tous services confondus"""
+    histogram = merged[merged["mesure"] == mesure].groupby("jours", sort=True, as_index=False)["effectif"].sum()
+    return _describe(histogram)
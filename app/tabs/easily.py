@@ -1,9 +1,23 @@
 import plotly.express as px
 import requests
 import streamlit as st
-from app_conf import EASILY_API_URL
+from app_conf import EASILY_API_URL, EASILY_DELTA_API_URL, EASILY_KPIS_API_URL
 from utils import create_download_link
 from auth import api_request
+from frame_cache import memoize
+from kpis import distribution, load_kpis, month_distribution
+
+# Figures mises en cache selon le contenu des données (voir frame_cache.py)
+
+
+@memoize
+def _pie(df, names, title):
+    return px.pie(df, names=names, title=title)
+
+
+@memoize
+def _histogram(df, column, nbins, title, label, color):
+    return px.histogram(df, x=column, nbins=nbins, title=title, labels={column: label}, color_discrete_sequence=[color])
 
 
 # Fonction pour afficher les données Easily
@@ -28,77 +42,76 @@ def display_easily_data(df):
         )
 
     with stats_tab:
-        # Statistiques Easily
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-            st.metric("Nombre total de Lettre de liaison", len(set(df["Num_Venue"])))
-
-        with col2:
-            if "pat_IPP" in df.columns:
-                st.metric("Patients uniques", df["pat_IPP"].nunique())
-
-        with col3:
-            if "LL_J0" in df.columns:
-                delay = df["LL_J0"].mean()
-                st.metric(
-                    "Délai moyen entre la sortie d'hospitalisation et la validation du document de liaison (jours)",
-                    f"{delay:.1f}",
-                )
-
-        # Distribution par spécialité
-        if "CR_Doss_spe" in df.columns:
-            st.subheader("Distribution par spécialité")
-            specialty_counts = df["CR_Doss_spe"].value_counts().reset_index()
-            specialty_counts.columns = ["Spécialité", "Nombre"]
-            st.dataframe(specialty_counts, use_container_width=True)
-
-        # Distribution par mois
-        if "mois" in df.columns:
-            st.subheader("Distribution par mois")
-            month_counts = df["mois"].value_counts().reset_index()
-            month_counts.columns = ["Mois", "Nombre"]
-            st.dataframe(month_counts, use_container_width=True)
+        kpis = load_kpis("Easily")
+        if kpis is None:
+            st.info("Statistiques indisponibles : l'API Easily n'a pas renvoyé les indicateurs agrégés.")
+        else:
+            render_easily_statistics(*kpis)
 
     with charts_tab:
         # Graphiques pour les données Easily
         if "CR_Doss_spe" in df.columns:
             st.subheader("Répartition par spécialité")
-            fig1 = px.pie(
-                df,
-                names="CR_Doss_spe",
-                title="Répartition des Lettre de liaison par spécialité",
-            )
+            fig1 = _pie(df, "CR_Doss_spe", "Répartition des Lettre de liaison par spécialité")
             st.plotly_chart(fig1, use_container_width=True)
 
         if "LL_J0" in df.columns:
             st.subheader("Délai de validation")
-            fig2 = px.histogram(
+            fig2 = _histogram(
                 df,
-                x="LL_J0",
-                nbins=20,
-                title="Distribution des délais de validation (en jours)",
-                labels={"LL_J0": "Délai de validation (jours)"},
-                color_discrete_sequence=["#047dc1"],
+                "LL_J0",
+                20,
+                "Distribution des délais de validation (en jours)",
+                "Délai de validation (jours)",
+                "#047dc1",
             )
             st.plotly_chart(fig2, use_container_width=True)
 
         if "nuit_1" in df.columns:
             st.subheader("Durée des séjours")
-            fig3 = px.histogram(
+            fig3 = _histogram(
                 df,
-                x="nuit_1",
-                nbins=50,
-                title="Distribution des durées de séjour (en nuits)",
-                labels={"nuit_1": "Durée de séjour (nuits)"},
-                color_discrete_sequence=["#8bbc35"],
+                "nuit_1",
+                50,
+                "Distribution des durées de séjour (en nuits)",
+                "Durée de séjour (nuits)",
+                "#8bbc35",
             )
             st.plotly_chart(fig3, use_container_width=True)
 
 
+def render_easily_statistics(groups, totals):
+    """Affiche les statistiques Easily à partir des seuls agrégats spécialité × mois × canal (/kpis)"""
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric("Nombre total de Lettre de liaison", totals["nb_ll"])
+
+    with col2:
+        st.metric("Patients uniques", totals["nb_patients"])
+
+    with col3:
+        if totals["ll_j0_moyen"] is not None:
+            st.metric(
+                "Délai moyen entre la sortie d'hospitalisation et la validation du document de liaison (jours)",
+                f"{totals['ll_j0_moyen']:.1f}",
+            )
+
+    if groups.empty:
+        return
+
+    # Distribution par spécialité
+    st.subheader("Distribution par spécialité")
+    st.dataframe(distribution(groups, "specialite", "nb_lignes", ["Spécialité", "Nombre"]), use_container_width=True)
+
+    # Distribution par mois, dans l'ordre chronologique
+    st.subheader("Distribution par mois")
+    st.dataframe(month_distribution(groups, "nb_lignes", ["Mois", "Nombre"]), use_container_width=True)
+
+
 # Fonction modifiée pour récupérer les données Easily avec filtrage par numéros de séjour
-def get_easily_data(start_date, end_date, venue_numbers=None):
-    """Récupère les Lettre de liaison patients depuis l'API Easily"""
+def get_easily_data(start_date, end_date, venue_numbers=None, fields=None):
+    """Récupère les Lettre de liaison patients depuis l'API Easily (colonnes limitées à `fields` s'il est fourni)"""
     try:
         # Détermine le type de requête
         is_venue_query = venue_numbers and len(venue_numbers) > 0
@@ -120,6 +133,9 @@ def get_easily_data(start_date, end_date, venue_numbers=None):
             st.error("Veuillez fournir soit des numéros de séjour, soit des dates de début et de fin valides.")
             return []
 
+        if fields:
+            params["fields"] = ",".join(fields)
+
         # Appeler l'API avec les paramètres
         response = api_request("GET", EASILY_API_URL, params=params)
 
@@ -131,3 +147,61 @@ def get_easily_data(start_date, end_date, venue_numbers=None):
     except Exception as e:
         st.error(f"Erreur de connexion à l'API Easily: {str(e)}")
         return []
+
+
+def get_easily_kpis(start_date, end_date, venue_numbers=None, specialites=None):
+    """Indicateurs Easily agrégés par l'API (spécialité × mois × canal) pour la même sélection que les données.
+
+    Retourne la réponse {"groups", "totals"} de /kpis, ou None en cas d'erreur (statistiques non affichées).
+    """
+    try:
+        if venue_numbers:
+            params = {"venues": ",".join(str(v) for v in venue_numbers)}
+        else:
+            params = {"start_date": start_date.strftime("%Y-%m-%d"), "end_date": end_date.strftime("%Y-%m-%d")}
+        if specialites:
+            params["specialites"] = list(specialites)
+
+        response = api_request("GET", EASILY_KPIS_API_URL, params=params)
+
+        if response.status_code == 200:
+            return response.json()
+        st.warning(f"Statistiques Easily indisponibles: {response.status_code} - {response.text}")
+        return None
+    except Exception as e:
+        st.warning(f"Statistiques Easily indisponibles: {str(e)}")
+        return None
+
+
+def get_easily_snapshot(start_date, end_date, since=None, specialites=None, fields=None):
+    """Récupère les Lettres de liaison d'une période avec l'horodatage serveur de l'extraction.
+
+    Si `since` est fourni, seules les fiches créées ou modifiées depuis cet horodatage sont renvoyées.
+    Si `specialites` est fourni, le filtre CR_Doss_spe est appliqué par la requête Easily.
+    Si `fields` est fourni, seules ces colonnes sont renvoyées.
+    Retourne (données, horodatage) ou (None, None) en cas d'erreur.
+    """
+    try:
+        params = {
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
+        }
+        if specialites:
+            params["specialites"] = list(specialites)
+        if fields:
+            params["fields"] = ",".join(fields)
+        url = EASILY_API_URL
+        if since is not None:
+            params["since"] = since
+            url = EASILY_DELTA_API_URL
+
+        response = api_request("GET", url, params=params)
+
+        if response.status_code == 200:
+            return response.json(), response.headers.get("X-Snapshot-Time")
+        else:
+            st.error(f"Erreur lors de la récupération des données Easily: {response.status_code} - {response.text}")
+            return None, None
+    except Exception as e:
+        st.error(f"Erreur de connexion à l'API Easily: {str(e)}")
+        return None, None
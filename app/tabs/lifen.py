@@ -1,15 +1,56 @@
+from concurrent.futures import wait
+
 import pandas as pd
 import plotly.express as px
 import requests
 import streamlit as st
-from app_conf import LIFEN_API_URL
+from app_conf import LIFEN_API_URL, LIFEN_KPIS_API_URL, LIFEN_PROGRESS_API_URL
 from utils import create_download_link
 from auth import api_request
+from frame_cache import memoize
+from kpis import distribution, load_kpis
+
+# Figures mises en cache selon le contenu des données (voir frame_cache.py)
+
+
+@memoize
+def _pie(df, names, title, color_discrete_map=None):
+    return px.pie(df, names=names, title=title, color_discrete_map=color_discrete_map)
+
+
+@memoize
+def _channels_by_specialty_figure(df_lifen, df_easily):
+    """Barres empilées des canaux d'envoi par spécialité (None si les colonnes manquent)"""
+    # Créer un DataFrame enrichi pour ce graphique spécifique
+    df_easily_slim = df_easily[["Num_Venue", "CR_Doss_spe"]].rename(columns={"Num_Venue": "num_sej"})
+    df_enriched = pd.merge(df_lifen, df_easily_slim, on="num_sej", how="left")
+
+    # Créer un graphique à barres empilées
+    if "canal_envoi" not in df_enriched.columns or "CR_Doss_spe" not in df_enriched.columns:
+        return None
+    cross_counts = df_enriched.groupby(["CR_Doss_spe", "canal_envoi"], observed=True).size().reset_index(name="count")
+    return px.bar(
+        cross_counts,
+        x="CR_Doss_spe",
+        y="count",
+        color="canal_envoi",
+        title="Répartition des canaux par spécialité",
+        labels={
+            "CR_Doss_spe": "Spécialité",
+            "count": "Nombre",
+            "canal_envoi": "Canal",
+        },
+    )
 
 
 # Fonction pour récupérer les données Lifen pour les numéros de séjour spécifiés
-def get_lifen_data(num_venues, start_date=None, end_date=None):
-    """Récupère les données Lifen pour les numéros de séjour spécifiés"""
+def get_lifen_data(num_venues, start_date=None, end_date=None, progress_id=None, filters=None, fields=None):
+    """Récupère les données Lifen pour les numéros de séjour spécifiés
+
+    Avec un `progress_id`, l'avancement est consultable pendant la requête (get_lifen_progress).
+    `filters` (statut_envoi, canal_envoi, role_destinataire : listes de valeurs) est appliqué par l'API
+    dans la requête Oracle. `fields` limite les colonnes renvoyées (toutes par défaut).
+    """
     try:
         # Filtrer les num_venues valides
         valid_venues = [venue for venue in num_venues if venue and venue != 0]
@@ -27,11 +68,26 @@ def get_lifen_data(num_venues, start_date=None, end_date=None):
             params["start_date"] = start_date.strftime("%Y-%m-%d")
             params["end_date"] = end_date.strftime("%Y-%m-%d")
 
+        if progress_id:
+            params["progress_id"] = progress_id
+
+        if fields:
+            params["fields"] = ",".join(fields)
+
+        # Listes envoyées en paramètres répétés (?statut_envoi=Réussite&statut_envoi=Échec)
+        params.update({name: values for name, values in (filters or {}).items() if values})
+
         # Appeler l'API Lifen avec les paramètres
         #response = requests.get(LIFEN_API_URL, params=params)
         response = api_request("GET", LIFEN_API_URL, params=params)
 
         if response.status_code == 200:
+            # Lots ou chunks restés en échec côté API malgré les nouvelles tentatives
+            if response.headers.get("X-Lifen-Complete") == "false":
+                st.warning(
+                    f"Données Lifen incomplètes : {response.headers.get('X-Lifen-Units-Failed')} lot(s) sur "
+                    f"{response.headers.get('X-Lifen-Units-Total')} en échec. Relancez la requête pour les reprendre."
+                )
             return response.json()
         else:
             st.error(f"Erreur lors de la récupération des données Lifen: {response.status_code} - {response.text}")
@@ -41,6 +97,69 @@ def get_lifen_data(num_venues, start_date=None, end_date=None):
         return []
 
 
+def get_lifen_kpis(num_venues, start_date=None, end_date=None, progress_id=None, filters=None):
+    """Indicateurs Lifen agrégés par l'API (service × mois × canal) pour la même sélection que get_lifen_data.
+
+    Retourne la réponse {"groups", "totals"} de /kpis, ou None en cas d'erreur (statistiques non affichées).
+    """
+    try:
+        valid_venues = [venue for venue in num_venues if venue and venue != 0]
+        if not valid_venues:
+            return None
+
+        params = {"num_venues": ",".join(str(v) for v in valid_venues)}
+        if start_date is not None and end_date is not None:
+            params["start_date"] = start_date.strftime("%Y-%m-%d")
+            params["end_date"] = end_date.strftime("%Y-%m-%d")
+        if progress_id:
+            params["progress_id"] = progress_id
+        params.update({name: values for name, values in (filters or {}).items() if values})
+
+        response = api_request("GET", LIFEN_KPIS_API_URL, params=params)
+
+        if response.status_code == 200:
+            if response.headers.get("X-Lifen-Complete") == "false":
+                st.warning(
+                    f"Statistiques Lifen incomplètes : {response.headers.get('X-Lifen-Units-Failed')} lot(s) sur "
+                    f"{response.headers.get('X-Lifen-Units-Total')} en échec."
+                )
+            return response.json()
+        st.warning(f"Statistiques Lifen indisponibles: {response.status_code} - {response.text}")
+        return None
+    except Exception as e:
+        st.warning(f"Statistiques Lifen indisponibles: {str(e)}")
+        return None
+
+
+def get_lifen_progress(progress_id):
+    """Avancement d'une requête Lifen lancée avec ce progress_id (None s'il n'est pas encore connu de l'API)"""
+    try:
+        response = api_request("GET", f"{LIFEN_PROGRESS_API_URL}/{progress_id}", timeout=5)
+    except requests.RequestException:
+        return None
+    if response is None or response.status_code != 200:
+        return None
+    return response.json()
+
+
+def watch_lifen_progress(lifen_call, progress_id, on_progress, interval=0.5):
+    """Interroge l'avancement côté API jusqu'à la fin de `lifen_call` (Future) et le transmet à `on_progress`"""
+    while not wait([lifen_call], timeout=interval).done:
+        snapshot = get_lifen_progress(progress_id)
+        if snapshot:
+            on_progress(snapshot)
+    return lifen_call.result()
+
+
+def display_lifen_preview(df_lifen, done, total):
+    """Diffusions Lifen déjà reçues pendant une requête par date (tableau seul, sans agrégats ni figures)"""
+    st.info(
+        f"Appel Lifen {done}/{total} : {len(df_lifen)} diffusion(s) reçue(s). "
+        "Statistiques et graphiques affichés à la fin de la requête."
+    )
+    st.dataframe(df_lifen, use_container_width=True)
+
+
 # Fonction pour afficher les données Lifen
 def display_lifen_data(df_lifen, df_easily):
     if df_lifen.empty:
@@ -63,60 +182,25 @@ def display_lifen_data(df_lifen, df_easily):
         )
 
     with stats_tab:
-        # Statistiques Lifen
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-            st.metric("Nombre total de diffusions", len(df_lifen))
-
-        with col2:
-            if "statut_envoi" in df_lifen.columns:
-                success_rate = df_lifen[df_lifen["statut_envoi"] == "Réussite"].shape[0] / len(df_lifen) * 100
-                st.metric("Taux de réussite", f"{success_rate:.1f}%")
-
-        with col3:
-            if "num_sej" in df_lifen.columns and "Num_Venue" in df_easily.columns:
-                coverage = df_lifen["num_sej"].nunique() / df_easily["Num_Venue"].nunique() * 100
-                st.metric("Couverture des séjours", f"{coverage:.1f}%")
-
-        # Distribution par canal
-        if "canal_envoi" in df_lifen.columns:
-            st.subheader("Distribution par canal")
-            channel_counts = df_lifen["canal_envoi"].value_counts().reset_index()
-            channel_counts.columns = ["Canal", "Nombre"]
-            st.dataframe(channel_counts, use_container_width=True)
-
-        # Distribution par résultat
-        if "statut_envoi" in df_lifen.columns:
-            st.subheader("Distribution par résultat")
-            result_counts = df_lifen["statut_envoi"].value_counts().reset_index()
-            result_counts.columns = ["Résultat", "Nombre"]
-            st.dataframe(result_counts, use_container_width=True)
-
-        # Distribution par type de destinataire
-        if "role_destinataire" in df_lifen.columns:
-            st.subheader("Distribution par type de destinataire")
-            recipient_counts = df_lifen["role_destinataire"].value_counts().reset_index()
-            recipient_counts.columns = ["Type de destinataire", "Nombre"]
-            st.dataframe(recipient_counts, use_container_width=True)
+        kpis = load_kpis("Lifen")
+        if kpis is None:
+            st.info("Statistiques indisponibles : l'API Lifen n'a pas renvoyé les indicateurs agrégés.")
+        else:
+            render_lifen_statistics(*kpis, df_easily["Num_Venue"].nunique())
 
     with charts_tab:
         # Graphiques pour les données Lifen
         if "canal_envoi" in df_lifen.columns:
             st.subheader("Répartition par canal")
-            fig1 = px.pie(
-                df_lifen,
-                names="canal_envoi",
-                title="Répartition des diffusions par canal",
-            )
+            fig1 = _pie(df_lifen, "canal_envoi", "Répartition des diffusions par canal")
             st.plotly_chart(fig1, use_container_width=True)
 
         if "statut_envoi" in df_lifen.columns:
             st.subheader("Répartition par résultat")
-            fig2 = px.pie(
+            fig2 = _pie(
                 df_lifen,
-                names="statut_envoi",
-                title="Répartition des diffusions par résultat",
+                "statut_envoi",
+                "Répartition des diffusions par résultat",
                 color_discrete_map={"Réussite": "#8bbc35", "Échec": "#e74c3c"},
             )
             st.plotly_chart(fig2, use_container_width=True)
@@ -124,23 +208,40 @@ def display_lifen_data(df_lifen, df_easily):
         # Graphique croisé spécialité vs canal (si les deux dataframes peuvent être liés)
         if "num_sej" in df_lifen.columns and "Num_Venue" in df_easily.columns and "CR_Doss_spe" in df_easily.columns:
             st.subheader("Canaux par spécialité")
-            # Créer un DataFrame enrichi pour ce graphique spécifique
-            df_easily_slim = df_easily[["Num_Venue", "CR_Doss_spe"]].rename(columns={"Num_Venue": "num_sej"})
-            df_enriched = pd.merge(df_lifen, df_easily_slim, on="num_sej", how="left")
-
-            # Créer un graphique à barres empilées
-            if "canal_envoi" in df_enriched.columns and "CR_Doss_spe" in df_enriched.columns:
-                cross_counts = df_enriched.groupby(["CR_Doss_spe", "canal_envoi"]).size().reset_index(name="count")
-                fig3 = px.bar(
-                    cross_counts,
-                    x="CR_Doss_spe",
-                    y="count",
-                    color="canal_envoi",
-                    title="Répartition des canaux par spécialité",
-                    labels={
-                        "CR_Doss_spe": "Spécialité",
-                        "count": "Nombre",
-                        "canal_envoi": "Canal",
-                    },
-                )
+            fig3 = _channels_by_specialty_figure(df_lifen, df_easily)
+            if fig3 is not None:
                 st.plotly_chart(fig3, use_container_width=True)
+
+
+def render_lifen_statistics(groups, totals, nb_sejours_easily):
+    """Affiche les statistiques Lifen à partir des seuls agrégats service × mois × canal (/kpis)"""
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric("Nombre total de diffusions", totals["nb_diffusions"])
+
+    with col2:
+        if totals["nb_diffusions"] and "nb_reussites" in totals:
+            success_rate = totals["nb_reussites"] / totals["nb_diffusions"] * 100
+            st.metric("Taux de réussite", f"{success_rate:.1f}%")
+
+    with col3:
+        if nb_sejours_easily:
+            coverage = totals["nb_sejours"] / nb_sejours_easily * 100
+            st.metric("Couverture des séjours", f"{coverage:.1f}%")
+
+    if groups.empty:
+        return
+
+    # Distributions des dimensions chargées
+    for column, label in [
+        ("canal_envoi", "canal"),
+        ("statut_envoi", "résultat"),
+        ("role_destinataire", "type de destinataire"),
+    ]:
+        if column in groups.columns:
+            st.subheader(f"Distribution par {label}")
+            st.dataframe(
+                distribution(groups, column, "nb_diffusions", [label.capitalize(), "Nombre"]),
+                use_container_width=True,
+            )
@@ -10,9 +10,10 @@ def create_download_link(df, filename):
     df_clean = df.copy()
 
     # For string columns only, clean up carriage returns
-    for col in df_clean.select_dtypes(include=["object"]).columns:
+    for col in df_clean.select_dtypes(include=["object", "string"]).columns:
         if df_clean[col].dtype == "object":  # Only process string columns
-            df_clean[col] = df_clean[col].astype(str).str.replace("\r", "")
+            df_clean[col] = df_clean[col].astype(str)
+        df_clean[col] = df_clean[col].str.replace("\r", "")
 
     # Use explicit line terminator and quoting parameters
     csv = df_clean.to_csv(
@@ -0,0 +1,46 @@
+"""Temps du rapprochement Easily/Lifen sur 10k, 100k et 1M séjours synthétiques.
+
+    python tests/benchmark_reconciliation.py [--sizes 10000 100000 1000000] [--baseline-max 10000]
+
+La version ligne à ligne d'origine (reconciliation_fixtures.baseline_reconcile) n'est mesurée que jusqu'à
+`--baseline-max` séjours : au-delà, elle prend plusieurs minutes.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "app"), str(Path(__file__).resolve().parent)]
+
+from reconciliation import reconcile, service_stats  # noqa: E402
+from reconciliation_fixtures import baseline_reconcile, make_frames  # noqa: E402
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--baseline-max", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'séjours':>10} {'reconcile':>10} {'services':>10} {'ligne à ligne':>14}")
+    for size in args.sizes:
+        df_lifen, df_easily = make_frames(size)
+        facts, reconcile_seconds = timed(reconcile, df_lifen, df_easily, tolerance=None)
+        _, stats_seconds = timed(service_stats, facts)
+        baseline = "-"
+        if size <= args.baseline_max:
+            _, baseline_seconds = timed(baseline_reconcile, df_lifen, df_easily)
+            baseline = f"{baseline_seconds:.2f}s"
+        print(f"{size:>10} {reconcile_seconds:>9.2f}s {stats_seconds:>9.2f}s {baseline:>14}")
+
+
+if __name__ == "__main__":
+    main()
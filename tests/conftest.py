@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Les modules de l'application et des APIs s'importent par leur nom (comme à l'exécution, depuis leur dossier)
+ROOT = Path(__file__).resolve().parent.parent
+for folder in ("app", "api", "api/easily", "api/lifen"):
+    sys.path.insert(0, str(ROOT / folder))
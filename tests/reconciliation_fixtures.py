@@ -0,0 +1,214 @@
+"""Jeux de données Easily/Lifen synthétiques (lignes JSON des APIs) et calcul de référence ligne à ligne du
+rapprochement, repris de la version d'origine de l'onglet Comparaison (DataFrame.apply)."""
+
+import numpy as np
+import pandas as pd
+
+SPECIALITES = ["Cardiologie", "Pneumologie", "Gériatrie", "Hématologie", "Chirurgie thoracique"]
+
+
+def make_frames(n_sejours, seed=0, multi_envoi_share=0.3):
+    """(df_lifen, df_easily) bruts pour `n_sejours` séjours.
+
+    Un envoi Lifen au patient par séjour, plus des envois aux médecins (écartés par le rapprochement), et des
+    écarts à la sortie distincts en valeur absolue entre fiches d'un même séjour. Environ `multi_envoi_share`
+    des séjours ont deux à quatre envois au patient, avant ou après la sortie : le premier y est strictement
+    plus proche de la sortie que les autres et que toute diffusion Easily. Le séjour rapproché ne dépend donc
+    jamais de l'ordre des ex aequo, que la version d'origine ne fixait pas (tri instable).
+    """
+    rng = np.random.default_rng(seed)
+    num_sej = np.arange(1_000_000, 1_000_000 + n_sejours)
+    ipp = rng.integers(10_000_000, 20_000_000, n_sejours)
+    sortie = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n_sejours), unit="D")
+    specialite = rng.choice(SPECIALITES, n_sejours)
+
+    # Une ou deux fiches par séjour, la seconde à un écart absolu différent de la première
+    n_fiches = rng.integers(1, 3, n_sejours)
+    fiche_sej = np.repeat(np.arange(n_sejours), n_fiches)
+    rank = np.concatenate([np.arange(n) for n in n_fiches])
+    sejour_offset = rng.integers(-3, 15, n_sejours)
+    base_offset = sejour_offset[fiche_sej]
+    diffusion_offset = np.where(rank == 0, base_offset, np.where(base_offset >= 0, base_offset + 20, base_offset - 20))
+    diffusion = sortie[fiche_sej] + pd.to_timedelta(diffusion_offset, unit="D")
+    validation = sortie[fiche_sej] + pd.to_timedelta(rng.integers(-5 * 24, 10 * 24, len(fiche_sej)), unit="h")
+    # Environ 5 % de fiches sans date de diffusion
+    diffusion_text = pd.Series(diffusion.strftime("%d/%m/%Y")).where(rng.random(len(fiche_sej)) > 0.05)
+
+    df_easily = pd.DataFrame(
+        {
+            "pat_IPP": ipp[fiche_sej],
+            "Num_Venue": num_sej[fiche_sej],
+            "ven_theo": num_sej[fiche_sej],
+            "sej_date_entree": (sortie[fiche_sej] - pd.Timedelta(days=5)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "sej_date_sortie": sortie[fiche_sej].strftime("%Y-%m-%dT%H:%M:%S"),
+            "CR_Doss_spe": specialite[fiche_sej],
+            "date_min_val": validation.strftime("%Y-%m-%dT%H:%M:%S"),
+            "LL_J0": rng.integers(0, 2, len(fiche_sej)),
+            "Date diffusion": diffusion_text,
+            "fiche_id": np.arange(len(fiche_sej)) + 500_000,
+        }
+    )
+
+    # Un envoi au patient par séjour et un envoi au médecin pour un séjour sur deux
+    medecin = np.flatnonzero(rng.random(n_sejours) < 0.5)
+    envoi_offset = rng.integers(-2, 20, n_sejours + len(medecin))
+
+    # Destinataires multiples : le premier envoi au patient est à moins de |écart de la première fiche| jours
+    # de la sortie (les autres fiches sont plus loin), les envois supplémentaires de plus en plus loin
+    multi = np.flatnonzero((rng.random(n_sejours) < multi_envoi_share) & (np.abs(sejour_offset) >= 2))
+    nearest = rng.integers(0, np.abs(sejour_offset[multi]))
+    envoi_offset[multi] = nearest * rng.choice([-1, 1], len(multi))
+    n_extra = rng.integers(1, 4, len(multi))
+    extra_sej = np.repeat(multi, n_extra)
+    cumul = np.cumsum(rng.integers(1, 5, n_extra.sum()))
+    # Pas cumulés à l'intérieur de chaque séjour : distances à la sortie distinctes et croissantes
+    steps = cumul - np.concatenate([[0], cumul])[np.repeat(np.cumsum(n_extra) - n_extra, n_extra)]
+    extra_offset = (np.repeat(nearest, n_extra) + steps) * rng.choice([-1, 1], len(extra_sej))
+
+    patient_sej = np.concatenate([np.arange(n_sejours), extra_sej])
+    lifen_sej = np.concatenate([patient_sej, medecin])
+    envoi_offset = np.concatenate([envoi_offset[:n_sejours], extra_offset, envoi_offset[n_sejours:]])
+    envoi = sortie[lifen_sej] + pd.to_timedelta(envoi_offset, unit="D")
+    df_lifen = pd.DataFrame(
+        {
+            "ipp": ipp[lifen_sej].astype(str),
+            "num_sej": num_sej[lifen_sej].astype(str),
+            "date_sortie": sortie[lifen_sej].strftime("%Y-%m-%dT%H:%M:%S"),
+            "date_envoi": envoi.strftime("%Y-%m-%dT%H:%M:%S"),
+            "role_destinataire": np.where(np.arange(len(lifen_sej)) < len(patient_sej), "Patient", "Médecin"),
+            "type_sej": specialite[lifen_sej],
+        }
+    )
+    return df_lifen, df_easily
+
+
+def baseline_reconcile(df_lifen, df_easily):
+    """Rapprochement ligne à ligne de la version d'origine (produit envois × fiches puis DataFrame.apply)"""
+    df_easily = df_easily[
+        [
+            "pat_IPP",
+            "Num_Venue",
+            "ven_theo",
+            "sej_date_entree",
+            "sej_date_sortie",
+            "CR_Doss_spe",
+            "date_min_val",
+            "LL_J0",
+            "Date diffusion",
+            "fiche_id",
+        ]
+    ].rename(
+        columns={
+            "pat_IPP": "ipp",
+            "Num_Venue": "num_sej",
+            "sej_date_entree": "date_entree_easily",
+            "sej_date_sortie": "date_sortie_easily",
+            "CR_Doss_spe": "specialite_easily",
+            "date_min_val": "date_min_val_easily",
+            "Date diffusion": "date_diffusion_easily",
+        }
+    )
+    df_easily = df_easily.drop_duplicates()
+    df_easily["date_sortie_dt"] = pd.to_datetime(df_easily["date_sortie_easily"])
+    df_easily["date_diffusion_dt"] = pd.to_datetime(
+        df_easily["date_diffusion_easily"], format="%d/%m/%Y", errors="coerce"
+    )
+    df_easily["time_diff"] = df_easily.apply(
+        lambda row: abs(row["date_diffusion_dt"] - row["date_sortie_dt"])
+        if pd.notna(row["date_diffusion_dt"]) and pd.notna(row["date_sortie_dt"])
+        else pd.Timedelta(days=9999),
+        axis=1,
+    )
+    fiches = df_easily.loc[df_easily.groupby("fiche_id")["time_diff"].idxmin()].copy()
+
+    df_lifen = df_lifen.rename(
+        columns={"date_sortie": "date_sortie_lifen", "date_envoi": "date_envoi_lifen", "type_sej": "specialite_lifen"}
+    )
+    df_lifen = df_lifen[df_lifen["role_destinataire"] == "Patient"].copy()
+    for df in (df_lifen, fiches):
+        df["ipp"] = pd.to_numeric(df["ipp"], errors="coerce").astype("Int64")
+        df["num_sej"] = pd.to_numeric(df["num_sej"], errors="coerce").astype("Int64")
+
+    df_temp = df_lifen.merge(
+        fiches[["ipp", "num_sej", "date_sortie_easily", "date_diffusion_easily", "date_min_val_easily"]],
+        on=["ipp", "num_sej"],
+        how="inner",
+    )
+    df_temp["date_envoi_lifen"] = pd.to_datetime(df_temp["date_envoi_lifen"], errors="coerce")
+    df_temp["date_sortie_easily"] = pd.to_datetime(df_temp["date_sortie_easily"], errors="coerce")
+    df_temp["date_diffusion_easily"] = pd.to_datetime(
+        df_temp["date_diffusion_easily"], format="%d/%m/%Y", errors="coerce"
+    )
+    for source, column in (("lifen", "date_envoi_lifen"), ("easily", "date_diffusion_easily")):
+        df_temp[f"diff_date_{source}"] = df_temp.apply(
+            lambda row, column=column: abs(row[column] - row["date_sortie_easily"]).days
+            if pd.notna(row[column]) and pd.notna(row["date_sortie_easily"])
+            else float("inf"),
+            axis=1,
+        )
+
+    # Seuls les séjours dont les deux dates sont connues ont une source (les masques "une seule date" de la
+    # version d'origine ne sélectionnaient aucune ligne)
+    df_temp["source_optimale"] = "Aucune"
+    mask_both_valid = (df_temp["diff_date_lifen"] != float("inf")) & (df_temp["diff_date_easily"] != float("inf"))
+    df_temp.loc[mask_both_valid, "source_optimale"] = df_temp.loc[mask_both_valid].apply(
+        lambda row: "Lifen" if row["diff_date_lifen"] <= row["diff_date_easily"] else "Easily", axis=1
+    )
+    df_temp["date_diffusion_optimale"] = df_temp.apply(
+        lambda row: row["date_envoi_lifen"]
+        if row["source_optimale"] == "Lifen"
+        else row["date_diffusion_easily"]
+        if row["source_optimale"] == "Easily"
+        else None,
+        axis=1,
+    )
+    df_temp["diff_optimale_jours"] = df_temp.apply(
+        lambda row: abs((row["date_diffusion_optimale"] - row["date_sortie_easily"]).days)
+        if pd.notna(row["date_diffusion_optimale"])
+        else None,
+        axis=1,
+    )
+    df_min = df_temp.sort_values("diff_optimale_jours").groupby("num_sej").first().reset_index()
+    df_min = df_min[["ipp", "num_sej", "date_envoi_lifen", "source_optimale", "date_diffusion_optimale"]]
+
+    df_merge = df_min.merge(
+        fiches[
+            [
+                "ipp",
+                "num_sej",
+                "date_sortie_easily",
+                "specialite_easily",
+                "date_min_val_easily",
+                "date_diffusion_easily",
+            ]
+        ],
+        on=["ipp", "num_sej"],
+    )
+    df_merge["date_sortie_easily"] = pd.to_datetime(df_merge["date_sortie_easily"])
+    df_merge["date_diffusion_easily"] = pd.to_datetime(df_merge["date_diffusion_easily"], format="%d/%m/%Y")
+    df_merge["date_min_val_easily"] = pd.to_datetime(df_merge["date_min_val_easily"], format="ISO8601")
+    df_merge["diff_date_diffusion_sortie"] = df_merge.apply(
+        lambda row: (
+            pd.Timestamp(row["date_diffusion_optimale"]).floor("D") - pd.Timestamp(row["date_sortie_easily"]).floor("D")
+        ).days
+        if pd.notna(row["date_diffusion_optimale"])
+        else None,
+        axis=1,
+    )
+    df_merge["diff_validation_easily_sortie_easily"] = (
+        pd.to_datetime(df_merge["date_min_val_easily"].dt.date) - pd.to_datetime(df_merge["date_sortie_easily"].dt.date)
+    ).dt.days
+    df_merge["delai_envoi_validation"] = df_merge.apply(
+        lambda row: (
+            pd.Timestamp(row["date_diffusion_optimale"]).floor("D")
+            - pd.Timestamp(row["date_min_val_easily"]).floor("D")
+        ).days
+        if pd.notna(row["date_diffusion_optimale"])
+        else None,
+        axis=1,
+    )
+    df_merge = df_merge[df_merge["diff_validation_easily_sortie_easily"] >= -3]
+
+    datetime_columns = ["date_sortie_easily", "date_envoi_lifen", "date_diffusion_easily", "date_min_val_easily"]
+    df_merge[datetime_columns] = df_merge[datetime_columns].apply(lambda x: x.dt.strftime("%d/%m/%Y"))
+    return df_merge
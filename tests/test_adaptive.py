@@ -0,0 +1,66 @@
+from adaptive import ADAPTIVE_ROW_HEADROOM, AimdController
+
+
+def make_controller(**kwargs):
+    options = {
+        "initial": 100,
+        "minimum": 10,
+        "maximum": 1000,
+        "step": 50,
+        "target_seconds": 5,
+        "row_limit": 3000,
+    }
+    options.update(kwargs)
+    return AimdController("test", **options)
+
+
+def test_grows_additively_under_target():
+    controller = make_controller()
+    controller.record(100, 100, 1.0)
+    assert controller.next_size() == 150
+
+
+def test_shrinks_over_target_latency():
+    controller = make_controller()
+    controller.record(100, 100, 10.0)
+    assert controller.next_size() == 50
+
+
+def test_shrinks_when_row_limit_reached():
+    controller = make_controller(initial=400)
+    controller.record(400, 3000, 1.0)
+    assert controller.next_size() <= 200
+
+
+def test_growth_capped_by_observed_rows_per_item():
+    # 10 documents par venue : au plus 3000 × marge / 10 venues par lot, quelle que soit la latence
+    controller = make_controller(initial=200, step=500)
+    controller.record(200, 2000, 0.1)
+    assert controller.next_size() == int(3000 * ADAPTIVE_ROW_HEADROOM / 10)
+    assert controller.next_size() * controller.rows_per_item < 3000
+
+
+def test_failure_halves_size():
+    controller = make_controller()
+    controller.record_failure(100, "timeout")
+    assert controller.next_size() == 50
+
+
+def test_size_stays_within_bounds():
+    controller = make_controller(initial=20)
+    for _ in range(5):
+        controller.record_failure(controller.next_size(), "timeout")
+    assert controller.next_size() == 10
+    controller = make_controller(row_limit=None, initial=990)
+    controller.record(990, 0, 0.01)
+    assert controller.next_size() == 1000
+
+
+def test_state_reports_density_and_latency():
+    controller = make_controller()
+    assert controller.state()["rows_per_item"] is None
+    controller.record(100, 500, 2.0)
+    state = controller.state()
+    assert state["rows_per_item"] == 5
+    assert state["seconds_per_item"] == 0.02
+    assert state["size"] == controller.next_size()
@@ -0,0 +1,45 @@
+from datetime import date
+
+import pandas as pd
+from business_days import business_days_between, easter_sunday, french_holidays, holiday_calendar
+
+
+def test_easter_sunday():
+    assert easter_sunday(2024) == date(2024, 3, 31)
+    assert easter_sunday(2025) == date(2025, 4, 20)
+    assert easter_sunday(2038) == date(2038, 4, 25)
+
+
+def test_easter_holidays():
+    holidays = french_holidays(2025)
+    assert date(2025, 4, 21) in holidays  # Lundi de Pâques
+    assert date(2025, 5, 29) in holidays  # Ascension
+    assert date(2025, 6, 9) in holidays  # Lundi de Pentecôte
+    assert date(2025, 4, 18) not in holidays  # Vendredi saint, Alsace-Moselle seulement
+    assert len(holidays) == 11
+
+
+def test_alsace_moselle_holidays():
+    holidays = french_holidays(2025, "alsace-moselle")
+    assert date(2025, 4, 18) in holidays  # Vendredi saint
+    assert date(2025, 12, 26) in holidays  # Saint-Étienne
+    assert set(french_holidays(2025)) < set(holidays)
+    assert len(holidays) == 13
+
+
+def test_business_days_skip_easter_weekend():
+    # Jeudi 17 avril 2025 -> mardi 22 avril 2025
+    start = pd.Series(pd.to_datetime(["2025-04-17", "2025-04-22", None]))
+    end = pd.Series(pd.to_datetime(["2025-04-22", "2025-04-17", "2025-04-22"]))
+    result = business_days_between(start, end)
+    # Vendredi 18 (ouvré hors Alsace-Moselle) et mardi 22 ; lundi de Pâques et week-end exclus
+    assert result.tolist()[:2] == [2, -2]
+    assert pd.isna(result[2])
+
+
+def test_holiday_calendar_extra_days():
+    calendar = holiday_calendar(2025, 2025, "alsace-moselle", ["2025-08-14"])
+    assert calendar.dtype == "datetime64[D]"
+    days = set(calendar.astype(date))
+    assert {date(2025, 4, 18), date(2025, 8, 14), date(2025, 12, 26)} <= days
+    assert len(days) == 14
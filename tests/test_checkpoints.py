@@ -0,0 +1,53 @@
+import os
+import time
+
+from checkpoints import ChunkCheckpoints, request_checkpoints
+
+
+def test_save_and_resume(tmp_path):
+    checkpoints = ChunkCheckpoints(tmp_path / "req")
+    checkpoints.save("2024-01-01", "2024-01-07", [{"id_doc_lifen": "a"}])
+    checkpoints.save("2024-01-15", "2024-01-20", [])
+
+    assert checkpoints.starting_at("2024-01-01") == ("2024-01-07", [{"id_doc_lifen": "a"}])
+    assert checkpoints.starting_at("2024-01-08") is None
+    assert checkpoints.next_start_after("2024-01-08") == "2024-01-15"
+    assert checkpoints.next_start_after("2024-01-15") is None
+    assert list((tmp_path / "req").glob("*.tmp")) == []
+
+
+def test_stale_checkpoints_are_ignored(tmp_path):
+    checkpoints = ChunkCheckpoints(tmp_path, max_age_hours=1)
+    checkpoints.save("2024-01-01", "2024-01-07", [{"id_doc_lifen": "a"}])
+    two_hours_ago = time.time() - 7200
+    os.utime(tmp_path / "2024-01-01_2024-01-07.json", (two_hours_ago, two_hours_ago))
+
+    assert checkpoints.load("2024-01-01", "2024-01-07") is None
+    assert checkpoints.starting_at("2024-01-01") is None
+
+
+def test_clear_waits_for_the_last_identical_request(tmp_path):
+    first = ChunkCheckpoints(tmp_path / "req")
+    second = ChunkCheckpoints(tmp_path / "req")
+
+    with first, second:
+        first.save("2024-01-01", "2024-01-07", [])
+        # L'autre requête utilise encore le dossier : il est conservé
+        assert not first.clear()
+        assert second.starting_at("2024-01-01") == ("2024-01-07", [])
+        with second:
+            pass
+        assert not first.clear()
+
+    with second:
+        assert second.clear()
+    assert not (tmp_path / "req").exists()
+
+
+def test_request_checkpoints_are_keyed_by_parameters():
+    first = request_checkpoints({"start_date": "2024-01-01", "end_date": "2024-03-31"})
+    same = request_checkpoints({"end_date": "2024-03-31", "start_date": "2024-01-01"})
+    other = request_checkpoints({"start_date": "2024-01-01", "end_date": "2024-03-31", "fields": ["num_sej"]})
+
+    assert first.directory == same.directory
+    assert first.directory != other.directory
@@ -0,0 +1,269 @@
+import random
+import re
+import sqlite3
+
+import pytest
+from dimension_cache import CR_DOSS_SPE_SQL, USIR_DOSSIER, USIR_FORMULAIRE, DimensionCache, sql_key
+
+# Tables de référence Easily, reproduites dans SQLite avec une collation insensible à la casse et aux espaces
+# finaux comme celle de SQL Server
+TABLES = {
+    "Uf": ["uf_code", "fk_cr_id"],
+    "CENTRE_RESPONSABILITE": ["cr_id", "cr_code", "cr_libelle_long", "cr_libelle_court"],
+    "FORMULAIRE_SELECTION": ["formulaire_selection_id", "formulaire_id", "fos_libelle"],
+    "FORMULAIRE": ["formulaire_id", "type_document_code", "for_courrier"],
+    "DOSSIER_SPECIALITE": ["dossier_specialite_id", "dos_libelle_court"],
+    "CENTRE_RESPONSABILITE_SPECIALITE": ["specialite_code", "centre_responsabilite_code"],
+    "DOSSIER_SPECIALITE_SPECIALITE": ["dossier_specialite_id", "specialite_code"],
+    "facts": ["id", "uf_der_pass", "fic_cr_code", "fic_dossier_specialite_id", "fic_formulaire_selection_id"],
+}
+INTEGER_COLUMNS = {"id", "fk_cr_id", "cr_id", "formulaire_selection_id", "formulaire_id", "for_courrier"}
+INTEGER_COLUMNS |= {"dossier_specialite_id", "fic_dossier_specialite_id", "fic_formulaire_selection_id"}
+
+# Noms qualifiés SQL Server (base.schéma.table) des requêtes du cache
+QUALIFIED_NAME = re.compile(r"\[?\w+\]?\.\[?\w+\]?\.\[?(\w+)\]?")
+
+# Jointures et filtres de la requête complète d'origine (execute_query), restreints aux tables de référence :
+# cr3 en LEFT JOIN et fo en LEFT JOIN filtré par le WHERE pour les fiches avec venue, INNER JOIN sans venue
+REFERENCE_QUERY = """
+SELECT f.id, cr.{cr_der_sej}, cr3.cr_libelle_long, dfs.fos_libelle, ds.dos_libelle_court, {cr_doss_spe}
+FROM facts f
+    LEFT JOIN Uf uf ON f.uf_der_pass = uf.uf_code
+    INNER JOIN CENTRE_RESPONSABILITE cr ON cr.cr_id = uf.fk_cr_id
+    {cr3_join} JOIN CENTRE_RESPONSABILITE cr3 ON cr3.cr_code = f.fic_cr_code
+    LEFT JOIN DOSSIER_SPECIALITE ds ON ds.dossier_specialite_id = f.fic_dossier_specialite_id
+    INNER JOIN FORMULAIRE_SELECTION dfs ON f.fic_formulaire_selection_id = dfs.formulaire_selection_id
+        AND dfs.fos_libelle NOT LIKE '%HDJ%'
+        AND dfs.fos_libelle NOT LIKE '%extraction%'
+    {fo_join}
+    LEFT JOIN DOSSIER_SPECIALITE_SPECIALITE dss ON dss.dossier_specialite_id = ds.dossier_specialite_id
+    LEFT JOIN CENTRE_RESPONSABILITE_SPECIALITE crs ON crs.specialite_code = dss.specialite_code
+    LEFT JOIN CENTRE_RESPONSABILITE cr4 ON cr4.cr_code = crs.centre_responsabilite_code
+WHERE
+    (
+        cr.cr_libelle_long = cr3.cr_libelle_long
+        OR cr.cr_libelle_long = cr4.cr_libelle_long
+        OR (cr.cr_libelle_long = 'NEUROCHIRURGIE' AND ds.dos_libelle_court = 'NRDT Foch')
+        OR (cr.cr_libelle_long = 'ANESTHESIE' AND ds.dos_libelle_court = 'Obstétrique')
+    )
+    AND ((fo.type_document_code IN ('00209')) OR (fo.type_document_code = '00082'
+    AND f.uf_der_pass IN ('290A', '294U')))
+"""
+PART_JOINS = {
+    True: {
+        "cr_der_sej": "cr_libelle_long",
+        "cr3_join": "LEFT",
+        "fo_join": "LEFT JOIN FORMULAIRE fo ON dfs.formulaire_id = fo.formulaire_id"
+        " AND (fo.type_document_code = '00209' OR fo.type_document_code = '00082') AND for_courrier = 1",
+    },
+    False: {
+        "cr_der_sej": "cr_libelle_court",
+        "cr3_join": "INNER",
+        "fo_join": "INNER JOIN FORMULAIRE fo ON dfs.formulaire_id = fo.formulaire_id"
+        " AND fo.type_document_code IN ('00209', '00082') AND for_courrier = 1",
+    },
+}
+
+REFERENCE_TABLES = {
+    "Uf": [("290A", 1), ("294U ", 2), ("101B", 1), ("101B", 3), ("102C", 4), ("103D", 5)],
+    "CENTRE_RESPONSABILITE": [
+        (1, "C1", "CARDIOLOGIE", "CARDIO"),
+        (2, "C2", "THORACIQUE", "THORAX"),
+        (3, "C3", "NEUROCHIRURGIE", "NCH"),
+        (4, "C4", "ANESTHESIE", "ANESTH"),
+        (5, "C5", "GERIATRIE", "GERIA"),
+        (6, "c2 ", "thoracique ", "THORAX 2"),
+    ],
+    "FORMULAIRE_SELECTION": [
+        (1, 1, "CR Lettre de Liaison Cardiologie Foch"),
+        (2, 2, "CR Lettre de Liaison Cardiologie Foch"),
+        (3, 1, USIR_FORMULAIRE),
+        (4, 1, "CR HDJ Oncologie Foch"),
+        (5, 1, "Lettre Extraction Foch"),
+        (6, 3, "CR Lettre de Liaison Gériatrie Foch"),
+        (7, 4, "CR Lettre de Liaison ORL Foch"),
+        (8, 1, "Lettre de liaison générique"),
+        (9, 9, "Formulaire sans définition"),
+        (10, 2, "Lettre de liaison générique 00082"),
+    ],
+    "FORMULAIRE": [(1, "00209", 1), (2, "00082", 1), (3, "00209", 0), (4, "00100", 1)],
+    "DOSSIER_SPECIALITE": [(1, "NRDT Foch"), (2, "Obstétrique"), (3, USIR_DOSSIER), (4, "Cardio")],
+    "CENTRE_RESPONSABILITE_SPECIALITE": [("S1", "C1"), ("S2", "C2"), ("S2", "C5"), ("S3", "CX")],
+    "DOSSIER_SPECIALITE_SPECIALITE": [(1, "S3"), (3, "S2"), (4, "S1"), (4, "s2 ")],
+}
+
+
+def sqlserver_collation(left, right):
+    left, right = sql_key(left), sql_key(right)
+    return (left > right) - (left < right)
+
+
+class EasilyCursor:
+    """Curseur sqlite3 qui accepte les noms qualifiés SQL Server des requêtes du cache"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query):
+        self._cursor.execute(QUALIFIED_NAME.sub(r"\1", query))
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class EasilyConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return EasilyCursor(self.db.cursor())
+
+
+def column_type(column):
+    return "INTEGER" if column in INTEGER_COLUMNS else "TEXT COLLATE SQLSERVER"
+
+
+def make_db(tables, facts=()):
+    db = sqlite3.connect(":memory:")
+    db.create_collation("SQLSERVER", sqlserver_collation)
+    # Les index automatiques de SQLite (filtre de Bloom) ignorent les collations personnalisées
+    db.execute("PRAGMA automatic_index = OFF")
+    for table, columns in TABLES.items():
+        definitions = ", ".join(f"{column} {column_type(column)}" for column in columns)
+        db.execute(f"CREATE TABLE {table} ({definitions})")
+        rows = facts if table == "facts" else tables.get(table, [])
+        db.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})", rows)
+    return db
+
+
+def make_cache(db):
+    cache = DimensionCache()
+    cache.load(EasilyConnection(db))
+    return cache
+
+
+def fact(fact_id, uf_der_pass, fic_cr_code, ds_id, fos_id):
+    return {
+        "id": fact_id,
+        "uf_der_pass": uf_der_pass,
+        "fic_cr_code": fic_cr_code,
+        "fic_dossier_specialite_id": ds_id,
+        "fic_formulaire_selection_id": fos_id,
+    }
+
+
+def resolved_rows(cache, facts, with_venue):
+    """Lignes (id de la fiche, attributs résolus) des fiches transmises par la requête de faits"""
+    eligible = set(cache.eligible_formulaire_selection_ids())
+    return {
+        (row["id"], *dimensions.values())
+        for row in facts
+        if row["fic_formulaire_selection_id"] in eligible
+        for dimensions in cache.resolve(row, with_venue)
+    }
+
+
+def reference_rows(db, with_venue):
+    query = REFERENCE_QUERY.format(cr_doss_spe=CR_DOSS_SPE_SQL, **PART_JOINS[with_venue])
+    return set(db.execute(query).fetchall())
+
+
+def random_facts(rng, count):
+    ufs = ["290A", "290a ", "294U", "101B", "101b", "102C", "103D", "999Z", None]
+    cr_codes = ["C1", "c1", "C2", "C3", "C4 ", "C5", "CX", None]
+    ds_ids = [1, 2, 3, 4, 5, None]
+    fos_ids = list(range(1, 11))
+    return [
+        fact(i, rng.choice(ufs), rng.choice(cr_codes), rng.choice(ds_ids), rng.choice(fos_ids)) for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("with_venue", [True, False])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_resolve_matches_reference_sql(seed, with_venue):
+    facts = random_facts(random.Random(seed), 400)
+    db = make_db(REFERENCE_TABLES, [tuple(row.values()) for row in facts])
+
+    expected = reference_rows(db, with_venue)
+
+    assert expected
+    assert resolved_rows(make_cache(db), facts, with_venue) == expected
+
+
+def test_cr3_is_left_joined_with_venue_only():
+    # Code CR de la fiche inconnu : conservée grâce à cr4 (CARDIOLOGIE) avec venue, écartée sans venue
+    cache = make_cache(make_db(REFERENCE_TABLES))
+    row = fact(1, "290A", "CX", 4, 1)
+
+    assert cache.resolve(row, True) == [
+        {
+            "cr_der_sej": "CARDIOLOGIE",
+            "CR_courrier": None,
+            "Type_courrier": "CR Lettre de Liaison Cardiologie Foch",
+            "Dos_Spe_ESL": "Cardio",
+            "CR_Doss_spe": "CARDIOLOGIE",
+        }
+    ]
+    assert cache.resolve(row, False) == []
+    # Sans venue, cr_der_sej est le libellé court
+    assert {r["cr_der_sej"] for r in cache.resolve(fact(1, "290A", "C1", 4, 1), False)} == {"CARDIO"}
+
+
+def test_usir_formulaire_depends_on_the_dossier():
+    cache = make_cache(make_db(REFERENCE_TABLES))
+
+    usir = cache.resolve(fact(1, "294U", "C2", 3, 3), True)
+    assert {row["CR_Doss_spe"] for row in usir} == {"THORACIQUE"}
+
+    # Autre dossier : pas de règle USIR, CR_Doss_spe vient de chaque CR cr4 du dossier 4
+    other = cache.resolve(fact(1, "294U", "C2", 4, 3), True)
+    assert {row["CR_Doss_spe"] for row in other} == {"CARDIOLOGIE", "THORACIQUE", "thoracique ", "GERIATRIE"}
+
+
+def test_00082_letters_only_for_units_290a_and_294u():
+    cache = make_cache(make_db(REFERENCE_TABLES))
+
+    # Formulaire 00082 : seulement pour les UF 290A / 294U (comparaison insensible à la casse et aux espaces)
+    assert cache.resolve(fact(1, "290a ", "C1", 4, 2), True)
+    assert cache.resolve(fact(1, "101B", "C1", 4, 2), True) == []
+    # Formulaire 00209 : toutes les UF
+    assert cache.resolve(fact(1, "101B", "C1", 4, 1), True)
+
+
+def test_neurochirurgie_and_anesthesie_exceptions():
+    cache = make_cache(make_db(REFERENCE_TABLES))
+
+    # Ni cr3 ni cr4 ne correspondent au CR du dernier passage, seule l'exception du dossier le retient
+    assert [r["cr_der_sej"] for r in cache.resolve(fact(1, "101B", "CX", 1, 8), True)] == ["NEUROCHIRURGIE"]
+    assert [r["cr_der_sej"] for r in cache.resolve(fact(1, "102C", "CX", 2, 8), True)] == ["ANESTHESIE"]
+    assert cache.resolve(fact(1, "102C", "CX", 1, 8), True) == []
+
+
+def test_eligible_formulaires_exclude_hdj_extractions_and_non_letters():
+    cache = make_cache(make_db(REFERENCE_TABLES))
+
+    # 4 : HDJ, 5 : extraction, 6 : for_courrier = 0, 7 : type 00100, 9 : formulaire inconnu
+    assert cache.eligible_formulaire_selection_ids() == [1, 2, 3, 8, 10]
+    # Filtre de spécialités : seuls les libellés fixant une autre spécialité sont écartés d'avance
+    assert cache.eligible_formulaire_selection_ids(["ORL"]) == [3, 8, 10]
+    assert cache.eligible_formulaire_selection_ids(["cardiologie "]) == [1, 2, 3, 8, 10]
+
+
+def test_resolve_part_keeps_distinct_rows_up_to_the_limit():
+    cache = make_cache(make_db(REFERENCE_TABLES))
+    columns = ["id", "CR_Doss_spe"]
+    facts = [fact(i // 2, "290A", "C1", 4, 1) for i in range(20)]  # chaque fiche en double
+
+    part = cache.resolve_part(facts, True, columns, limit=5)
+    assert part == [{"id": i, "CR_Doss_spe": "CARDIOLOGIE"} for i in range(5)]
+    assert len(cache.resolve_part(facts, True, columns)) == 10
+
+    # Filtre de spécialités appliqué avant la limite, comme le WHERE de la requête : chaque fiche donne
+    # quatre spécialités cr4, dont deux variantes de THORACIQUE
+    mixed = [fact(i, "294U", "C2", 4, 8) for i in range(10)]
+    thoracique = cache.resolve_part(mixed, True, columns, specialites=["THORACIQUE"], limit=4)
+    assert [row["id"] for row in thoracique] == [0, 0, 1, 1]
+    assert {sql_key(row["CR_Doss_spe"]) for row in thoracique} == {"thoracique"}
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+from reconciliation import MATCH_TOLERANCE, reconcile, service_stats
+from reconciliation_fixtures import make_frames
+
+duckdb_engine = pytest.importorskip("duckdb_engine")
+
+
+@pytest.mark.parametrize("tolerance", [None, MATCH_TOLERANCE, pd.Timedelta(days=5)])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_reconcile_sql_matches_pandas(seed, tolerance):
+    df_lifen, df_easily = make_frames(400, seed=seed)
+
+    expected = reconcile(df_lifen, df_easily, tolerance).reset_index(drop=True)
+    result = duckdb_engine.reconcile_sql(df_lifen, df_easily, tolerance).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_service_stats_sql_matches_pandas():
+    facts = reconcile(*make_frames(600, seed=2), tolerance=None)
+
+    pd.testing.assert_frame_equal(duckdb_engine.service_stats_sql(facts), service_stats(facts))
+
+
+def test_large_gaps_sql_matches_pandas():
+    facts = reconcile(*make_frames(300, seed=3), tolerance=None)
+
+    result = duckdb_engine.large_gaps_sql(facts, 5)
+    expected = facts[facts["diff_date_diffusion_sortie"] > 5]
+
+    assert result["num_sej"].tolist() == expected["num_sej"].tolist()
@@ -0,0 +1,33 @@
+import threading
+
+from fetch import FetchRun
+
+
+def test_identical_calls_are_issued_once():
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(venues, filters):
+        with lock:
+            calls.append((tuple(venues), tuple(sorted(filters))))
+        return len(venues)
+
+    with FetchRun() as run:
+        first = run.submit("Lifen", fetch, [1, 2, 3], {"statut_envoi": ["Réussite"]})
+        same = run.submit("Lifen", fetch, [1, 2, 3], {"statut_envoi": ["Réussite"]})
+        other = run.submit("Lifen", fetch, [1, 2], {"statut_envoi": ["Réussite"]})
+
+    assert same is first
+    assert other is not first
+    assert (first.result(), other.result()) == (3, 2)
+    assert len(calls) == 2
+    assert set(run.timings) == {"Lifen"}
+
+
+def test_set_arguments_match_regardless_of_order():
+    with FetchRun() as run:
+        first = run.submit("Easily", sorted, {3, 1, 2})
+        same = run.submit("Easily", sorted, {2, 3, 1})
+
+    assert same is first
+    assert first.result() == [1, 2, 3]
@@ -0,0 +1,50 @@
+import time
+
+import jobs
+
+
+def wait_for(job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.load_job(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} non terminé")
+
+
+def test_failed_chunks_are_the_only_ones_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "LIFEN_JOBS_DIR", tmp_path)
+    monkeypatch.setattr(jobs, "retry_call", lambda _label, func, *args: func(*args))
+    calls = []
+
+    def flaky_fetch(chunk_start, chunk_end):
+        calls.append(chunk_start)
+        if chunk_start == "2024-01-08" and calls.count(chunk_start) == 1:
+            raise RuntimeError("timeout")
+        return [{"id_doc_lifen": chunk_start}]
+
+    chunks = [("2024-01-01", "2024-01-07"), ("2024-01-08", "2024-01-14")]
+    job = jobs.submit_job({}, chunks, flaky_fetch, list, "alice")
+    job = wait_for(job["job_id"])
+    assert job["status"] == "failed"
+    assert [chunk["start"] for chunk in job["failed_chunks"]] == ["2024-01-08"]
+
+    jobs.retry_job(job, flaky_fetch, list)
+    job = wait_for(job["job_id"])
+    assert job["status"] == "done"
+    assert calls == ["2024-01-01", "2024-01-08", "2024-01-08"]
+    assert jobs.read_result(job["job_id"]) == [{"id_doc_lifen": "2024-01-01"}, {"id_doc_lifen": "2024-01-08"}]
+
+
+def test_interrupted_jobs_are_marked_failed_at_startup(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "LIFEN_JOBS_DIR", tmp_path)
+    for job_id, status in (("running1", "running"), ("queued1", "queued"), ("done1", "done")):
+        (tmp_path / job_id / "chunks").mkdir(parents=True)
+        jobs._save_job({"job_id": job_id, "status": status, "error": None})
+
+    assert sorted(jobs.recover_interrupted_jobs()) == ["queued1", "running1"]
+    assert jobs.load_job("running1")["status"] == "failed"
+    assert jobs.load_job("queued1")["error"]
+    assert jobs.load_job("done1")["status"] == "done"
+    assert jobs.recover_interrupted_jobs() == []
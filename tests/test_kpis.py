@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from kpis import distribution, month_distribution
+from lifen_kpis import KPI_DIMENSIONS, LifenKpis, histogram_median
+
+
+def easily_groups():
+    # Groupes au format de /api/patients/comptes-rendus/kpis (un par année × mois × spécialité × canal)
+    return pd.DataFrame(
+        {
+            "annee": [2024, 2024, 2024, 2025, 2024],
+            "mois_num": [2, 4, 12, 1, 4],
+            "mois": ["February", "April", "December", "January", "April"],
+            "specialite": ["Cardiologie", "Gériatrie", "Cardiologie", "Gériatrie", "Gériatrie"],
+            "canal": ["Envoyé", "Envoyé", "Envoyé", "Envoyé", None],
+            "nb_lignes": [2, 1, 1, 1, 1],
+        }
+    )
+
+
+def test_months_are_listed_chronologically():
+    months = month_distribution(easily_groups(), "nb_lignes", ["Mois", "Nombre"])
+
+    assert months["Mois"].tolist() == ["February 2024", "April 2024", "December 2024", "January 2025"]
+    assert months["Nombre"].tolist() == [2, 2, 1, 1]
+
+
+def test_distribution_sums_groups():
+    specialites = distribution(easily_groups(), "specialite", "nb_lignes", ["Spécialité", "Nombre"])
+
+    assert specialites.values.tolist() == [["Cardiologie", 3], ["Gériatrie", 3]]
+
+
+def test_histogram_median_matches_pandas():
+    for values in ([3, 1, 4, 1, 5, 9, 2, 6], [7], [2, 2, 5]):
+        histogram = pd.Series(values).value_counts().to_dict()
+        assert histogram_median(histogram) == pd.Series(values).median()
+    assert histogram_median({}) is None
+
+
+def documents(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    sortie = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 90, n), unit="D")
+    envoi = sortie + pd.to_timedelta(rng.integers(-2, 30, n), unit="D")
+    return pd.DataFrame(
+        {
+            "num_sej": rng.integers(1, 600, n),
+            "mois": envoi.strftime("%Y-%m"),
+            "service": rng.choice(["A", "B", None], n),
+            "canal_envoi": rng.choice(["Mail", "Courrier", "DMP"], n),
+            "statut_envoi": rng.choice(["Réussite", "Échec"], n),
+            "role_destinataire": rng.choice(["Patient", "Médecin traitant"], n),
+            "delai_envoi_sortie": (envoi - sortie).days.where(rng.random(n) > 0.05),
+        }
+    )
+
+
+def oracle_batch_rows(batch):
+    """Lignes qu'Oracle renvoie pour un lot avec GROUPING SETS ((dims), (dims, délai), ())"""
+    dimensions = list(KPI_DIMENSIONS)
+    rows = [{"total": 1, "sans_delai": 1, "nb_diffusions": len(batch), "nb_sejours": batch["num_sej"].nunique()}]
+    for keys, with_delay in ((dimensions, 1), (dimensions + ["delai_envoi_sortie"], 0)):
+        grouped = batch.groupby(keys, dropna=False)["num_sej"].agg(nb_diffusions="size", nb_sejours="nunique")
+        for row in grouped.reset_index().to_dict("records"):
+            row = {key: (None if pd.isna(value) else value) for key, value in row.items()}
+            rows.append({"delai_envoi_sortie": None, **row, "total": 0, "sans_delai": with_delay})
+    return rows
+
+
+def test_batches_merge_to_row_level_indicators():
+    docs = documents()
+    kpis = LifenKpis()
+    # Lots de séjours distincts, comme query_kpi_batches
+    for _, batch in docs.groupby(docs["num_sej"] // 100):
+        kpis.add_rows(oracle_batch_rows(batch))
+    result = kpis.result()
+
+    delais = docs["delai_envoi_sortie"]
+    assert result["totals"] == {
+        "nb_diffusions": len(docs),
+        "nb_sejours": docs["num_sej"].nunique(),
+        "nb_reussites": int((docs["statut_envoi"] == "Réussite").sum()),
+        "delai_envoi_sortie_moyen": delais.mean(),
+        "delai_envoi_sortie_median": delais.median(),
+    }
+
+    # Service absent : même clé des deux côtés (une valeur manquante ne se recherche pas dans un MultiIndex)
+    groups = pd.DataFrame(result["groups"]).fillna({"service": "-"}).set_index(list(KPI_DIMENSIONS))
+    expected = (
+        docs.fillna({"service": "-"})
+        .groupby(list(KPI_DIMENSIONS))
+        .agg(
+            nb_diffusions=("num_sej", "size"),
+            nb_sejours=("num_sej", "nunique"),
+            delai_envoi_sortie_moyen=("delai_envoi_sortie", "mean"),
+            delai_envoi_sortie_median=("delai_envoi_sortie", "median"),
+        )
+    )
+    assert result["groups"][-1]["service"] is None
+    assert len(groups) == len(expected)
+    groups = groups.loc[expected.index]
+    assert (groups[["nb_diffusions", "nb_sejours"]] == expected[["nb_diffusions", "nb_sejours"]]).all().all()
+    assert np.allclose(groups["delai_envoi_sortie_moyen"], expected["delai_envoi_sortie_moyen"])
+    assert (groups["delai_envoi_sortie_median"] == expected["delai_envoi_sortie_median"]).all()
@@ -0,0 +1,52 @@
+import progress
+import pytest
+from progress import get_progress, start_progress
+
+
+def test_progress_is_only_visible_to_its_owner():
+    tracker = start_progress("req-owner", "alice")
+
+    assert get_progress("req-owner", "alice") is tracker
+    assert get_progress("req-owner", "bob") is None
+    assert get_progress("req-unknown", "alice") is None
+
+
+def test_progress_cannot_be_taken_over_by_another_user():
+    tracker = start_progress("req-taken", "alice")
+
+    with pytest.raises(PermissionError):
+        start_progress("req-taken", "bob")
+    assert get_progress("req-taken", "alice") is tracker
+
+    # Le même utilisateur peut relancer une requête avec son identifiant
+    assert start_progress("req-taken", "alice") is not tracker
+
+
+def test_snapshot_counts_and_eta():
+    tracker = start_progress("req-eta", "alice")
+    tracker.add_units(4)
+    tracker.unit_done(10, 2.0)
+    tracker.unit_done(30, 4.0)
+
+    snapshot = tracker.snapshot()
+
+    assert snapshot["chunks_done"] == 2
+    assert snapshot["chunks_remaining"] == 2
+    assert snapshot["rows"] == 40
+    assert snapshot["mean_chunk_seconds"] == 3.0
+    assert snapshot["eta_seconds"] == 6.0
+
+    tracker.set_remaining(1)
+    tracker.finish()
+    assert tracker.snapshot()["chunks_total"] == 3
+    assert tracker.snapshot()["status"] == "done"
+
+
+def test_oldest_trackers_are_evicted(monkeypatch):
+    monkeypatch.setattr(progress, "PROGRESS_MAX_ENTRIES", 2)
+    start_progress("req-1", "alice")
+    start_progress("req-2", "alice")
+    start_progress("req-3", "alice")
+
+    assert get_progress("req-1", "alice") is None
+    assert get_progress("req-3", "alice") is not None
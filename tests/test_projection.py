@@ -0,0 +1,20 @@
+import pytest
+from projection import parse_fields
+
+AVAILABLE = ["id_doc_lifen", "num_sej", "canal_envoi", "statut_envoi", "date_envoi"]
+
+
+def test_no_projection_without_fields():
+    assert parse_fields(None, AVAILABLE) is None
+    assert parse_fields("  ", AVAILABLE) is None
+
+
+def test_fields_follow_available_order_and_include_required():
+    fields = parse_fields(" statut_envoi,num_sej ,statut_envoi", AVAILABLE, required=("id_doc_lifen",))
+
+    assert fields == ["id_doc_lifen", "num_sej", "statut_envoi"]
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError, match="inconnues"):
+        parse_fields("num_sej,mot_de_passe", AVAILABLE)
@@ -0,0 +1,172 @@
+import pandas as pd
+import pytest
+from reconciliation import ReconciliationError, reconcile, service_stats
+from reconciliation_fixtures import baseline_reconcile, make_frames
+
+COMPARED_COLUMNS = [
+    "ipp",
+    "num_sej",
+    "source_optimale",
+    "date_sortie_easily",
+    "date_envoi_lifen",
+    "date_diffusion_easily",
+    "date_min_val_easily",
+    "specialite_easily",
+    "diff_date_diffusion_sortie",
+    "diff_validation_easily_sortie_easily",
+    "delai_envoi_validation",
+]
+TEXT_COLUMNS = [
+    "source_optimale",
+    "date_sortie_easily",
+    "date_envoi_lifen",
+    "date_diffusion_easily",
+    "date_min_val_easily",
+    "specialite_easily",
+]
+
+
+def comparable(df):
+    """Colonnes communes aux deux versions, types neutres et ordre fixe"""
+    df = df[COMPARED_COLUMNS].copy()
+    df[["ipp", "num_sej"]] = df[["ipp", "num_sej"]].astype("int64")
+    df[TEXT_COLUMNS] = df[TEXT_COLUMNS].astype(object).where(df[TEXT_COLUMNS].notna(), None).astype(str)
+    for column in ["diff_date_diffusion_sortie", "diff_validation_easily_sortie_easily", "delai_envoi_validation"]:
+        df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+    return df.sort_values(["num_sej", "date_diffusion_easily", "date_min_val_easily"]).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_reconcile_matches_row_by_row_baseline(seed):
+    df_lifen, df_easily = make_frames(300, seed=seed)
+
+    expected = comparable(baseline_reconcile(df_lifen, df_easily))
+    result = comparable(reconcile(df_lifen, df_easily, tolerance=None))
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_single_available_date_keeps_source_aucune():
+    # Séjour sans date de diffusion Easily : la date Lifen seule ne suffit pas, la source reste "Aucune"
+    # (comportement historique de l'indicateur, conservé par la version vectorisée)
+    df_lifen, df_easily = make_frames(20, seed=3)
+    df_easily.loc[df_easily["Num_Venue"] == df_easily["Num_Venue"].iloc[0], "Date diffusion"] = None
+    df_easily["date_min_val"] = df_easily["sej_date_sortie"]
+
+    facts = reconcile(df_lifen, df_easily, tolerance=None)
+    baseline = baseline_reconcile(df_lifen, df_easily)
+
+    sejour = df_easily["Num_Venue"].iloc[0]
+    rows = facts[facts["num_sej"] == sejour]
+    assert set(rows["source_optimale"]) == {"Aucune"}
+    assert rows["diff_date_diffusion_sortie"].isna().all()
+    assert set(baseline.loc[baseline["num_sej"] == sejour, "source_optimale"]) == {"Aucune"}
+
+
+def test_lifen_wins_ties_with_easily():
+    df_lifen, df_easily = make_frames(1, seed=4)
+    df_easily = df_easily.iloc[:1].copy()
+    sortie = pd.Timestamp(df_easily["sej_date_sortie"].iloc[0])
+    df_easily["date_min_val"] = df_easily["sej_date_sortie"]
+    df_easily["Date diffusion"] = (sortie + pd.Timedelta(days=2)).strftime("%d/%m/%Y")
+    df_lifen = df_lifen[df_lifen["role_destinataire"] == "Patient"].copy()
+    df_lifen["date_envoi"] = (sortie - pd.Timedelta(days=2)).strftime("%Y-%m-%dT%H:%M:%S")
+
+    fact = reconcile(df_lifen, df_easily, tolerance=None).iloc[0]
+
+    assert fact["source_optimale"] == "Lifen"
+    assert fact["diff_date_diffusion_sortie"] == -2
+
+
+def multi_recipient_frames():
+    """Deux séjours à plusieurs envois au patient (et un envoi au médecin le jour de la sortie)"""
+    sortie = pd.Timestamp("2024-03-10")
+
+    def day(offset):
+        return sortie + pd.Timedelta(days=offset)
+
+    envois = [
+        (1001, "Patient", 9),
+        (1001, "Patient", -4),
+        (1001, "Patient", 2),
+        (1001, "Médecin", 0),
+        (1002, "Patient", 6),
+        (1002, "Patient", -8),
+    ]
+    df_lifen = pd.DataFrame(
+        {
+            "ipp": "42",
+            "num_sej": [str(sejour) for sejour, _, _ in envois],
+            "date_sortie": sortie.strftime("%Y-%m-%dT%H:%M:%S"),
+            "date_envoi": [day(offset).strftime("%Y-%m-%dT%H:%M:%S") for _, _, offset in envois],
+            "role_destinataire": [role for _, role, _ in envois],
+            "type_sej": "Cardiologie",
+        }
+    )
+    # Séjour 1001 : une fiche diffusée à J+5 ; séjour 1002 : deux fiches diffusées à J+1 et J+12
+    fiches = [(1001, 5), (1002, 1), (1002, 12)]
+    df_easily = pd.DataFrame(
+        {
+            "pat_IPP": 42,
+            "Num_Venue": [sejour for sejour, _ in fiches],
+            "ven_theo": [sejour for sejour, _ in fiches],
+            "sej_date_entree": day(-5).strftime("%Y-%m-%dT%H:%M:%S"),
+            "sej_date_sortie": sortie.strftime("%Y-%m-%dT%H:%M:%S"),
+            "CR_Doss_spe": "Cardiologie",
+            "date_min_val": sortie.strftime("%Y-%m-%dT%H:%M:%S"),
+            "LL_J0": 0,
+            "Date diffusion": [day(offset).strftime("%d/%m/%Y") for _, offset in fiches],
+            "fiche_id": [1, 2, 3],
+        }
+    )
+    return df_lifen, df_easily
+
+
+def test_multi_recipient_sejours_pick_the_closest_envoi():
+    df_lifen, df_easily = multi_recipient_frames()
+
+    facts = reconcile(df_lifen, df_easily, tolerance=None).set_index("num_sej")
+    baseline = baseline_reconcile(df_lifen, df_easily).set_index("num_sej")
+
+    # 1001 : l'envoi au patient à J+2 (pas celui au médecin à J0) est plus proche que la diffusion Easily à J+5
+    sejour = facts.loc[1001]
+    assert (sejour["source_optimale"], sejour["date_envoi_lifen"]) == ("Lifen", "12/03/2024")
+    assert sejour["diff_date_diffusion_sortie"] == 2
+
+    # 1002 : la diffusion Easily à J+1 bat les envois à J+6 et J-8 ; l'envoi Lifen retenu est le plus proche
+    rows = facts.loc[[1002]]
+    assert set(rows["source_optimale"]) == {"Easily"}
+    assert set(rows["date_envoi_lifen"]) == {"16/03/2024"}
+    assert set(rows["diff_date_diffusion_sortie"]) == {1}
+
+    # Même source et même délai que la version ligne à ligne (qui ne fixe pas l'envoi en cas d'égalité)
+    for num_sej in (1001, 1002):
+        assert set(baseline.loc[[num_sej], "source_optimale"]) == set(facts.loc[[num_sej], "source_optimale"])
+        assert set(baseline.loc[[num_sej], "diff_date_diffusion_sortie"]) == set(
+            facts.loc[[num_sej], "diff_date_diffusion_sortie"]
+        )
+    assert baseline.loc[1001, "date_envoi_lifen"] == "12/03/2024"
+
+
+def test_no_patient_envoi_raises():
+    df_lifen, df_easily = make_frames(10)
+    df_lifen["role_destinataire"] = "Médecin"
+
+    with pytest.raises(ReconciliationError):
+        reconcile(df_lifen, df_easily)
+
+
+def test_service_stats_matches_per_service_loop():
+    facts = reconcile(*make_frames(500, seed=5), tolerance=None)
+
+    stats = service_stats(facts).set_index("Service")
+
+    for service, group in facts.groupby("specialite_easily", observed=True):
+        validees = group[group["diff_validation_easily_sortie_easily"] == 0]
+        row = stats.loc[service]
+        assert row["Total LL"] == len(group)
+        assert row["LL validées J0"] == len(validees)
+        assert row["% LL validées J0"] == pytest.approx(len(validees) / len(group) * 100)
+        assert row["Délai médian global (j)"] == pytest.approx(group["diff_date_diffusion_sortie"].median())
+        assert row["Délai moyen LL J0 (j)"] == pytest.approx(validees["diff_date_diffusion_sortie"].mean(), nan_ok=True)
+    assert stats["% LL validées J0"].is_monotonic_decreasing
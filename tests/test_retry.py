@@ -0,0 +1,68 @@
+import pytest
+import retry
+from retry import CompletenessReport, backoff_delay, retry_call
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+
+
+def flaky(failures):
+    calls = []
+
+    def func(value):
+        calls.append(value)
+        if len(calls) <= failures:
+            raise RuntimeError(f"échec {len(calls)}")
+        return value * 2
+
+    return func, calls
+
+
+def test_retry_call_returns_after_transient_failures():
+    func, calls = flaky(2)
+
+    assert retry_call("test", func, 21, attempts=3) == 42
+    assert calls == [21, 21, 21]
+
+
+def test_retry_call_raises_last_error_after_all_attempts():
+    func, calls = flaky(5)
+
+    with pytest.raises(RuntimeError, match="échec 3"):
+        retry_call("test", func, 1, attempts=3)
+    assert len(calls) == 3
+
+
+def test_single_attempt_does_not_retry():
+    func, calls = flaky(1)
+
+    with pytest.raises(RuntimeError):
+        retry_call("test", func, 1, attempts=1)
+    assert len(calls) == 1
+
+
+def test_backoff_delay_is_bounded(monkeypatch):
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+
+    assert backoff_delay(0) == retry.RETRY_BASE_DELAY
+    assert backoff_delay(2) == min(retry.RETRY_MAX_DELAY, retry.RETRY_BASE_DELAY * 4)
+    assert backoff_delay(50) == retry.RETRY_MAX_DELAY
+
+
+def test_completeness_report_headers():
+    report = CompletenessReport()
+    report.add_units(3)
+    report.unit_resumed()
+    assert report.complete
+
+    report.unit_failed("chunk 2024-01-01 → 2024-01-07", "timeout")
+
+    assert not report.complete
+    assert report.headers() == {
+        "X-Lifen-Complete": "false",
+        "X-Lifen-Units-Total": "3",
+        "X-Lifen-Units-Failed": "1",
+        "X-Lifen-Units-Resumed": "1",
+    }
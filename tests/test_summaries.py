@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from summaries import (
+    MESURE_GLOBALE,
+    MESURE_J0,
+    build_summaries,
+    global_stats_from_summaries,
+    histogram_quantile,
+    merge_summaries,
+    service_stats_from_summaries,
+)
+
+
+def make_facts(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    sortie = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 180, n), unit="D")
+    return pd.DataFrame(
+        {
+            "date_sortie_easily": sortie.strftime("%d/%m/%Y"),
+            "specialite_easily": rng.choice(["Cardiologie", "Chirurgie", "Pédiatrie"], n),
+            "diff_date_diffusion_sortie": rng.integers(-5, 40, n).astype(float),
+            "diff_validation_easily_sortie_easily": rng.integers(0, 3, n),
+        }
+    )
+
+
+def test_histogram_quantile_matches_pandas():
+    values = pd.Series([3, 1, 4, 1, 5, 9, 2, 6])
+    jours, effectifs = np.unique(values, return_counts=True)
+    for q in (0.1, 0.25, 0.5, 0.9):
+        assert histogram_quantile(jours, effectifs, q) == values.quantile(q)
+    assert np.isnan(histogram_quantile(jours, np.zeros_like(effectifs), 0.5))
+
+
+def test_merged_months_median_equals_median_over_all_rows():
+    facts = make_facts()
+    months = pd.to_datetime(facts["date_sortie_easily"], format="%d/%m/%Y").dt.strftime("%Y-%m")
+    # Résumés construits mois par mois, puis fusionnés
+    summaries = pd.concat([build_summaries(facts[months == month]) for month in months.unique()])
+    merged = merge_summaries(summaries)
+
+    displayed = facts[facts["diff_date_diffusion_sortie"] >= -3]
+    delais = displayed["diff_date_diffusion_sortie"]
+    stats = global_stats_from_summaries(merged)
+    assert stats["n"] == len(displayed)
+    assert stats["mediane"] == delais.median()
+    assert np.isclose(stats["moyenne"], delais.mean())
+    assert (stats["min"], stats["max"]) == (delais.min(), delais.max())
+
+    j0 = displayed[displayed["diff_validation_easily_sortie_easily"] == 0]["diff_date_diffusion_sortie"]
+    assert global_stats_from_summaries(merged, MESURE_J0)["mediane"] == j0.median()
+
+
+def test_service_stats_match_row_level_medians():
+    facts = make_facts(seed=1)
+    merged = merge_summaries(build_summaries(facts), months=["2025-02", "2025-03", "2025-04"])
+    stats = service_stats_from_summaries(merged).set_index("Service")
+
+    mois = pd.to_datetime(facts["date_sortie_easily"], format="%d/%m/%Y").dt.strftime("%Y-%m")
+    displayed = facts[(facts["diff_date_diffusion_sortie"] >= -3) & mois.isin(["2025-02", "2025-03", "2025-04"])]
+    for service, rows in displayed.groupby("specialite_easily"):
+        assert stats.loc[service, "Total LL"] == len(rows)
+        assert stats.loc[service, "Délai médian global (j)"] == rows["diff_date_diffusion_sortie"].median()
+        j0 = rows[rows["diff_validation_easily_sortie_easily"] == 0]
+        assert stats.loc[service, "Délai médian LL J0 (j)"] == j0["diff_date_diffusion_sortie"].median()
+
+
+def test_merge_filters_months_and_services():
+    summaries = build_summaries(make_facts(seed=2))
+    merged = merge_summaries(summaries, months=["2025-01"], specialites=["Chirurgie"])
+    assert set(merged["specialite"]) == {"Chirurgie"}
+    expected = summaries[(summaries["mois"] == "2025-01") & (summaries["specialite"] == "Chirurgie")]
+    assert merged["effectif"].sum() == expected["effectif"].sum()
+    assert set(merged["mesure"]) == {MESURE_GLOBALE, MESURE_J0}
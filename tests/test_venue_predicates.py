@@ -0,0 +1,53 @@
+from venue_predicates import parse_venues, plan_venue_predicate
+
+
+def test_parse_venues():
+    assert parse_venues("3, 1,x,,2,3,-4,0") == [1, 2, 3]
+    assert parse_venues([5, "4", None, 4.0]) == [4, 5]
+    assert parse_venues(None) == []
+
+
+def test_dense_run_becomes_between():
+    predicate = plan_venue_predicate("num_sej", range(100, 120), min_count=16)
+    assert predicate.ranges == [(100, 119)]
+    assert predicate.values == []
+    assert predicate.sql == "num_sej BETWEEN 100 AND 119"
+
+
+def test_isolated_venues_stay_in_list():
+    predicate = plan_venue_predicate("num_sej", [10, 500, 1000], min_count=16)
+    assert predicate.ranges == []
+    assert predicate.sql == "num_sej IN (10, 500, 1000)"
+
+
+def test_run_with_holes_excludes_missing_venues():
+    venues = [venue for venue in range(1, 41) if venue not in (7, 20, 21)] + [900]
+    predicate = plan_venue_predicate("num_sej", venues, min_count=16, max_gap=3)
+    assert predicate.ranges == [(1, 40)]
+    assert predicate.values == [900]
+    assert predicate.exclusions == [7, 20, 21]
+    assert predicate.sql == "(num_sej BETWEEN 1 AND 40 OR num_sej IN (900)) AND num_sej NOT IN (7, 20, 21)"
+
+
+def test_gap_larger_than_max_gap_splits_runs():
+    venues = list(range(1, 21)) + list(range(30, 50))
+    predicate = plan_venue_predicate("num_sej", venues, min_count=16, max_gap=3)
+    assert predicate.ranges == [(1, 20), (30, 49)]
+    assert predicate.exclusions == []
+
+
+def test_short_run_is_enumerated():
+    predicate = plan_venue_predicate("num_sej", range(1, 6), min_count=16)
+    assert predicate.ranges == []
+    assert predicate.values == [1, 2, 3, 4, 5]
+
+
+def test_empty_list_matches_nothing():
+    assert plan_venue_predicate("num_sej", []).sql == "1 = 0"
+
+
+def test_large_in_lists_are_chunked():
+    venues = range(0, 4000, 2)  # un numéro sur deux : pas de plage possible avec un écart maximal nul
+    predicate = plan_venue_predicate("num_sej", venues, max_gap=0)
+    assert predicate.ranges == []
+    assert predicate.sql.count("num_sej IN (") == 2